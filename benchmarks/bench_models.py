@@ -0,0 +1,190 @@
+# Compares the slotted TeamInfo/PlayerInfo classes with the dict-backed classes they replaced.
+# Measures JSON decoding, encoding and the memory the decoded teams of a large tournament keep once the parsed JSON is dropped,
+# and the size of the PATCH payload of a team whose manager changed.
+#
+# Run from the repository root:
+# python benchmarks/bench_models.py
+
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "source"))
+
+from toornament import TeamInfo
+from utility import toStr
+
+# Copy of the previous PlayerInfo class
+class LegacyPlayerInfo:
+
+    def __init__(self):
+        self.name = ""
+
+    @classmethod
+    def fromJSON(cls, playerJSON):
+        info = cls()
+        info.name = playerJSON['name']
+        info.userID = playerJSON['user_id']
+        info.email = playerJSON['email']
+
+        customJSON = playerJSON['custom_fields']
+        info.discordID = toStr(customJSON['discord_id'])
+        info.country = customJSON['country']
+        info.steamID = customJSON['steam_id']
+        info.psnID = customJSON['psn_id']
+        info.xboxID = customJSON['xbox_live_gamertag']
+        info.nintendoID = customJSON['nintendo_network_id']
+        info.trackerLink = customJSON['rltracker_link']
+        info.trackerLinkAlt = customJSON['rltracker_link_alt_account_']
+
+        return info
+
+    def toJSON(self):
+        return {
+            "name": self.name,
+            "user_id": self.userID,
+            "email": self.email,
+            "custom_fields": {
+                "discord_id": f"{self.discordID}",
+                "country": self.country,
+                "steam_id": self.steamID,
+                "psn_id": self.psnID,
+                "xbox_live_gamertag": self.xboxID,
+                "nintendo_network_id": self.nintendoID,
+                "rltracker_link": self.trackerLink,
+                "rltracker_link_alt_account_": self.trackerLinkAlt
+            }
+        }
+
+
+# Copy of the previous TeamInfo class
+class LegacyTeamInfo:
+
+    def __init__(self):
+        self.name = ""
+        self.roleID = 0
+        self.emoteID = 0
+
+    @classmethod
+    def fromJSON(cls, teamJSON):
+        info = cls()
+        info.name = teamJSON['name']
+        info.id = teamJSON['id']
+        info.email = teamJSON['email']
+
+        customJSON = teamJSON['custom_fields']
+        info.shortName = customJSON['short_name']
+        info.previousName = customJSON['previous_team_name']
+        info.twitterURL = customJSON['twitter']
+        info.twitchURL = customJSON['twitch']
+        info.managerDiscordID = toStr(customJSON['manager_discord_id'])
+
+        info.lineup = []
+
+        for memberJSON in teamJSON['lineup']:
+            memberInfo = LegacyPlayerInfo.fromJSON(memberJSON)
+            info.lineup += [memberInfo]
+
+        return info
+
+    def toJSON(self):
+        lineupJSON = []
+
+        for playerInfo in self.lineup:
+            lineupJSON += [playerInfo.toJSON()]
+
+        return {
+            "name": self.name,
+            "id": self.id,
+            "email": self.email,
+            "custom_fields": {
+                "short_name": self.shortName,
+                "previous_team_name": self.previousName,
+                "twitter": self.twitterURL,
+                "twitch": self.twitchURL,
+                "manager_discord_id": f"{self.managerDiscordID}"
+            },
+            "lineup": lineupJSON
+        }
+
+
+# Returns the JSON of a team as sent by toornament
+# withLogo: If True, the team has uploaded a logo
+def getTeamJSON(index, withLogo: bool = False):
+    teamJSON = {
+        "name": f"Team {index}",
+        "id": 100000 + index,
+        "email": f"team{index}@example.com",
+        "custom_fields": {
+            "short_name": f"T{index}",
+            "previous_team_name": None,
+            "twitter": f"https://twitter.com/team{index}",
+            "twitch": None,
+            "manager_discord_id": f"Manager{index}#0001"
+        },
+        "lineup": [{
+            "name": f"Player {index}-{player}",
+            "user_id": None,
+            "email": f"player{index}-{player}@example.com",
+            "custom_fields": {
+                "discord_id": f"Player{index}{player}#1234",
+                "country": "DE",
+                "steam_id": f"7656119{index:06d}{player}",
+                "psn_id": None,
+                "xbox_live_gamertag": None,
+                "nintendo_network_id": None,
+                "rltracker_link": f"https://rocketleague.tracker.network/profile/{index}-{player}",
+                "rltracker_link_alt_account_": None
+            }
+        } for player in range(5)]
+    }
+
+    if withLogo:
+        teamJSON["custom_fields"]["logo"] = f"https://example.com/logos/team{index}.png"
+
+    return teamJSON
+
+
+# Returns the number of bytes still allocated after parsing the response, decoding all teams and dropping the JSON.
+# Parsing is measured as well, so memory the decoded teams keep of the JSON is counted.
+# responseText: Serialized JSON list of all teams
+def measureMemory(teamClass, responseText: str):
+    tracemalloc.start()
+    allTeamJSON = json.loads(responseText)
+    allTeamInfo = [teamClass.fromJSON(teamJSON) for teamJSON in allTeamJSON]
+    del allTeamJSON
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del allTeamInfo
+    return size
+
+
+def main():
+    teamCount = 2000
+    repeats = 5
+    allTeamJSON = [getTeamJSON(index) for index in range(teamCount)]
+    allTeamJSONWithLogo = [getTeamJSON(index, withLogo = True) for index in range(teamCount)]
+
+    print(f"{teamCount} teams with 5 players each, best of {repeats} runs")
+
+    for label, teamClass, teamJSONs in (("legacy", LegacyTeamInfo, allTeamJSON), ("slotted", TeamInfo, allTeamJSON), ("+ logo", TeamInfo, allTeamJSONWithLogo)):
+        allTeamInfo = [teamClass.fromJSON(teamJSON) for teamJSON in teamJSONs]
+
+        decodeTime = min(timeit.repeat(lambda: [teamClass.fromJSON(teamJSON) for teamJSON in teamJSONs], number = 1, repeat = repeats))
+        encodeTime = min(timeit.repeat(lambda: [teamInfo.toJSON() for teamInfo in allTeamInfo], number = 1, repeat = repeats))
+        memory = measureMemory(teamClass, json.dumps(teamJSONs))
+
+        print(f"{label:>8}: decode {decodeTime * 1000:7.1f} ms, encode {encodeTime * 1000:7.1f} ms, memory {memory / 1024:8.0f} KiB")
+
+    # The legacy classes always sent the full team
+    teamInfo = TeamInfo.fromJSON(allTeamJSON[0])
+    teamInfo.managerDiscordID = "123456789012345678"
+
+    print(f"PATCH payload after changing the manager: full {len(json.dumps(teamInfo.toJSON()))} bytes, partial {len(json.dumps(teamInfo.toPatchJSON()))} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,11 +24,19 @@
 #     },
 #     "Ballchasing": {
 #         "Token": "..."
+#     },
+#     "Webhook": {
+#         "Secret": "...",
+#         "Port": 8080
 #     }
 # }
+#
+# The "Webhook" section is optional. Without a secret, the webhook receiver isn't started.
 
 import json
 import datetime
+import os
+import tempfile
 
 class AuthorizationInfo:
 
@@ -61,6 +69,9 @@ class AuthorizationInfo:
 
         self.ballchasingToken = ""
 
+        self.webhookSecret = ""
+        self.webhookPort = 8080
+
         self.authPath = None
 
     # Loads authorization data from a given JSON-file. An example file is in the documentation at the top of this file's documentation
@@ -91,9 +102,15 @@ class AuthorizationInfo:
             ballchasingJSON = authJSON["Ballchasing"]
             self.ballchasingToken = ballchasingJSON["Token"]
 
+            webhookJSON = authJSON.get("Webhook", {})
+            self.webhookSecret = webhookJSON.get("Secret", "")
+            self.webhookPort = int(webhookJSON.get("Port", 8080))
+
             self.authPath = path
 
     # Saves authorization Datei to a given JSON-file.
+    # The data is written to a temporary file first, which then replaces the file at once,
+    # so the file is never left half-written if the bot stops while saving.
     # path: Path of the JSON-file to which the data should be saved
     def saveToJSON(self, path):
         authJSON = {
@@ -118,11 +135,25 @@ class AuthorizationInfo:
                 },
                 "Ballchasing": {
                     "Token": self.ballchasingToken
+                },
+                "Webhook": {
+                    "Secret": self.webhookSecret,
+                    "Port": self.webhookPort
                 }
             }
 
-        with open(path, "w") as f:
-            json.dump(authJSON, f, ensure_ascii=True, indent=4)
+        fileDescriptor, tempPath = tempfile.mkstemp(dir = os.path.dirname(os.path.abspath(path)), prefix = ".auth-", suffix = ".json")
+
+        try:
+            with os.fdopen(fileDescriptor, "w") as f:
+                json.dump(authJSON, f, ensure_ascii=True, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(tempPath, path)
+        except:
+            os.remove(tempPath)
+            raise
 
     # Returns true if the toornament authorization key expired
     def hasToornamentAuthExpired(self) -> bool:
@@ -136,7 +167,8 @@ class AuthorizationInfo:
     # Saves a new toornament OAuth2 key.
     # Tries to overwrite the authorization info JSON-file if it was loaded from one originally.
     # newKeyJSON: Information on the new authorization token as received from the OAuth2 endpoint
-    def replaceToornamentAuthKey(self, newKeyJSON):
+    # save: If False, the JSON-file isn't overwritten, e.g. because the caller saves it later
+    def replaceToornamentAuthKey(self, newKeyJSON, save: bool = True):
 
         newAccessToken = newKeyJSON['access_token']
         expiresInSeconds = newKeyJSON['expires_in']
@@ -147,5 +179,5 @@ class AuthorizationInfo:
         self.toornamentAuthType = newTokenType
         self.toornamentAuthExpiry = datetime.datetime.now() + datetime.timedelta(seconds = expiresInSeconds)
 
-        if self.authPath is not None:
+        if save and self.authPath is not None:
             self.saveToJSON(self.authPath)
@@ -1,10 +1,17 @@
 # The class BotConfig is a wrapper for a configuration database table.
 # It offers methods to retrieve configuration values by name or through more dedicated wrapper methods.
 # To convert the results to the needed types, an instance of the DiscordHelper class is needed
+#
+# The configuration of a tournament is loaded into memory with a single query the first time it is needed.
+# All reads are served from memory afterwards, writes update the database and the cache together.
+# If a time to live is set, the cached configuration is reloaded after it expires, so changes made by other
+# bot instances are picked up.
 
 from mysqlwrapper import MySQLWrapper
 from discordhelper import DiscordHelper
 from utility import tryToInt
+import threading
+import time
 
 class BotConfig:
 
@@ -12,12 +19,20 @@ class BotConfig:
     # discordHelper: DiscordHelper instance
     # mysqlWrapper: MySQLWrapper instance
     # overwrite: If True, the configuration table will be with startup
-    def __init__(self, discordHelper: DiscordHelper, mysqlWrapper: MySQLWrapper, overwrite: bool = False):
+    # ttl: Seconds after which the cached configuration of a tournament is reloaded. If None, it is kept until invalidated.
+    def __init__(self, discordHelper: DiscordHelper, mysqlWrapper: MySQLWrapper, overwrite: bool = False, ttl: float = None):
         self.discordHelper = discordHelper
         self.mysql = mysqlWrapper
+        self.ttl = ttl
+
+        # Maps tournament IDs to tuples of load time and the map of configuration values
+        self.cache = {}
+        self.lock = threading.Lock()
+
         self.__initConfigTable(overwrite)
 
-    # Creates the required MySQL configuration table.
+    # Creates the required MySQL configuration table. Names are unique per tournament, which setValue and addValue rely on.
+    # Tables created before the key existed get it from the migration addUniqueConfigNames.
     # overwrite: If True, the config table will be dropped and overwritten if it already exists
     def __initConfigTable(self, overwrite: bool = False):
         self.mysql.createTable("BotConfig", (
@@ -25,7 +40,8 @@ class BotConfig:
             "TournamentID BIGINT NOT NULL, "
             "Name VARCHAR(63) NOT NULL, "
             "Value VARCHAR(1023), "
-            "PRIMARY KEY(ConfigID)"
+            "PRIMARY KEY(ConfigID), "
+            "UNIQUE KEY BotConfigByName (TournamentID, Name)"
         ), overwrite = overwrite)
 
     # Returns a map containing the default configuration.
@@ -33,9 +49,86 @@ class BotConfig:
     @staticmethod
     def __getDefaultValues():
         return {
-            "team_role_template": "716961342069669909"
+            "team_role_template": "716961342069669909",
+            "sync_interval": "900"
         }
     
+    # Returns the cached configuration of a tournament, or None if it isn't cached or expired.
+    # tournamentID: Toornament ID of the tournament
+    def __getCachedValues(self, tournamentID):
+        with self.lock:
+            entry = self.cache.get(str(tournamentID))
+
+        if entry is None:
+            return None
+
+        loadTime, values = entry
+
+        if self.ttl is not None and time.monotonic() - loadTime > self.ttl:
+            return None
+
+        return values
+
+    # Loads the configuration of a tournament from the database into the cache and returns it.
+    # tournamentID: Toornament ID of the tournament
+    def __loadValues(self, tournamentID):
+        results = self.mysql.fetch("SELECT Name, Value FROM BotConfig WHERE TournamentID=%s;", (tournamentID,))
+        values = dict(results or ())
+
+        with self.lock:
+            self.cache[str(tournamentID)] = (time.monotonic(), values)
+
+        return values
+
+    # Updates a value of a tournament in the cache. Does nothing if the configuration isn't cached.
+    # tournamentID: Toornament ID of the tournament
+    # name: Name of the configuration attribute
+    # value: New value of the configuration attribute
+    # overwrite: If False, an existing value is kept
+    def __updateCachedValue(self, tournamentID, name, value, overwrite: bool):
+        with self.lock:
+            entry = self.cache.get(str(tournamentID))
+
+            if entry is None:
+                return
+
+            values = entry[1]
+
+            if overwrite:
+                values[name] = value
+            else:
+                values.setdefault(name, value)
+
+    # Removes the configuration of a tournament from the cache, so it is reloaded with the next read.
+    # tournamentID: Toornament ID of the tournament. If None, the configuration of all tournaments is removed.
+    def invalidate(self, tournamentID = None):
+        with self.lock:
+            if tournamentID is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(str(tournamentID), None)
+
+    # Returns a map of all configuration attributes of the given tournament to their values.
+    # tournamentID: Toornament ID of the tournament to get the configuration for
+    def getValues(self, tournamentID):
+        values = self.__getCachedValues(tournamentID)
+
+        if values is None:
+            values = self.__loadValues(tournamentID)
+
+        with self.lock:
+            return dict(values)
+
+    # Asynchronous version of getValues. Only waits for the database if the configuration isn't cached.
+    async def getValuesAsync(self, tournamentID):
+        values = self.__getCachedValues(tournamentID)
+
+        if values is None:
+            return await self.mysql.runAsync(self.getValues, tournamentID)
+
+        with self.lock:
+            return dict(values)
+
     # Adds a default configuration for a tournament.
     # tournamentID: Toornament ID of the tournament to create default config for
     def createDefaultConfig(self, tournamentID):
@@ -44,42 +137,62 @@ class BotConfig:
         for configName in defaultValues:
             self.addValue(tournamentID, configName, defaultValues[configName])
 
-    # Adds a new configuration value for the given tournament.
+    # Asynchronous version of createDefaultConfig. Doesn't block the event loop while waiting for the database.
+    async def createDefaultConfigAsync(self, tournamentID):
+        await self.mysql.runAsync(self.createDefaultConfig, tournamentID)
+
+    # Adds a new configuration value for the given tournament. Does nothing if the tournament already has a value with this name.
     # tournamentID: Toornament ID of the tournament to add a configuration for
     # name: Name of the new configuration attribute
     # value: Value of the new configuration attribute
     def addValue(self, tournamentID, name, value = None):
-        if value is None:
-            self.mysql.query("INSERT INTO BotConfig (TournamentID, Name) VALUES (%s, %s);", (tournamentID, name,))
-        else:
-            self.mysql.query("INSERT INTO BotConfig (TournamentID, Name, Value) VALUES (%s, %s, %s);", (tournamentID, name, value,))
+        self.mysql.write("INSERT IGNORE INTO BotConfig (TournamentID, Name, Value) VALUES (%s, %s, %s);", (tournamentID, name, value,))
 
-        self.mysql.db.commit()
+        # Within a unit of work, the cache is only updated once the value was committed
+        self.mysql.afterCommit(lambda: self.__updateCachedValue(tournamentID, name, value, overwrite = False))
+
+    # Asynchronous version of addValue. Doesn't block the event loop while waiting for the database.
+    async def addValueAsync(self, tournamentID, name, value = None):
+        await self.mysql.runAsync(self.addValue, tournamentID, name, value)
 
     # Returns the value of a configuration attribute for the given tournament.
     # tournamentID: Toornament ID of the tournament to get the configuration value for
     # name: Name of the configuration attribute to retrieve
     def getValue(self, tournamentID, name):
-        self.mysql.query("SELECT Value FROM BotConfig WHERE TournamentID=%s AND Name=%s;", (tournamentID, name,))
-        results = self.mysql.fetchResults()
+        return self.getValues(tournamentID).get(name)
 
-        if results is None:
-            return None
-        else:
-            return results[0][0]
+    # Asynchronous version of getValue. Only waits for the database if the configuration isn't cached.
+    async def getValueAsync(self, tournamentID, name):
+        return (await self.getValuesAsync(tournamentID)).get(name)
 
-    # Updates the value of a configuration attribute for the given tournament.
+    # Updates the value of a configuration attribute for the given tournament. Adds the attribute if it doesn't exist.
     # tournamentID: Toornament ID of the toornament to update the configuration value for.
     # name: Name of the configuration attribute to update
     # value: New value of the configuration attribute
     def setValue(self, tournamentID, name, value):
-        self.mysql.query("UPDATE BotConfig SET Value=%s WHERE TournamentID=%s AND Name=%s;", (value, tournamentID, name,))
-        self.mysql.db.commit()
+        self.mysql.upsert("BotConfig", ("TournamentID", "Name", "Value"), (tournamentID, name, value), ("Value",))
+        self.mysql.afterCommit(lambda: self.__updateCachedValue(tournamentID, name, value, overwrite = True))
+
+    # Asynchronous version of setValue. Doesn't block the event loop while waiting for the database.
+    async def setValueAsync(self, tournamentID, name, value):
+        await self.mysql.runAsync(self.setValue, tournamentID, name, value)
 
     # Returns the team role template as a Discord role object for the given tournament.
     # tournamentID: Toornament ID of the tournament to get the team role template for.
     def getTeamRoleTemplate(self, tournamentID):
         templateRoleID = tryToInt(self.getValue(tournamentID, "team_role_template"))
+        return self.__getTemplateRole(tournamentID, templateRoleID)
+
+    # Asynchronous version of getTeamRoleTemplate. Doesn't block the event loop while waiting for the database.
+    async def getTeamRoleTemplateAsync(self, tournamentID):
+        templateRoleID = tryToInt(await self.getValueAsync(tournamentID, "team_role_template"))
+        return self.__getTemplateRole(tournamentID, templateRoleID)
+
+    # Returns the Discord role object of a role template.
+    # Raises a ValueError if the role doesn't exist.
+    # tournamentID: Toornament ID of the tournament the template belongs to
+    # templateRoleID: ID of the template role
+    def __getTemplateRole(self, tournamentID, templateRoleID):
         templateRole = self.discordHelper.getRole(tournamentID, templateRoleID)
 
         if templateRole is None:
@@ -8,39 +8,47 @@
 
 import discord
 from discord.ext import commands
+import asyncio
+import re
 
 from toornament import *
-import utility
+from memberindex import MemberIndex
+from imagepipeline import ImagePipeline
+from utility import tryToInt
 
 class DiscordHelper:
 
     # Constructor
     # bot: Discord bot instance
     # toornament: Toornament interface instance
-    def __init__(self, bot, toornament: ToornamentInterface):
+    # imagePipeline: Optional pipeline used to download emote images. Defaults to one using the HTTP session of the toornament interface.
+    def __init__(self, bot, toornament: ToornamentInterface, imagePipeline: ImagePipeline = None):
         self.bot = bot
         self.toornament = toornament
+        self.imagePipeline = imagePipeline if imagePipeline is not None else ImagePipeline(toornament.http)
         self.memberConverter = commands.MemberConverter()
-        self.guildCache = {}
+        self.memberIndexes = {}
 
 
     # Returns Discord guild object for the guild that runs the tournament with the given id.
-    # Caches guild objects in a map to avoid redundant SQL and API calls.
+    # The guild ID is taken from the tournament registry, the guild object from the guild cache of the bot.
+    # Returns None if the bot can't see the guild (yet).
     # tournamentID: Toornament ID of the tournament for which the organizing guild is retrieved
     def getGuild(self, tournamentID):
-        try:
-            # First tries to find the guild in the cache
-            return self.guildCache[tournamentID]
-        except:
-            # If unsuccessful: Gets guild id from MySQL database
-            tournament = self.toornament.getTournamentInfo(tournamentID = tournamentID)
+        tournament = self.toornament.getTournamentInfo(tournamentID = tournamentID)
+        return self.bot.get_guild(tournament.guildID)
+
+
+    # Returns Discord guild object for the guild that runs the tournament with the given id.
+    # Raises a ValueError if the bot can't see the guild, e.g. because it left the guild.
+    # tournamentID: Toornament ID of the tournament for which the organizing guild is retrieved
+    def requireGuild(self, tournamentID):
+        guild = self.getGuild(tournamentID)
 
-            # Fetches guild object from bot
-            guild = self.bot.get_guild(tournament.guildID)
+        if guild is None:
+            raise ValueError(f"Guild of tournament '{tournamentID}' doesn't exist or the bot isn't a member of it")
 
-            # Adds guild object to cache
-            self.guildCache[tournament.tournamentID] = guild
-            return guild
+        return guild
 
 
     # Returns Discord member object for given ID and context.
@@ -57,6 +65,38 @@ class DiscordHelper:
             return None
 
 
+    # Returns the member index of a guild. The index is built on first use and kept until it is invalidated.
+    # guild: Discord guild object
+    def getMemberIndex(self, guild: discord.Guild) -> MemberIndex:
+        memberIndex = self.memberIndexes.get(guild.id)
+
+        if memberIndex is None:
+            memberIndex = MemberIndex(guild)
+            self.memberIndexes[guild.id] = memberIndex
+
+        return memberIndex
+
+
+    # Drops the member index of a guild, so it is rebuilt on next use.
+    # Must be called whenever a member joins, leaves or changes their name.
+    # guild: Discord guild object. If None, the member indexes of all guilds are dropped.
+    def invalidateMemberIndex(self, guild: discord.Guild = None):
+        if guild is None:
+            self.memberIndexes.clear()
+        else:
+            self.memberIndexes.pop(guild.id, None)
+
+
+    # Looks up multiple members of a tournament guild at once.
+    # Returns a map of each given Discord ID to its member object, or None if the member can't be found.
+    # tournamentID: Toornament ID of the tournament whose guild is searched
+    # Raises a ValueError if the bot can't see the guild of the tournament.
+    # discordIDs: Iterable of Discord IDs, mentions, names, name#discriminators or nicknames
+    def resolveMembers(self, tournamentID, discordIDs):
+        guild = self.requireGuild(tournamentID)
+        return self.getMemberIndex(guild).resolveMany(discordIDs)
+
+
     # Returns Discord role object for given tournament and role id.
     # Returns None if role can't be found.
     # tournamentID: Toornament ID of the tournament the role belongs to
@@ -88,6 +128,19 @@ class DiscordHelper:
                 mentionable = roleTemplate.mentionable
             )
 
+    # Deletes a Discord role of a tournament. Returns False if the role doesn't exist anymore.
+    # tournamentID: Toornament ID of tournament the role belongs to
+    # roleID: ID of the role
+    # reason: Optional reason for the deletion, shows up in logs
+    async def deleteRole(self, tournamentID, roleID, reason = None) -> bool:
+        role = self.getRole(tournamentID, roleID)
+
+        if role is None:
+            return False
+
+        await role.delete(reason = reason)
+        return True
+
     # Creates a new Discord emote for a tournament and returns it.
     # tournamentID: Toornament ID of tournament the emote belongs to
     # name: Name used to post the emote by members
@@ -95,8 +148,8 @@ class DiscordHelper:
     # reason: Optional reason for the emote creation, shows up in logs
     async def createEmote(self, tournamentID, name, imageURL, reason = None):
 
-        # Downloads image from URL
-        imageData = utility.downloadImage(imageURL, (96, 96))
+        # Downloads and scales the image without blocking the event loop
+        imageData = await self.imagePipeline.getImage(imageURL, (96, 96))
 
         # Adds the image as a new emote to the tournament guild
         guild = self.getGuild(tournamentID)
@@ -108,4 +161,71 @@ class DiscordHelper:
         )
 
         return newEmote
-    
\ No newline at end of file
+
+
+    # Returns a valid emote name for a team, made of the letters, digits and underscores of its short name or name.
+    # teamInfo: Team the emote is created for
+    @staticmethod
+    def getEmoteName(teamInfo: TeamInfo) -> str:
+        name = re.sub(r"[^A-Za-z0-9_]", "", teamInfo.shortName or teamInfo.name)
+
+        if len(name) < 2:
+            name = f"team{teamInfo.id}"
+
+        return name[:32]
+
+
+    # Creates an emote from the logo of every team of a tournament and saves the emote IDs to the database.
+    # Logos are downloaded and scaled concurrently, emotes are created with limited concurrency to stay within the Discord rate limits.
+    # Teams without a logo and teams whose stored emote still exists are skipped.
+    # Returns a map with the number of created and skipped emotes and a list of failure messages.
+    # Raises a ValueError if the bot can't see the guild of the tournament.
+    # tournamentID: Toornament ID of the tournament
+    # allTeamInfo: List of all teams of the tournament
+    # maxConcurrency: Maximum number of emotes created at the same time
+    async def createTeamEmotes(self, tournamentID, allTeamInfo, maxConcurrency: int = 2):
+        guild = self.requireGuild(tournamentID)
+        storedTeams = await self.toornament.getStoredTeamsAsync(tournamentID)
+        semaphore = asyncio.Semaphore(maxConcurrency)
+        result = {"created": 0, "skipped": 0, "failures": []}
+        teamsToCreate = []
+
+        for teamInfo in allTeamInfo:
+            storedTeam = storedTeams.get(str(teamInfo.id))
+
+            if storedTeam is not None:
+                teamInfo.roleID = storedTeam[0]
+                teamInfo.emoteID = storedTeam[1]
+
+            if teamInfo.logoURL is None or guild.get_emoji(tryToInt(teamInfo.emoteID)) is not None:
+                result["skipped"] += 1
+            else:
+                teamsToCreate += [teamInfo]
+
+        createdTeams = await asyncio.gather(*[self.__createTeamEmote(guild, teamInfo, semaphore, result) for teamInfo in teamsToCreate])
+        createdTeams = [teamInfo for teamInfo in createdTeams if teamInfo is not None]
+
+        if len(createdTeams) > 0:
+            await self.toornament.saveTeamEmotesAsync(tournamentID, createdTeams)
+
+        return result
+
+
+    # Creates the emote of a team from its logo. Returns the team with its new emote ID, or None if the emote couldn't be created.
+    async def __createTeamEmote(self, guild: discord.Guild, teamInfo: TeamInfo, semaphore: asyncio.Semaphore, result):
+        try:
+            imageData = await self.imagePipeline.getImage(teamInfo.logoURL, (96, 96))
+        except Exception as err:
+            result["failures"] += [f"Logo of team '{teamInfo.name}' couldn't be downloaded: {err}"]
+            return None
+
+        async with semaphore:
+            try:
+                newEmote = await guild.create_custom_emoji(name = DiscordHelper.getEmoteName(teamInfo), image = imageData, reason = f"Emote of team {teamInfo.name}")
+            except discord.HTTPException as err:
+                result["failures"] += [f"Emote of team '{teamInfo.name}' couldn't be created: {err}"]
+                return None
+
+        teamInfo.emoteID = str(newEmote.id)
+        result["created"] += 1
+        return teamInfo
@@ -0,0 +1,141 @@
+# This class caches responses of GET requests to send conditional requests.
+# For every URL and range the parsed response is stored together with its ETag and Last-Modified headers.
+# The next request for the same URL and range sends these values back to the server (If-None-Match/If-Modified-Since).
+# If the content didn't change, the server answers with 304 Not Modified and the stored response is used
+# without downloading or parsing it again.
+#
+# The number of entries is limited; the least recently used entry is evicted first.
+# Optionally the entries are also stored on disk using shelve, so the cache survives restarts.
+
+from requests.structures import CaseInsensitiveDict
+from collections import OrderedDict
+import threading
+import shelve
+
+# A response stored by the cache
+class CachedResponse:
+
+    # Constructor
+    # content: Parsed JSON content of the response
+    # headers: Headers of the response
+    def __init__(self, content, headers):
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers)
+        self.etag = self.headers.get("ETag")
+        self.lastModified = self.headers.get("Last-Modified")
+
+    # Returns the headers needed to ask the server whether this response is still up to date
+    def getConditionalHeaders(self):
+        conditionalHeaders = {}
+
+        if self.etag is not None:
+            conditionalHeaders['If-None-Match'] = self.etag
+        if self.lastModified is not None:
+            conditionalHeaders['If-Modified-Since'] = self.lastModified
+
+        return conditionalHeaders
+
+
+class ResponseCache:
+
+    # Constructor
+    # maxEntries: Maximum number of responses kept in the cache
+    # path: Optional path of a file the cache is stored in. If None, the cache only exists in memory.
+    def __init__(self, maxEntries: int = 1024, path: str = None):
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.shelf = None
+
+        if path is not None:
+            self.__loadFromDisk(path)
+
+    # Opens the on-disk backend and loads the stored entries into memory
+    # path: Path of the file the cache is stored in
+    def __loadFromDisk(self, path: str):
+        self.shelf = shelve.open(path)
+
+        for key in list(self.shelf.keys()):
+            if len(self.entries) < self.maxEntries:
+                self.entries[key] = self.shelf[key]
+            else:
+                del self.shelf[key]
+
+    # Returns the key under which the response for a URL and range is stored.
+    # url: URL of the request
+    # pageRange: Value of the Range header, if any
+    @staticmethod
+    def getKey(url: str, pageRange: str = None) -> str:
+        return f"{url}|{pageRange or ''}"
+
+    # Returns the cached response for a key and marks it as recently used, or None if there is none.
+    # key: Key of the response as returned by getKey
+    def get(self, key: str) -> CachedResponse:
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+            return entry
+
+    # Stores a response if it can be validated with an ETag or Last-Modified header.
+    # Evicts the least recently used responses if the cache is full.
+    # key: Key of the response as returned by getKey
+    # content: Parsed JSON content of the response
+    # headers: Headers of the response
+    def store(self, key: str, content, headers):
+        entry = CachedResponse(content, headers)
+
+        if entry.etag is None and entry.lastModified is None:
+            return
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+
+            if self.shelf is not None:
+                self.shelf[key] = entry
+
+            while len(self.entries) > self.maxEntries:
+                evictedKey, _ = self.entries.popitem(last = False)
+
+                if self.shelf is not None:
+                    del self.shelf[evictedKey]
+
+    # Counts a request that was answered from the cache
+    def recordHit(self):
+        with self.lock:
+            self.hits += 1
+
+    # Counts a request whose content had to be downloaded
+    def recordMiss(self):
+        with self.lock:
+            self.misses += 1
+
+    # Returns a map with the number of cache hits, misses and stored entries
+    def getStats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries)
+            }
+
+    # Removes all cached responses
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+            if self.shelf is not None:
+                self.shelf.clear()
+
+    # Writes all pending changes to disk and closes the on-disk backend
+    def close(self):
+        with self.lock:
+            if self.shelf is not None:
+                self.shelf.close()
+                self.shelf = None
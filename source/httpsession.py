@@ -0,0 +1,95 @@
+# This class owns the HTTP connections used to communicate with a web API.
+# Synchronous requests are sent through a requests session, asynchronous requests through an aiohttp session.
+# Both sessions keep their connections alive and pool them, so consecutive calls to the same host
+# don't need a new TCP+TLS handshake every time.
+#
+# The number of opened and reused connections is counted to make the effect of the pool visible.
+
+import requests
+from requests.adapters import HTTPAdapter
+import aiohttp
+
+class HTTPSession:
+
+    # Constructor
+    # poolSize: Maximum number of connections that are kept open per host
+    # connectTimeout: Seconds to wait until a connection is established
+    # readTimeout: Seconds to wait for the server to send data
+    # keepAliveTimeout: Seconds an idle asynchronous connection is kept open
+    def __init__(self, poolSize: int = 10, connectTimeout: float = 5.0, readTimeout: float = 30.0, keepAliveTimeout: float = 60.0):
+        self.poolSize = poolSize
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.keepAliveTimeout = keepAliveTimeout
+
+        # Synchronous session. The adapter holds one connection pool per host.
+        self.adapter = HTTPAdapter(pool_connections = poolSize, pool_maxsize = poolSize)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+        # Asynchronous session, created lazily inside the running event loop
+        self.asyncSession = None
+        self.asyncConnectionsOpened = 0
+        self.asyncConnectionsReused = 0
+
+    # Sends a synchronous request using the pooled session and the configured timeouts.
+    # method: HTTP method of the request, e.g. "GET"
+    # url: URL the request is sent to
+    # kwargs: Additional arguments passed to requests, e.g. data, json or headers
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.session.request(method, url, timeout = (self.connectTimeout, self.readTimeout), **kwargs)
+
+    # Returns the aiohttp session used for asynchronous requests.
+    # It is created lazily, because aiohttp sessions must be created inside a running event loop.
+    def getAsyncSession(self) -> aiohttp.ClientSession:
+        if self.asyncSession is None or self.asyncSession.closed:
+            traceConfig = aiohttp.TraceConfig()
+            traceConfig.on_connection_create_end.append(self.__onAsyncConnectionCreated)
+            traceConfig.on_connection_reuseconn.append(self.__onAsyncConnectionReused)
+
+            connector = aiohttp.TCPConnector(limit = self.poolSize, limit_per_host = self.poolSize, keepalive_timeout = self.keepAliveTimeout)
+            timeout = aiohttp.ClientTimeout(sock_connect = self.connectTimeout, sock_read = self.readTimeout)
+
+            self.asyncSession = aiohttp.ClientSession(connector = connector, timeout = timeout, trace_configs = [traceConfig])
+
+        return self.asyncSession
+
+    # Trace callback of the asynchronous session, counts newly opened connections
+    async def __onAsyncConnectionCreated(self, session, context, params):
+        self.asyncConnectionsOpened += 1
+
+    # Trace callback of the asynchronous session, counts connections taken from the pool
+    async def __onAsyncConnectionReused(self, session, context, params):
+        self.asyncConnectionsReused += 1
+
+    # Returns a map with the number of connections that were opened and how many requests reused an open connection.
+    # Synchronous numbers are read from the urllib3 pools, whose counters are kept as long as the pool of a host exists.
+    def getStats(self):
+        syncOpened = 0
+        syncRequests = 0
+
+        pools = self.adapter.poolmanager.pools
+
+        for poolKey in pools.keys():
+            pool = pools.get(poolKey)
+
+            if pool is not None:
+                syncOpened += pool.num_connections
+                syncRequests += pool.num_requests
+
+        return {
+            "opened": syncOpened + self.asyncConnectionsOpened,
+            "reused": max(syncRequests - syncOpened, 0) + self.asyncConnectionsReused
+        }
+
+    # Closes the synchronous session and all of its pooled connections
+    def close(self):
+        self.session.close()
+
+    # Closes the asynchronous session. Should be awaited before the event loop is shut down.
+    async def closeAsync(self):
+        if self.asyncSession is not None and not self.asyncSession.closed:
+            await self.asyncSession.close()
+
+        self.asyncSession = None
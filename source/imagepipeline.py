@@ -0,0 +1,155 @@
+# The ImagePipeline downloads and scales images, e.g. team logos that are turned into emotes.
+# Downloads use the pooled aiohttp session and are limited in size and time. Decoding and scaling the image
+# is CPU bound, so it runs in a process pool and the event loop of the bot is never blocked.
+#
+# Processed images are cached by content: The cache maps each URL to the hash of the image it returned and each
+# hash and size to the scaled PNG. Requesting a known URL again skips both download and scaling, a new URL that
+# returns a known image skips the scaling. Concurrent requests for the same URL share one download.
+
+from httpsession import HTTPSession
+from concurrent.futures import Executor, ProcessPoolExecutor
+from collections import OrderedDict
+import utility
+import aiohttp
+import asyncio
+import hashlib
+
+class ImagePipeline:
+
+    # Constructor
+    # httpSession: HTTP session used to download images
+    # maxDownloadSize: Maximum size of a downloaded image in bytes
+    # downloadTimeout: Seconds a download may take in total
+    # maxEntries: Maximum number of processed images kept in the cache
+    # executor: Optional executor used to scale images. Defaults to a process pool.
+    def __init__(self, httpSession: HTTPSession, maxDownloadSize: int = 8 * 1024 * 1024, downloadTimeout: float = 10.0, maxEntries: int = 512, executor: Executor = None):
+        self.http = httpSession
+        self.maxDownloadSize = maxDownloadSize
+        self.downloadTimeout = downloadTimeout
+        self.maxEntries = maxEntries
+        self.executor = executor if executor is not None else ProcessPoolExecutor(max_workers = 2)
+
+        # Maps URLs to the hash of their image content
+        self.hashes = OrderedDict()
+
+        # Maps tuples of content hash and size to processed images
+        self.images = OrderedDict()
+
+        # Maps tuples of URL and size to the futures of images that are being processed
+        self.pending = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    # Returns the image at the given URL scaled to the given size as PNG byte array.
+    # url: URL of the image
+    # size: The size the image should be scaled to as an int-tuple
+    async def getImage(self, url: str, size = None) -> bytes:
+        image = self.__getCachedImage(self.hashes.get(url), size)
+
+        if image is not None:
+            self.hits += 1
+            return image
+
+        # Joins a running request for the same image
+        key = (url, size)
+        future = self.pending.get(key)
+
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        self.misses += 1
+
+        try:
+            image = await self.__processImage(url, size)
+            future.set_result(image)
+            return image
+        except Exception as err:
+            future.set_exception(err)
+
+            # Marks the exception as retrieved in case no other request joined
+            future.exception()
+            raise
+        finally:
+            # The request itself was cancelled, so requests that joined it must not wait forever
+            if not future.done():
+                future.cancel()
+
+            del self.pending[key]
+
+    # Downloads and scales an image and adds it to the cache.
+    # url: URL of the image
+    # size: The size the image should be scaled to as an int-tuple
+    async def __processImage(self, url: str, size) -> bytes:
+        imageData = await self.__download(url)
+        contentHash = hashlib.sha256(imageData).hexdigest()
+        self.__store(self.hashes, url, contentHash)
+
+        image = self.__getCachedImage(contentHash, size)
+
+        if image is None:
+            loop = asyncio.get_running_loop()
+            image = await loop.run_in_executor(self.executor, utility.resizeImage, imageData, size)
+            self.__store(self.images, (contentHash, size), image)
+
+        return image
+
+    # Downloads an image and returns its content.
+    # Raises a ValueError if the image is larger than the maximum download size.
+    # url: URL of the image
+    async def __download(self, url: str) -> bytes:
+        session = self.http.getAsyncSession()
+        timeout = aiohttp.ClientTimeout(total = self.downloadTimeout)
+
+        async with session.get(url, timeout = timeout) as response:
+            response.raise_for_status()
+
+            if response.content_length is not None and response.content_length > self.maxDownloadSize:
+                raise ValueError(f"Image '{url}' is larger than {self.maxDownloadSize} bytes")
+
+            # Reads one byte more than allowed to detect images without a Content-Length that are too large
+            imageData = await response.content.read(self.maxDownloadSize + 1)
+
+            if len(imageData) > self.maxDownloadSize:
+                raise ValueError(f"Image '{url}' is larger than {self.maxDownloadSize} bytes")
+
+            return imageData
+
+    # Returns a processed image from the cache and marks it as recently used, or None if it isn't cached.
+    # contentHash: Hash of the original image
+    # size: The size the image was scaled to
+    def __getCachedImage(self, contentHash, size) -> bytes:
+        if contentHash is None:
+            return None
+
+        image = self.images.get((contentHash, size))
+
+        if image is not None:
+            self.images.move_to_end((contentHash, size))
+
+        return image
+
+    # Adds an entry to one of the cache maps and evicts the least recently used entries if it is full.
+    # entries: OrderedDict the entry is added to
+    # key: Key of the entry
+    # value: Value of the entry
+    def __store(self, entries: OrderedDict, key, value):
+        entries[key] = value
+        entries.move_to_end(key)
+
+        while len(entries) > self.maxEntries:
+            entries.popitem(last = False)
+
+    # Returns a map with the number of images answered from the cache, processed images and cached images
+    def getStats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.images)
+        }
+
+    # Stops the pool used to scale images
+    def close(self):
+        self.executor.shutdown(wait = True)
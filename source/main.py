@@ -5,8 +5,13 @@
 from authorization import AuthorizationInfo
 from mysqlwrapper import MySQLWrapper
 from toornament import ToornamentInterface, PlayerInfo, TeamInfo
+from httpcache import ResponseCache
 from discordhelper import DiscordHelper
 from config import BotConfig
+from teamsync import TeamSync
+from migrations import MigrationRunner
+from scheduler import SyncScheduler
+from webhook import WebhookReceiver
 
 import discord
 from discord import Colour, Embed
@@ -16,11 +21,73 @@ import traceback
 
 auth = AuthorizationInfo("auth.json")
 mysql = MySQLWrapper(auth)
-toornament = ToornamentInterface(auth, mysql)
+toornament = ToornamentInterface(auth, mysql, responseCache = ResponseCache(path = "responsecache"))
 
-bot = commands.Bot(command_prefix = '.ecc')
+# The members intent is needed to index the members of tournament guilds, the message content intent to read prefix commands.
+# Both are privileged intents and have to be enabled for the bot in the Discord developer portal.
+intents = discord.Intents.default()
+intents.members = True
+intents.message_content = True
+
+bot = commands.Bot(command_prefix = '.ecc', intents = intents)
 discordHelper = DiscordHelper(bot, toornament)
-cfg = BotConfig(discordHelper, mysql)
+cfg = BotConfig(discordHelper, mysql, ttl = 300)
+teamSync = TeamSync(toornament, discordHelper, cfg)
+scheduler = SyncScheduler(teamSync, toornament, cfg)
+
+# Applies participant changes sent by toornament right away. Only started if a webhook secret is configured.
+webhook = WebhookReceiver(toornament, discordHelper, teamSync, scheduler, auth.webhookSecret, port = auth.webhookPort) if auth.webhookSecret else None
+
+# Upgrades the tables created above to the current schema version
+MigrationRunner(mysql).run()
+
+##### EVENTS #####
+
+# Starts syncing all registered tournaments in the background and starts receiving webhook notifications
+@bot.event
+async def on_ready():
+    scheduler.start()
+
+    if webhook is not None:
+        await webhook.start()
+
+# Member indexes are rebuilt whenever members join, leave or change their names.
+# Members who joined after their team was synced get their team role right away.
+@bot.event
+async def on_member_join(member):
+    discordHelper.invalidateMemberIndex(member.guild)
+
+    for tournament in toornament.tournamentRegistry.getGuildTournaments(member.guild.id):
+        roster = toornament.getRoster(tournament.tournamentID)
+
+        if roster is None:
+            continue
+
+        entry = roster.findByDiscordID(member.id) or roster.findByDiscordID(f"{member.name}#{member.discriminator}") or roster.findByDiscordID(member.name)
+        teamRole = member.guild.get_role(entry[0].roleID) if entry is not None else None
+
+        if teamRole is not None:
+            await member.add_roles(teamRole, reason = "Player on team" if entry[1] is not None else "Manager of team")
+
+@bot.event
+async def on_member_remove(member):
+    discordHelper.invalidateMemberIndex(member.guild)
+
+@bot.event
+async def on_member_update(before, after):
+    if before.nick != after.nick:
+        discordHelper.invalidateMemberIndex(after.guild)
+
+# Tournaments of guilds the bot was removed from are no longer kept in memory
+@bot.event
+async def on_guild_remove(guild):
+    toornament.tournamentRegistry.removeGuild(guild.id)
+    discordHelper.invalidateMemberIndex(guild)
+
+@bot.event
+async def on_user_update(before, after):
+    if before.name != after.name or before.discriminator != after.discriminator or getattr(before, "global_name", None) != getattr(after, "global_name", None):
+        discordHelper.invalidateMemberIndex()
 
 ##### COMMANDS #####
 
@@ -30,75 +97,77 @@ async def emote(ctx, tournamentID, emoteName, imageURL):
     await ctx.send(f"Created new emote: <:{newEmote.name}:{newEmote.id}>")
     
 
-# Tries to fetch all teams from toornament, create team roles for them and give them to players.
+# Fetches all teams from toornament, creates team roles for them and gives them to players.
+# Only teams whose data changed since the last run are patched on toornament and in the database.
+# If the scheduler is syncing the tournament already, the report of that sync is sent instead.
+# If a sync fails, the next one resumes it and skips the teams that were already synced.
 @bot.command()
 async def all(ctx: commands.Context, tournamentID: int):
 
     try:
-        # Gets team role template for this tournament
-        teamRoleTemplate = cfg.getTeamRoleTemplate(tournamentID)
-
-        # Gets information of all participating teams
-        allTeams = toornament.getAllTeamInfo(tournamentID)
-        msg = ""
-
-        for teamInfo in allTeams:
-            msg += f"\nTeam '{teamInfo.name}':\n"
-            
-            # Creates new role for this team
-            teamRole = await discordHelper.createRole(tournamentID, teamInfo.name, teamRoleTemplate)
-
-            # Tries to find manager in Discord server
-            manager = await discordHelper.getMember(ctx, teamInfo.managerDiscordID)
-
-            if manager is None:
-                msg += f"    Manager '{teamInfo.managerDiscordID}' couldn't be found\n"
-            else:
-                # Converts Manager ID to Discord Developer ID
-                msg += f"    Manager '{teamInfo.managerDiscordID}' has been found: {manager.mention} with id {manager.id}\n"
-                teamInfo.managerDiscordID = manager.id
-
-                # Gives Manager the new team role
-                await manager.add_roles(teamRole, reason = "Manager of team")
-
-            # Iterates over team lineup
-            for playerInfo in teamInfo.lineup:
-                # Tries to find player in Discord server
-                player = await discordHelper.getMember(ctx, playerInfo.discordID)
-
-                if player is None:
-                    msg += f"    Player '{playerInfo.discordID}' couldn't be found\n"
-                else:
-                    # Converts Player ID to Discord Developer ID
-                    msg += f"    Player '{playerInfo.discordID}' has been found: {player.mention} with id {player.id}\n"
-                    playerInfo.discordID = player.id
-
-                    # Gives Player the new team role
-                    await player.add_roles(teamRole, reason = "Player on team")
-            
-            # Updates team information on toornament with the converted Discord IDs
-            teamInfo.roleID = teamRole.id
-            toornament.patchTeamInfo(tournamentID, teamInfo)
-
-        await ctx.send(msg)
-        exit()
+        report = await scheduler.syncNow(tournamentID)
+
+        for message in report.getMessages():
+            await ctx.send(message)
+    except Exception as e:
+        print(traceback.format_exc())
+        await ctx.send(f"Sync of tournament {tournamentID} failed, the next sync resumes it: {e}")
+
+# Shows which roles, members and teams a sync of a tournament would change, without changing anything
+@bot.command()
+async def dryrun(ctx: commands.Context, tournamentID: int):
+
+    try:
+        report = await teamSync.syncTournament(tournamentID, dryRun = True)
+
+        for message in report.getMessages():
+            await ctx.send(message)
     except Exception as e:
         print(traceback.format_exc())
-        exit()
+        await ctx.send(f"Dry run of tournament {tournamentID} failed: {e}")
+
+# Creates an emote from the logo of every team of a tournament
+@bot.command()
+async def emotes(ctx: commands.Context, tournamentID: int):
+    allTeamInfo = await toornament.getAllTeamInfoAsync(tournamentID)
+    result = await discordHelper.createTeamEmotes(tournamentID, allTeamInfo)
+    await ctx.send(f"Emotes: {result['created']} created, {result['skipped']} skipped, {len(result['failures'])} failed")
+
+    for failure in result["failures"]:
+        await ctx.send(failure)
+
+# Looks up the team of a member, a toornament user or a team by name, short name or role
+@bot.command()
+async def team(ctx: commands.Context, tournamentID: int, *, query: str):
+    roster = await toornament.getRosterAsync(tournamentID)
+    entry = roster.findByDiscordID(query) or roster.findByUserID(query)
+    teamInfo = entry[0] if entry is not None else roster.findTeam(query)
+
+    if teamInfo is None and len(ctx.message.role_mentions) > 0:
+        teamInfo = roster.findTeamByRole(ctx.message.role_mentions[0].id)
+
+    if teamInfo is None:
+        await ctx.send(f"No team found for '{query}'")
+    elif entry is not None and entry[1] is not None:
+        await ctx.send(f"{entry[1].name} plays for {teamInfo.name}")
+    elif entry is not None:
+        await ctx.send(f"{query} manages {teamInfo.name}")
+    else:
+        lineup = ", ".join(playerInfo.name for playerInfo in teamInfo.lineup)
+        await ctx.send(f"{teamInfo.name} ({teamInfo.shortName}): {lineup}")
 
 # Creates default configuration for a certain touranment
 @bot.command()
 async def createdefault(ctx, tournamentID):
     try:
-        cfg.createDefaultConfig(tournamentID)
+        await cfg.createDefaultConfigAsync(tournamentID)
     except Exception as e:
         print(traceback.format_exc())
-        exit()
 
 # Adds a new tournament to a Discord
 @bot.command()
 async def addtournament(ctx, tournamentID):
-    toornament.addTournament(tournamentID, ctx.guild.id, "Test")
+    await toornament.addTournamentAsync(tournamentID, ctx.guild.id, "Test")
 
 print("Starting bot...")
 bot.run(auth.discordToken)
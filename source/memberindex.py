@@ -0,0 +1,72 @@
+# The MemberIndex maps all the ways a member of a guild can be referred to on toornament to the member object.
+# Players enter their Discord account in many forms, e.g. "123456789", "<@123456789>", "Name#1234", "name" or
+# their nickname on the server. The index is built with one pass over the member list of the guild, after that
+# every lookup is a single dictionary access instead of a scan of all members.
+#
+# All keys are normalized to lower case. If two members share a key, the more specific key wins:
+# ID before name#discriminator before name before global name before nickname.
+#
+# The index is a snapshot of the member list. It has to be rebuilt whenever members join, leave or change their names.
+
+import discord
+
+class MemberIndex:
+
+    # Constructor
+    # guild: Discord guild whose members are indexed
+    def __init__(self, guild: discord.Guild):
+        self.guild = guild
+        self.members = {}
+
+        for member in guild.members:
+            self.__addKey(member.id, member)
+
+        for member in guild.members:
+            self.__addKey(f"{member.name}#{member.discriminator}", member)
+
+        for member in guild.members:
+            self.__addKey(member.name, member)
+
+        for member in guild.members:
+            self.__addKey(getattr(member, "global_name", None), member)
+
+        for member in guild.members:
+            self.__addKey(member.nick, member)
+
+    # Adds a key for a member unless a more specific key of another member already uses it.
+    # key: Name, ID or nickname of the member
+    # member: Member object
+    def __addKey(self, key, member: discord.Member):
+        if key is not None:
+            self.members.setdefault(MemberIndex.normalize(key), member)
+
+    # Returns the normalized form of a member reference, e.g. "<@!123>" becomes "123" and "@Name#0001" becomes "name#0001".
+    # key: Member reference as entered by a user
+    @staticmethod
+    def normalize(key) -> str:
+        key = str(key).strip()
+
+        if key.startswith("<@") and key.endswith(">"):
+            key = key[2:-1].lstrip("!")
+        elif key.startswith("@"):
+            key = key[1:]
+
+        return key.lower()
+
+    # Returns the member referred to by a key, or None if no member matches.
+    # key: Discord ID, mention, name, name#discriminator or nickname of the member
+    def resolve(self, key) -> discord.Member:
+        if key is None:
+            return None
+
+        return self.members.get(MemberIndex.normalize(key))
+
+    # Resolves multiple member references at once. Returns a map of each given key to its member object or None.
+    # keys: Iterable of member references
+    def resolveMany(self, keys):
+        resolvedMembers = {}
+
+        for key in keys:
+            resolvedMembers[key] = self.resolve(key)
+
+        return resolvedMembers
@@ -0,0 +1,98 @@
+# The MigrationRunner upgrades the database schema of existing deployments in place.
+# Tables are still created by the classes that use them; migrations change them afterwards, e.g. by adding indexes.
+#
+# Every migration has a version number. The versions already applied are stored in the SchemaVersion table,
+# so each migration runs exactly once per database, in the order of its version. MySQL commits schema changes
+# immediately, so a migration can't be rolled back. Migrations are written to be safe to run again if the bot
+# stops before their version was recorded.
+
+from mysqlwrapper import MySQLWrapper
+
+# A single versioned change of the database schema
+class Migration:
+
+    # Constructor
+    # version: Version number, migrations are applied in ascending order
+    # description: Short description of the change
+    # upgrade: Function that applies the change. Receives the MySQLWrapper instance.
+    def __init__(self, version: int, description: str, upgrade):
+        self.version = version
+        self.description = description
+        self.upgrade = upgrade
+
+
+# Adds the indexes used to look up teams by role and by name
+def addTeamIndexes(mysql: MySQLWrapper):
+    mysql.createIndex("Teams", "TeamsByRole", ("TournamentID", "RoleID"))
+    mysql.createIndex("Teams", "TeamsByName", ("TournamentID", "Name"))
+
+
+# Adds the index used to look up tournaments by name
+def addTournamentIndexes(mysql: MySQLWrapper):
+    mysql.createIndex("Tournaments", "TournamentsByName", ("GuildID", "Name"))
+
+
+# Removes duplicate configuration values and makes the name of a value unique per tournament.
+# Of multiple values with the same name, the oldest one is kept, because it was the one returned by BotConfig.
+def addUniqueConfigNames(mysql: MySQLWrapper):
+    if mysql.doesIndexExist("BotConfig", "BotConfigByName"):
+        return
+
+    mysql.query(
+        "DELETE newer FROM BotConfig AS newer "
+        "JOIN BotConfig AS older ON newer.TournamentID=older.TournamentID AND newer.Name=older.Name AND newer.ConfigID>older.ConfigID;"
+    )
+    mysql.createIndex("BotConfig", "BotConfigByName", ("TournamentID", "Name"), unique = True)
+
+
+# Returns all migrations of the bot in the order they have to be applied
+def getMigrations():
+    return [
+        Migration(1, "Index teams by role and name", addTeamIndexes),
+        Migration(2, "Index tournaments by name", addTournamentIndexes),
+        Migration(3, "Unique configuration names per tournament", addUniqueConfigNames)
+    ]
+
+
+class MigrationRunner:
+
+    # Constructor
+    # mysqlWrapper: MySQLWrapper instance
+    # migrations: Optional list of migrations. If None, all migrations of the bot are used.
+    def __init__(self, mysqlWrapper: MySQLWrapper, migrations = None):
+        self.mysql = mysqlWrapper
+        self.migrations = sorted(migrations if migrations is not None else getMigrations(), key = lambda migration: migration.version)
+        self.__initVersionTable()
+
+    # Creates the table storing the applied schema versions
+    def __initVersionTable(self):
+        self.mysql.createTable("SchemaVersion", (
+            "Version INT NOT NULL, "
+            "Description VARCHAR(255) NOT NULL, "
+            "AppliedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+            "PRIMARY KEY(Version)"
+        ))
+
+    # Returns the highest schema version applied to the database, or 0 if no migration was applied yet
+    def getCurrentVersion(self) -> int:
+        results = self.mysql.fetch("SELECT MAX(Version) FROM SchemaVersion;")
+
+        if results is None or results[0][0] is None:
+            return 0
+
+        return results[0][0]
+
+    # Applies all migrations newer than the current schema version and returns the list of applied versions
+    def run(self):
+        currentVersion = self.getCurrentVersion()
+        appliedVersions = []
+
+        for migration in self.migrations:
+            if migration.version <= currentVersion:
+                continue
+
+            migration.upgrade(self.mysql)
+            self.mysql.query("INSERT INTO SchemaVersion (Version, Description) VALUES (%s, %s);", (migration.version, migration.description,))
+            appliedVersions += [migration.version]
+
+        return appliedVersions
@@ -1,62 +1,468 @@
 # This class is a wrapper for MySQL-database operations.
-# Its main purpose it to automatically renew the database connection if it expired.
-# Additionally it provides various helper methods to simply recurring operations.
+# It keeps a pool of database connections. Every operation checks out its own connection and returns it afterwards,
+# so concurrent commands and background tasks never share a cursor or read each other's results.
+# The pool holds a fixed number of connections and opens additional overflow connections under load,
+# which are closed again once they are returned and enough idle connections are left.
+#
+# Connections that were idle for a while are checked with a ping before they are used. If the connection to the
+# server was lost, it is replaced and the operation is repeated transparently.
+#
+# All operations also have asynchronous variants that run on a thread pool with one thread per connection,
+# so SQL queries don't block the event loop of the bot.
+#
+# Writes can be grouped into a unit of work: While a unit of work is active, all operations passed to write and
+# upsert are buffered and sent to the server in one transaction when the unit of work ends. Consecutive rows of the
+# same operation are sent with executemany, so e.g. 300 upserts of team rows become one statement and one commit.
+# Reads within a unit of work don't see its buffered writes. Callbacks registered with afterCommit run once the
+# writes were committed, and never if the unit of work is discarded, e.g. to update caches.
+# Additionally the class provides various helper methods to simplify recurring operations.
 
 from authorization import AuthorizationInfo
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import MySQLdb
+import asyncio
+import contextvars
+import functools
+import threading
+import queue
+import time
+
+# MySQL client errors meaning that the connection to the server was lost:
+# 2006: "MySQL server has gone away", 2013: "Lost connection to MySQL server during query"
+CONNECTION_LOST_ERRORS = (2006, 2013)
+
+# Unit of work that buffers the writes of the current thread or asyncio task, or None if writes are executed directly
+activeUnitOfWork = contextvars.ContextVar("activeUnitOfWork", default = None)
+
+# Returns True if the given error means that the connection to the server was lost
+def isConnectionLost(err: Exception) -> bool:
+    return isinstance(err, MySQLdb.OperationalError) and len(err.args) > 0 and err.args[0] in CONNECTION_LOST_ERRORS
+
+# Returns the given query results, or None if they are empty or invalid.
+# results: Rows as returned by fetchall
+def validateResults(results):
+    if results is None or len(results) == 0 or results[0][0] is None:
+        return None
+    else:
+        return results
+
+
+# A transaction on a single pooled connection. All operations are committed together once the transaction ends.
+# Instances are created by MySQLWrapper.transaction and must not be used after the transaction ended.
+class Transaction:
+
+    # Constructor
+    # connection: Database connection the transaction runs on
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+
+    # Executes an operation within the transaction.
+    # operation: SQL-command to be executed
+    # params: Parameters to be sanitized and inserted into the SQL-command
+    def query(self, operation: str, params = None):
+        self.cursor.execute(operation, params)
+
+    # Executes an operation within the transaction once for every set of parameters.
+    # operation: SQL-command to be executed
+    # paramsList: List of parameters, one entry per execution
+    def executemany(self, operation: str, paramsList):
+        paramsList = list(paramsList)
+
+        if len(paramsList) > 0:
+            self.cursor.executemany(operation, paramsList)
+
+    # Executes an operation within the transaction and returns its results, or None if there are none.
+    # operation: SQL-command to be executed
+    # params: Parameters to be sanitized and inserted into the SQL-command
+    def fetch(self, operation: str, params = None):
+        self.cursor.execute(operation, params)
+        return validateResults(self.cursor.fetchall())
+
+
+# Buffers write operations until they are flushed together in a single transaction.
+# Instances are created by MySQLWrapper.unitOfWork and are shared by all tasks and threads started within it.
+class UnitOfWork:
+
+    def __init__(self):
+        # List of tuples of operation and the list of its parameters. Consecutive writes of the same operation share one entry.
+        self.operations = []
+        self.lock = threading.Lock()
+
+        # Functions called after the buffered writes were committed
+        self.callbacks = []
+
+    # Buffers a write operation.
+    # operation: SQL-command to be executed
+    # params: Parameters to be sanitized and inserted into the SQL-command
+    def add(self, operation: str, params = None):
+        with self.lock:
+            if len(self.operations) > 0 and self.operations[-1][0] == operation:
+                self.operations[-1][1].append(params)
+            else:
+                self.operations.append((operation, [params]))
+
+    # Registers a function that is called without arguments after the buffered writes were committed.
+    # callback: Function to be called
+    def addCallback(self, callback):
+        with self.lock:
+            self.callbacks.append(callback)
+
+    # Calls all registered callbacks in the order they were added. Called after the writes were committed.
+    def runCallbacks(self):
+        with self.lock:
+            callbacks = self.callbacks
+            self.callbacks = []
+
+        for callback in callbacks:
+            callback()
+
+    # Returns the number of buffered writes
+    def getSize(self) -> int:
+        with self.lock:
+            return sum(len(paramsList) for _, paramsList in self.operations)
+
+    # Executes all buffered writes within the given transaction in the order they were added.
+    # transaction: Transaction the writes are executed in
+    def flush(self, transaction: Transaction):
+        with self.lock:
+            operations = self.operations
+            self.operations = []
+
+        for operation, paramsList in operations:
+            transaction.executemany(operation, paramsList)
+
 
 class MySQLWrapper:
 
     # Constructor
-    # Initiates a database connection using the provided authorization information
+    # Opens the initial database connections using the provided authorization information
     # authorization: Authorization info object
-    def __init__(self, authorization: AuthorizationInfo):
+    # poolSize: Number of connections that are kept open
+    # maxOverflow: Number of additional connections that may be opened temporarily if all pooled connections are in use
+    # checkoutTimeout: Seconds to wait for a free connection once the pool and all overflow connections are in use
+    # healthCheckInterval: Connections that were idle for longer than this many seconds are pinged before they are used
+    def __init__(self, authorization: AuthorizationInfo, poolSize: int = 5, maxOverflow: int = 5, checkoutTimeout: float = 30.0, healthCheckInterval: float = 30.0):
         self.auth = authorization
-        self.__connectToDatabase()
+        self.poolSize = poolSize
+        self.maxOverflow = maxOverflow
+        self.checkoutTimeout = checkoutTimeout
+        self.healthCheckInterval = healthCheckInterval
+
+        # Idle connections are stored as tuples of connection and time they were returned
+        self.pool = queue.LifoQueue()
+        self.openConnections = 0
+        self.lock = threading.Lock()
 
-    # Tries to connect to the database using the saved authorization information
+        # Runs the asynchronous operations. There is one thread for every connection that may be opened.
+        self.executor = ThreadPoolExecutor(max_workers = poolSize + maxOverflow, thread_name_prefix = "mysql")
+
+        for _ in range(poolSize):
+            self.pool.put((self.__connectToDatabase(), time.monotonic()))
+            self.openConnections += 1
+
+    # Opens a new connection using the saved authorization information
     def __connectToDatabase(self):
-        self.db = MySQLdb.connect(
+        return MySQLdb.connect(
             host = self.auth.mysqlIP,
             user = self.auth.mysqlUser,
             passwd = self.auth.mysqlPassword,
             db = self.auth.mysqlDatabase
         )
 
-        self.cursor = self.db.cursor()
+    # Takes a connection from the pool. Opens an overflow connection if no connection is idle,
+    # or waits for one to be returned if no more connections may be opened.
+    def __checkout(self):
+        try:
+            connection, idleSince = self.pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                canOpenConnection = self.openConnections < self.poolSize + self.maxOverflow
+
+                if canOpenConnection:
+                    self.openConnections += 1
+
+            if canOpenConnection:
+                try:
+                    return self.__connectToDatabase()
+                except:
+                    self.__discard(None)
+                    raise
+
+            try:
+                connection, idleSince = self.pool.get(timeout = self.checkoutTimeout)
+            except queue.Empty:
+                raise TimeoutError(f"No database connection became available within {self.checkoutTimeout} seconds")
+
+        # Replaces connections that were closed by the server while they were idle
+        if time.monotonic() - idleSince > self.healthCheckInterval:
+            try:
+                connection.ping()
+            except MySQLdb.OperationalError:
+                try:
+                    connection = self.__reconnect(connection)
+                except:
+                    self.__discard(None)
+                    raise
+
+        return connection
+
+    # Returns a connection to the pool. Overflow connections are closed if enough connections are idle.
+    # connection: Connection that was checked out before
+    def __checkin(self, connection):
+        if self.pool.qsize() >= self.poolSize:
+            self.__discard(connection)
+        else:
+            self.pool.put((connection, time.monotonic()))
+
+    # Closes a connection and removes it from the count of open connections.
+    # connection: Connection to be closed, or None if it couldn't be opened
+    def __discard(self, connection):
+        if connection is not None:
+            try:
+                connection.close()
+            except MySQLdb.Error:
+                pass
+
+        with self.lock:
+            self.openConnections -= 1
+
+    # Closes a broken connection and returns a new one in its place
+    # connection: The broken connection
+    def __reconnect(self, connection):
+        try:
+            connection.close()
+        except MySQLdb.Error:
+            pass
+
+        return self.__connectToDatabase()
+
+    # Runs a function with a cursor of a pooled connection and commits afterwards.
+    # If the connection to the server was lost, the connection is replaced and the function is run again.
+    # operation: Function that receives the cursor and returns the result of the operation
+    def __run(self, operation):
+        connection = self.__checkout()
+
+        try:
+            try:
+                result = operation(connection.cursor())
+            except MySQLdb.OperationalError as opErr:
+                if not isConnectionLost(opErr):
+                    raise
+
+                connection = self.__reconnect(connection)
+                result = operation(connection.cursor())
+
+            connection.commit()
 
-    # Tries to execute a given operation. Restarts the database connection if it timed out.
+        except:
+            self.__rollbackAndCheckin(connection)
+            raise
+
+        self.__checkin(connection)
+        return result
+
+    # Rolls back the current transaction of a connection and returns it to the pool.
+    # Connections whose rollback failed are closed instead.
+    # connection: Connection to be rolled back
+    def __rollbackAndCheckin(self, connection):
+        try:
+            connection.rollback()
+        except MySQLdb.Error:
+            self.__discard(connection)
+            return
+
+        self.__checkin(connection)
+
+    # Executes a given operation on a pooled connection and commits it.
     # operation: SQL-command to be executed
     # params: Parameters to be sanitized and inserted into the SQL-command
     def query(self, operation: str, params = None):
-        try:
-            self.cursor.execute(operation, params)
+        self.__run(lambda cursor: cursor.execute(operation, params))
+
+    # Executes a given operation on a pooled connection and returns its results. If they are invalid, None is returned.
+    # operation: SQL-command to be executed
+    # params: Parameters to be sanitized and inserted into the SQL-command
+    def fetch(self, operation: str, params = None):
+        def fetchOperation(cursor):
+            cursor.execute(operation, params)
+            return validateResults(cursor.fetchall())
+
+        return self.__run(fetchOperation)
+
+    # Executes a given operation once for every set of parameters on a pooled connection and commits them together.
+    # For INSERT and REPLACE operations all rows are sent to the server in a single statement.
+    # operation: SQL-command to be executed
+    # paramsList: List of parameters, one entry per execution
+    def executemany(self, operation: str, paramsList):
+        paramsList = list(paramsList)
+
+        if len(paramsList) > 0:
+            self.__run(lambda cursor: cursor.executemany(operation, paramsList))
+
+    # Runs a blocking function on the thread pool of the database wrapper and returns its result without blocking the event loop.
+    # Can be used to run methods that perform multiple database operations asynchronously.
+    # function: Function to be run
+    # args, kwargs: Arguments passed to the function
+    async def runAsync(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
 
-        except MySQLdb.OperationalError as opErr:
-            # Checks for error 2006: "MySQL database has gone away"
-            if opErr.errno == 2006:
-                self.__connectToDatabase()
-                self.cursor.execute(operation, params)
+        # Runs the function in a copy of the current context, so an active unit of work is also active on the thread pool
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, function, *args, **kwargs))
 
-            # Raises other kinds of errors
+    # Asynchronous version of query.
+    async def queryAsync(self, operation: str, params = None):
+        await self.runAsync(self.query, operation, params)
+
+    # Asynchronous version of fetch.
+    async def fetchAsync(self, operation: str, params = None):
+        return await self.runAsync(self.fetch, operation, params)
+
+    # Asynchronous version of executemany.
+    async def executemanyAsync(self, operation: str, paramsList):
+        await self.runAsync(self.executemany, operation, paramsList)
+
+    # Context manager that runs multiple operations on one connection as a single transaction.
+    # The transaction is committed when the block ends and rolled back if an exception is raised, e.g.:
+    #
+    # with mysql.transaction() as transaction:
+    #     transaction.query("UPDATE ...", (...))
+    #     results = transaction.fetch("SELECT ...", (...))
+    @contextmanager
+    def transaction(self):
+        connection = self.__checkout()
+
+        try:
+            yield Transaction(connection)
+            connection.commit()
+
+        except BaseException as err:
+            # Connections that were lost during the transaction are replaced, the transaction isn't repeated
+            if isConnectionLost(err):
+                self.__discard(connection)
             else:
-                raise opErr
+                self.__rollbackAndCheckin(connection)
+
+            raise
+
+        self.__checkin(connection)
+
+    # Context manager that buffers all writes until the block ends and then executes them in one transaction.
+    # If an exception is raised, the buffered writes are discarded. Nested units of work join the outer one, e.g.:
+    #
+    # with mysql.unitOfWork():
+    #     for teamInfo in allTeamInfo:
+    #         toornament.saveTeamInfo(tournamentID, teamInfo)
+    @contextmanager
+    def unitOfWork(self):
+        if activeUnitOfWork.get() is not None:
+            yield activeUnitOfWork.get()
+            return
+
+        unitOfWork = UnitOfWork()
+        token = activeUnitOfWork.set(unitOfWork)
+
+        try:
+            yield unitOfWork
+        finally:
+            activeUnitOfWork.reset(token)
+
+        self.__flush(unitOfWork)
 
-    # Returns the results of the last query. If they are invalid, None is returned.
-    def fetchResults(self):
-        results = self.cursor.fetchall()
+    # Asynchronous version of unitOfWork. The buffered writes are flushed without blocking the event loop.
+    @asynccontextmanager
+    async def unitOfWorkAsync(self):
+        if activeUnitOfWork.get() is not None:
+            yield activeUnitOfWork.get()
+            return
 
-        if results is not None and results[0][0] is None:
-            return None
+        unitOfWork = UnitOfWork()
+        token = activeUnitOfWork.set(unitOfWork)
+
+        try:
+            yield unitOfWork
+        finally:
+            activeUnitOfWork.reset(token)
+
+        await self.runAsync(self.__flush, unitOfWork)
+
+    # Executes all writes buffered by a unit of work in one transaction and then calls its callbacks
+    # unitOfWork: The unit of work to be flushed
+    def __flush(self, unitOfWork: UnitOfWork):
+        if unitOfWork.getSize() > 0:
+            with self.transaction() as transaction:
+                unitOfWork.flush(transaction)
+
+        unitOfWork.runCallbacks()
+
+    # Calls a function once the current writes are committed: Right away if no unit of work is active,
+    # otherwise after the unit of work was flushed. If the unit of work is discarded, the function isn't called.
+    # callback: Function called without arguments
+    def afterCommit(self, callback):
+        unitOfWork = activeUnitOfWork.get()
+
+        if unitOfWork is None:
+            callback()
+        else:
+            unitOfWork.addCallback(callback)
+
+    # Executes a write operation, or buffers it if a unit of work is active.
+    # operation: SQL-command to be executed
+    # params: Parameters to be sanitized and inserted into the SQL-command
+    def write(self, operation: str, params = None):
+        unitOfWork = activeUnitOfWork.get()
+
+        if unitOfWork is None:
+            self.query(operation, params)
+        else:
+            unitOfWork.add(operation, params)
+
+    # Executes a write operation once for every set of parameters, or buffers them if a unit of work is active.
+    # operation: SQL-command to be executed
+    # paramsList: List of parameters, one entry per execution
+    def writeMany(self, operation: str, paramsList):
+        unitOfWork = activeUnitOfWork.get()
+
+        if unitOfWork is None:
+            self.executemany(operation, paramsList)
         else:
-            return results
+            for params in paramsList:
+                unitOfWork.add(operation, params)
+
+    # Returns an INSERT operation that updates the given columns of existing rows instead of failing on duplicate keys.
+    # table: Name of the table
+    # columns: Names of all inserted columns
+    # updateColumns: Names of the columns that are updated if the row already exists
+    @staticmethod
+    def getUpsertOperation(table: str, columns, updateColumns) -> str:
+        columnList = ", ".join(columns)
+        valueList = ", ".join(["%s"] * len(columns))
+        updateList = ", ".join(f"{column}=VALUES({column})" for column in updateColumns)
+        return f"INSERT INTO {table} ({columnList}) VALUES ({valueList}) ON DUPLICATE KEY UPDATE {updateList};"
+
+    # Inserts a row or updates it if a row with the same key exists. Buffered if a unit of work is active.
+    # table: Name of the table
+    # columns: Names of all inserted columns
+    # values: Values of the row in the order of the columns
+    # updateColumns: Names of the columns that are updated if the row already exists
+    def upsert(self, table: str, columns, values, updateColumns):
+        self.write(self.getUpsertOperation(table, columns, updateColumns), tuple(values))
+
+    # Inserts or updates multiple rows with a single multi-row statement. Buffered if a unit of work is active.
+    # table: Name of the table
+    # columns: Names of all inserted columns
+    # rows: List of rows, each containing the values in the order of the columns
+    # updateColumns: Names of the columns that are updated if the row already exists
+    def upsertMany(self, table: str, columns, rows, updateColumns):
+        self.writeMany(self.getUpsertOperation(table, columns, updateColumns), [tuple(values) for values in rows])
 
     # Returns True if a table with the given name exists in the selected database.
     # name: The name of the table to be checked for
     def doesTableExist(self, name: str) -> bool:
-        self.cursor.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema=%s AND table_name=%s LIMIT 1;", (self.auth.mysqlDatabase, name,))
-        result = self.cursor.fetchall()
-        return result[0][0] > 0
+        result = self.fetch("SELECT COUNT(*) FROM information_schema.tables WHERE table_schema=%s AND table_name=%s LIMIT 1;", (self.auth.mysqlDatabase, name,))
+        return result is not None and result[0][0] > 0
 
     # Creates a new table.
     # name: The name of the table to be created
@@ -66,9 +472,40 @@ class MySQLWrapper:
         # Checks if table exists, if overwrite is True deletes it, otherwise leaves method
         if self.doesTableExist(name):
             if overwrite:
-                self.cursor.execute(f"DROP TABLE %s;", (name,))
+                self.query(f"DROP TABLE {name};")
             else:
                 return
 
         # Creates new table
-        self.cursor.execute(f"CREATE TABLE {name} ({columns});", ())
+        self.query(f"CREATE TABLE {name} ({columns});")
+
+    # Returns True if the given table has an index with the given name.
+    # table: The name of the table
+    # name: The name of the index to be checked for
+    def doesIndexExist(self, table: str, name: str) -> bool:
+        result = self.fetch("SELECT COUNT(*) FROM information_schema.statistics WHERE table_schema=%s AND table_name=%s AND index_name=%s LIMIT 1;", (self.auth.mysqlDatabase, table, name,))
+        return result is not None and result[0][0] > 0
+
+    # Creates an index on a table. Does nothing if the table already has an index with the same name.
+    # table: The name of the table
+    # name: The name of the index
+    # columns: Names of the indexed columns
+    # unique: If True, no two rows may have the same values in the indexed columns
+    def createIndex(self, table: str, name: str, columns, unique: bool = False):
+        if self.doesIndexExist(table, name):
+            return
+
+        indexType = "UNIQUE INDEX" if unique else "INDEX"
+        self.query(f"CREATE {indexType} {name} ON {table} ({', '.join(columns)});")
+
+    # Stops the thread pool and closes all idle connections of the pool
+    def close(self):
+        self.executor.shutdown(wait = True)
+
+        while True:
+            try:
+                connection, _ = self.pool.get_nowait()
+            except queue.Empty:
+                return
+
+            self.__discard(connection)
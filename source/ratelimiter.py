@@ -0,0 +1,173 @@
+# Rate limiting for web APIs based on the token bucket algorithm.
+# A bucket is refilled with tokens at a constant rate up to a maximum number of tokens (the burst size).
+# Every request takes one token. If the bucket is empty, the request waits until a new token is available.
+#
+# Waiting requests reserve their token in advance, which lets the token count become negative.
+# Because of this the lock protecting a bucket is only held for a few calculations and never while waiting,
+# so the same bucket can be shared by multiple threads and asyncio tasks at the same time.
+#
+# Buckets adapt to the responses of the server: After a 429 response their rate is halved and requests are
+# paused for as long as the server asks. Every successful response afterwards raises the rate a bit until
+# the configured rate is reached again.
+
+import asyncio
+import threading
+import time
+import datetime
+import email.utils
+
+class TokenBucket:
+
+    # Constructor
+    # rate: Number of tokens added to the bucket per second
+    # burst: Maximum number of tokens in the bucket, i.e. how many requests can be sent at once
+    # minRate: Lowest rate the bucket slows down to after repeated 429 responses. Defaults to 1/8 of the rate.
+    # recoveryStep: Tokens per second the rate increases with every successful response. Defaults to 1/10 of the rate.
+    def __init__(self, rate: float, burst: int = 1, minRate: float = None, recoveryStep: float = None):
+        self.maxRate = rate
+        self.rate = rate
+        self.burst = burst
+        self.minRate = minRate if minRate is not None else rate / 8
+        self.recoveryStep = recoveryStep if recoveryStep is not None else rate / 10
+
+        # The token count is valid at the time of the last refill, which lies in the future while the bucket is paused
+        self.tokens = float(burst)
+        self.lastRefill = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Adds all tokens generated since the last refill. Must be called with the lock held.
+    # now: Current monotonic time
+    def __refill(self, now: float):
+        if now > self.lastRefill:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.lastRefill) * self.rate)
+            self.lastRefill = now
+
+    # Takes a token from the bucket and returns how many seconds the caller has to wait before it may use it.
+    def __reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.__refill(now)
+            self.tokens -= 1
+
+            pauseTime = max(0.0, self.lastRefill - now)
+            return pauseTime + max(0.0, -self.tokens) / self.rate
+
+    # Waits until a request may be sent. Blocks the calling thread.
+    def acquire(self):
+        waitTime = self.__reserve()
+
+        if waitTime > 0:
+            time.sleep(waitTime)
+
+    # Waits until a request may be sent without blocking the event loop.
+    async def acquireAsync(self):
+        waitTime = self.__reserve()
+
+        if waitTime > 0:
+            await asyncio.sleep(waitTime)
+
+    # Stops handing out tokens for a certain time without changing the rate.
+    # seconds: Number of seconds until the next request may be sent
+    def pause(self, seconds: float):
+        with self.lock:
+            now = time.monotonic()
+            self.__refill(now)
+            self.tokens = min(self.tokens, 0.0)
+            self.lastRefill = max(self.lastRefill, now + seconds)
+
+    # Slows the bucket down after the server rejected a request because of its rate limit.
+    # retryAfter: Seconds the server asked to wait. If None, the bucket waits for one token at the reduced rate.
+    def penalize(self, retryAfter: float = None):
+        with self.lock:
+            self.rate = max(self.minRate, self.rate / 2)
+
+        self.pause(retryAfter if retryAfter is not None else 1 / self.rate)
+
+    # Speeds the bucket up again after a successful request until the configured rate is reached.
+    def reward(self):
+        with self.lock:
+            if self.rate < self.maxRate:
+                self.__refill(time.monotonic())
+                self.rate = min(self.maxRate, self.rate + self.recoveryStep)
+
+
+# Manages one token bucket per endpoint family of an API, e.g. one for OAuth2 and one for participant endpoints.
+# Families without their own bucket share the default bucket.
+class RateLimiter:
+
+    # Constructor
+    # buckets: Map of endpoint family names to their token buckets
+    # defaultBucket: Bucket used for all families that aren't in the map. Defaults to 3 requests per second.
+    def __init__(self, buckets = None, defaultBucket: TokenBucket = None):
+        self.buckets = dict(buckets) if buckets is not None else {}
+        self.defaultBucket = defaultBucket if defaultBucket is not None else TokenBucket(rate = 3, burst = 3)
+
+    # Returns the token bucket used for an endpoint family.
+    # family: Name of the endpoint family
+    def getBucket(self, family: str) -> TokenBucket:
+        return self.buckets.get(family, self.defaultBucket)
+
+    # Waits until a request to an endpoint family may be sent. Blocks the calling thread.
+    # family: Name of the endpoint family
+    def acquire(self, family: str):
+        self.getBucket(family).acquire()
+
+    # Waits until a request to an endpoint family may be sent without blocking the event loop.
+    # family: Name of the endpoint family
+    async def acquireAsync(self, family: str):
+        await self.getBucket(family).acquireAsync()
+
+    # Adapts the bucket of an endpoint family to the response of the server.
+    # A 429 response slows the bucket down, exhausted rate limit headers pause it until the limit is reset.
+    # family: Name of the endpoint family the request was sent to
+    # statusCode: HTTP status code of the response
+    # headers: Response headers
+    def update(self, family: str, statusCode: int, headers):
+        bucket = self.getBucket(family)
+
+        if statusCode == 429:
+            bucket.penalize(RateLimiter.__getRetryAfter(headers))
+            return
+
+        remaining = RateLimiter.__getFloatHeader(headers, "X-RateLimit-Remaining")
+
+        if remaining is not None and remaining < 1:
+            resetTime = RateLimiter.__getResetTime(headers)
+            bucket.pause(resetTime if resetTime is not None else 1 / bucket.rate)
+        else:
+            bucket.reward()
+
+    # Returns the value of a header as float, or None if it doesn't exist or isn't a number.
+    @staticmethod
+    def __getFloatHeader(headers, name: str):
+        try:
+            return float(headers.get(name))
+        except (TypeError, ValueError):
+            return None
+
+    # Returns the seconds given by the Retry-After header, which can either be a number of seconds or a HTTP date.
+    @staticmethod
+    def __getRetryAfter(headers):
+        retryAfter = RateLimiter.__getFloatHeader(headers, "Retry-After")
+
+        if retryAfter is None and headers.get("Retry-After") is not None:
+            try:
+                retryDate = email.utils.parsedate_to_datetime(headers.get("Retry-After"))
+                retryAfter = (retryDate - datetime.datetime.now(retryDate.tzinfo)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+
+        return max(retryAfter, 0.0) if retryAfter is not None else None
+
+    # Returns the seconds until the rate limit is reset. The X-RateLimit-Reset header can either contain
+    # the number of seconds or a unix timestamp.
+    @staticmethod
+    def __getResetTime(headers):
+        resetTime = RateLimiter.__getFloatHeader(headers, "X-RateLimit-Reset")
+
+        if resetTime is None:
+            return None
+        elif resetTime > 1e9:
+            return max(resetTime - time.time(), 0.0)
+        else:
+            return resetTime
@@ -0,0 +1,197 @@
+# The RoleReconciler brings the team roles of a tournament guild in line with the teams of the tournament.
+# It works in two steps:
+#  - plan: Reads the guild roles and the stored role IDs once and decides which roles have to be created or renamed
+#          and which members are missing the role of their team. Nothing is changed on Discord in this step.
+#  - apply: Creates the missing roles and assigns roles to members. Requests run concurrently, but a semaphore
+#           limits how many are sent at once, so discord.py can stay within the Discord rate limits.
+#
+# Roles are never created twice: A team reuses the role stored in the Teams table. If that role doesn't exist,
+# an unmanaged role with the team name and the permissions of the team role template is adopted instead.
+#
+# Teams can also be reconciled one by one as they arrive, e.g. in the sync pipeline: The guild roles are indexed once
+# with indexRoles, and the RoleIndex is passed to every call of plan, so each role is still adopted by one team only.
+
+import asyncio
+import discord
+
+from discordhelper import DiscordHelper
+from toornament import TeamInfo
+
+# Changes that are needed to bring the team roles of a tournament up to date
+class RolePlan:
+
+    def __init__(self, tournamentID):
+        self.tournamentID = tournamentID
+
+        # Maps participant IDs to the existing role of the team
+        self.teamRoles = {}
+
+        # Teams that need a new role
+        self.rolesToCreate = []
+
+        # Tuples of existing roles and the teams whose names they have to be renamed to
+        self.rolesToRename = []
+
+        # Tuples of member, participant ID of the team and reason for all missing role assignments
+        self.assignments = []
+
+    # Returns True if nothing needs to be changed on Discord
+    def isEmpty(self) -> bool:
+        return len(self.rolesToCreate) == 0 and len(self.rolesToRename) == 0 and len(self.assignments) == 0
+
+
+# Snapshot of the roles of a guild used to plan role changes
+class RoleIndex:
+
+    def __init__(self):
+        # Maps role IDs to roles
+        self.rolesByID = {}
+
+        # Maps names to roles that can be adopted by a team. Adopted roles are removed.
+        self.rolesByName = {}
+
+
+# Result of applying a RolePlan
+class RoleReport:
+
+    def __init__(self, tournamentID):
+        self.tournamentID = tournamentID
+
+        # Maps participant IDs to the role of the team after the plan was applied
+        self.teamRoles = {}
+
+        # Participant IDs of all teams that got a new role
+        self.createdTeams = set()
+
+        self.renamed = 0
+        self.assigned = 0
+        self.failures = []
+
+    # Returns the report as a list of text lines
+    def getLines(self):
+        lines = [f"Roles: {len(self.createdTeams)} created, {self.renamed} renamed, {self.assigned} assigned, {len(self.failures)} failed"]
+        return lines + self.failures
+
+
+class RoleReconciler:
+
+    # Constructor
+    # discordHelper: DiscordHelper instance
+    # maxConcurrency: Maximum number of Discord requests sent at the same time
+    def __init__(self, discordHelper: DiscordHelper, maxConcurrency: int = 5):
+        self.discordHelper = discordHelper
+        self.maxConcurrency = maxConcurrency
+
+    # Indexes the roles of a tournament guild. Roles of other teams and the template itself can't be adopted by name.
+    # tournamentID: Toornament ID of the tournament
+    # storedTeams: Teams stored in the database as returned by ToornamentInterface.getStoredTeams
+    # roleTemplate: Optional team role template. Only roles with the same permissions can be adopted by name.
+    def indexRoles(self, tournamentID, storedTeams, roleTemplate: discord.Role = None) -> RoleIndex:
+        guild = self.discordHelper.requireGuild(tournamentID)
+        roleIndex = RoleIndex()
+        reservedRoleIDs = set(storedTeam[0] for storedTeam in storedTeams.values())
+
+        if roleTemplate is not None:
+            reservedRoleIDs.add(roleTemplate.id)
+
+        for role in guild.roles:
+            roleIndex.rolesByID[role.id] = role
+
+            if role.id not in reservedRoleIDs and not role.managed and (roleTemplate is None or role.permissions == roleTemplate.permissions):
+                roleIndex.rolesByName.setdefault(role.name, role)
+
+        return roleIndex
+
+    # Compares the teams of a tournament with the roles of its guild and returns the needed changes as a RolePlan.
+    # tournamentID: Toornament ID of the tournament
+    # allTeamInfo: List of all teams of the tournament
+    # storedTeams: Teams stored in the database as returned by ToornamentInterface.getStoredTeams
+    # teamMembers: Maps participant IDs to a list of tuples of member object and reason for all members of a team
+    # roleTemplate: Optional team role template. Only roles with the same permissions can be adopted by name.
+    # roleIndex: Optional index of the guild roles shared by multiple calls. If None, the roles are indexed for this call.
+    def plan(self, tournamentID, allTeamInfo, storedTeams, teamMembers, roleTemplate: discord.Role = None, roleIndex: RoleIndex = None) -> RolePlan:
+        if roleIndex is None:
+            roleIndex = self.indexRoles(tournamentID, storedTeams, roleTemplate)
+
+        plan = RolePlan(tournamentID)
+
+        for teamInfo in allTeamInfo:
+            participantID = str(teamInfo.id)
+            storedTeam = storedTeams.get(participantID)
+            teamRole = roleIndex.rolesByID.get(storedTeam[0]) if storedTeam is not None else None
+
+            # Adopts a role created by an earlier run that wasn't saved to the database
+            if teamRole is None:
+                teamRole = roleIndex.rolesByName.pop(teamInfo.name, None)
+
+            if teamRole is None:
+                plan.rolesToCreate += [teamInfo]
+            else:
+                plan.teamRoles[participantID] = teamRole
+
+                if teamRole.name != teamInfo.name:
+                    plan.rolesToRename += [(teamRole, teamInfo)]
+
+            # Members only need the role if they don't have it yet. Members listed twice get it once.
+            assignedMembers = set()
+
+            for member, reason in teamMembers.get(participantID, []):
+                if member.id not in assignedMembers and (teamRole is None or teamRole not in member.roles):
+                    plan.assignments += [(member, participantID, reason)]
+                    assignedMembers.add(member.id)
+
+        return plan
+
+    # Applies a RolePlan to the guild of its tournament and returns a RoleReport.
+    # Roles are created and renamed first, then all members get their roles concurrently.
+    # plan: RolePlan to be applied
+    # roleTemplate: Optional role object. If provided, all settings of the template are copied to new roles.
+    # report: Optional RoleReport shared by multiple calls. If None, a new report is returned.
+    # semaphore: Optional semaphore shared by multiple calls. If None, a new one limits the requests of this call.
+    async def apply(self, plan: RolePlan, roleTemplate: discord.Role = None, report: RoleReport = None, semaphore: asyncio.Semaphore = None) -> RoleReport:
+        if report is None:
+            report = RoleReport(plan.tournamentID)
+
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.maxConcurrency)
+
+        report.teamRoles.update(plan.teamRoles)
+
+        await asyncio.gather(*[self.__createRole(plan.tournamentID, teamInfo, roleTemplate, semaphore, report) for teamInfo in plan.rolesToCreate])
+        await asyncio.gather(*[self.__renameRole(teamRole, teamInfo.name, semaphore, report) for teamRole, teamInfo in plan.rolesToRename])
+        await asyncio.gather(*[self.__assignRole(member, participantID, reason, semaphore, report) for member, participantID, reason in plan.assignments])
+
+        return report
+
+    # Creates the role of a team and adds it to the report
+    async def __createRole(self, tournamentID, teamInfo: TeamInfo, roleTemplate, semaphore: asyncio.Semaphore, report: RoleReport):
+        async with semaphore:
+            try:
+                teamRole = await self.discordHelper.createRole(tournamentID, teamInfo.name, roleTemplate)
+                report.teamRoles[str(teamInfo.id)] = teamRole
+                report.createdTeams.add(str(teamInfo.id))
+            except discord.HTTPException as err:
+                report.failures += [f"Role for team '{teamInfo.name}' couldn't be created: {err}"]
+
+    # Renames the role of a team
+    async def __renameRole(self, teamRole: discord.Role, name: str, semaphore: asyncio.Semaphore, report: RoleReport):
+        async with semaphore:
+            try:
+                await teamRole.edit(name = name)
+                report.renamed += 1
+            except discord.HTTPException as err:
+                report.failures += [f"Role '{teamRole.name}' couldn't be renamed to '{name}': {err}"]
+
+    # Gives a member the role of their team. Skipped if the team role couldn't be created.
+    async def __assignRole(self, member: discord.Member, participantID: str, reason: str, semaphore: asyncio.Semaphore, report: RoleReport):
+        teamRole = report.teamRoles.get(participantID)
+
+        if teamRole is None:
+            return
+
+        async with semaphore:
+            try:
+                await member.add_roles(teamRole, reason = reason)
+                report.assigned += 1
+            except discord.HTTPException as err:
+                report.failures += [f"Role '{teamRole.name}' couldn't be given to {member}: {err}"]
@@ -0,0 +1,116 @@
+# The RosterIndex answers which team and player a Discord account, toornament user, team name or team role belongs to.
+# It is built from all teams of a tournament with one pass over their lineups. After that every lookup is a single
+# dictionary access instead of a scan of all teams and players.
+#
+# The index is kept up to date by the ToornamentInterface: It is rebuilt whenever all teams of the tournament are
+# fetched and single teams are re-indexed when they are saved or patched.
+#
+# Discord IDs are normalized like member references in the MemberIndex, names are compared case-insensitively.
+# Teams are TeamInfo objects; this module doesn't import them, because the ToornamentInterface imports it.
+
+from memberindex import MemberIndex
+import threading
+
+class RosterIndex:
+
+    # Constructor
+    # tournamentID: Toornament ID of the tournament
+    # allTeamInfo: List of all teams of the tournament
+    def __init__(self, tournamentID, allTeamInfo = ()):
+        self.tournamentID = tournamentID
+        self.lock = threading.Lock()
+
+        # Maps participant IDs to teams
+        self.teams = {}
+
+        # Maps keys to tuples of team and player. The player is None for team managers and team lookups.
+        self.byDiscordID = {}
+        self.byUserID = {}
+        self.byName = {}
+        self.byRoleID = {}
+
+        # Maps participant IDs to the list of tuples of index map and key of the team, used to remove a team again
+        self.teamKeys = {}
+
+        for teamInfo in allTeamInfo:
+            self.update(teamInfo)
+
+    # Adds a team to the index or re-indexes it if it is already indexed
+    # teamInfo: Team to be indexed
+    def update(self, teamInfo):
+        participantID = str(teamInfo.id)
+
+        with self.lock:
+            self.__removeKeys(participantID)
+            self.teams[participantID] = teamInfo
+            keys = []
+
+            self.__addKey(keys, self.byDiscordID, MemberIndex.normalize(teamInfo.managerDiscordID) if teamInfo.managerDiscordID is not None else None, teamInfo, None)
+
+            for playerInfo in teamInfo.lineup:
+                self.__addKey(keys, self.byDiscordID, MemberIndex.normalize(playerInfo.discordID) if playerInfo.discordID is not None else None, teamInfo, playerInfo)
+                self.__addKey(keys, self.byUserID, playerInfo.userID, teamInfo, playerInfo)
+
+            self.__addKey(keys, self.byName, teamInfo.name.lower() if teamInfo.name else None, teamInfo, None)
+            self.__addKey(keys, self.byName, teamInfo.shortName.lower() if teamInfo.shortName else None, teamInfo, None)
+            self.__addKey(keys, self.byRoleID, teamInfo.roleID or None, teamInfo, None)
+
+            self.teamKeys[participantID] = keys
+
+    # Removes a team from the index
+    # participantID: Toornament participant ID of the team
+    def remove(self, participantID):
+        with self.lock:
+            self.__removeKeys(str(participantID))
+            self.teams.pop(str(participantID), None)
+
+    # Adds a key to an index map and remembers it for the team
+    def __addKey(self, keys, index, key, teamInfo, playerInfo):
+        if key is not None:
+            index[key] = (teamInfo, playerInfo)
+            keys += [(index, key)]
+
+    # Removes all keys of a team that still point to it
+    def __removeKeys(self, participantID: str):
+        for index, key in self.teamKeys.pop(participantID, ()):
+            entry = index.get(key)
+
+            if entry is not None and str(entry[0].id) == participantID:
+                del index[key]
+
+    # Returns a tuple of team and player for a Discord account, or None if it doesn't belong to any team.
+    # The player is None if the account is the manager of the team.
+    # discordID: Discord ID, mention or name#discriminator as entered on toornament
+    def findByDiscordID(self, discordID):
+        if discordID is None:
+            return None
+
+        with self.lock:
+            return self.byDiscordID.get(MemberIndex.normalize(discordID))
+
+    # Returns a tuple of team and player for a toornament user, or None if the user doesn't play in any team.
+    # userID: Toornament user ID of the player
+    def findByUserID(self, userID):
+        with self.lock:
+            return self.byUserID.get(userID)
+
+    # Returns the team with the given name or short name, or None if there is none.
+    # name: Name or short name of the team
+    def findTeam(self, name: str):
+        with self.lock:
+            entry = self.byName.get(name.strip().lower())
+
+        return entry[0] if entry is not None else None
+
+    # Returns the team with the given Discord role, or None if no team has this role.
+    # roleID: ID of the team role
+    def findTeamByRole(self, roleID):
+        with self.lock:
+            entry = self.byRoleID.get(roleID)
+
+        return entry[0] if entry is not None else None
+
+    # Returns a list of all indexed teams
+    def getTeams(self):
+        with self.lock:
+            return list(self.teams.values())
@@ -0,0 +1,193 @@
+# The SyncScheduler keeps all registered tournaments in sync with their Discord guilds in the background.
+# Every tournament of the tournament registry is synced incrementally in its own interval, which is read from the
+# configuration value "sync_interval" (seconds, 0 disables scheduled syncs of the tournament, manual syncs still run).
+#
+# To spread the load, the first sync of each tournament starts at a random time shortly after startup and every
+# interval is varied by a random jitter. Only a limited number of syncs run at the same time. Failed syncs are
+# retried with exponential backoff instead of the regular interval. Syncs run as tasks, so commands are never blocked.
+#
+# Every sync holds a lock of its tournament. Other changes of the teams of a tournament, e.g. by webhook notifications,
+# run through runExclusive, which holds the same lock, so they never create roles for a team a sync is working on.
+
+from teamsync import TeamSync, SyncReport
+from toornament import ToornamentInterface
+from config import BotConfig
+from utility import tryToInt
+import asyncio
+import random
+import time
+import traceback
+
+class SyncScheduler:
+
+    # Constructor
+    # teamSync: TeamSync instance used to run the syncs
+    # toornament: Toornament interface instance whose tournament registry lists the tournaments
+    # config: BotConfig instance the sync intervals are read from
+    # defaultInterval: Seconds between two syncs of a tournament without a configured interval
+    # maxConcurrentSyncs: Maximum number of syncs running at the same time
+    # jitter: Maximum relative deviation of an interval, e.g. 0.1 for +-10%
+    # startupDelay: Maximum number of seconds after startup until the first sync of a tournament
+    # retryDelay: Seconds until a failed sync is retried. Doubles with every further failure.
+    # maxRetryDelay: Maximum number of seconds until a failed sync is retried
+    # tickInterval: Seconds between two checks for due syncs
+    def __init__(self, teamSync: TeamSync, toornament: ToornamentInterface, config: BotConfig, defaultInterval: float = 900.0, maxConcurrentSyncs: int = 2, jitter: float = 0.1, startupDelay: float = 60.0, retryDelay: float = 60.0, maxRetryDelay: float = 3600.0, tickInterval: float = 5.0):
+        self.teamSync = teamSync
+        self.toornament = toornament
+        self.config = config
+        self.defaultInterval = defaultInterval
+        self.maxConcurrentSyncs = maxConcurrentSyncs
+        self.jitter = jitter
+        self.startupDelay = startupDelay
+        self.retryDelay = retryDelay
+        self.maxRetryDelay = maxRetryDelay
+        self.tickInterval = tickInterval
+
+        # Maps tournament IDs to the time of their next sync, the number of consecutive failures and the running sync
+        self.nextSyncs = {}
+        self.failures = {}
+        self.runningSyncs = {}
+
+        # Maps tournament IDs to the locks held by syncs and exclusive changes of the tournament
+        self.locks = {}
+
+        self.semaphore = None
+        self.task = None
+
+    # Starts scheduling syncs. Does nothing if the scheduler is already running.
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.__run())
+
+    # Stops scheduling syncs and cancels all running syncs
+    async def stop(self):
+        tasks = list(self.runningSyncs.values())
+
+        if self.task is not None:
+            tasks += [self.task]
+            self.task = None
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions = True)
+
+    # Syncs a tournament right away and returns its SyncReport.
+    # If the tournament is being synced already, the running sync is awaited instead of starting a second one.
+    # Runs even if scheduled syncs are disabled for the tournament.
+    # tournamentID: Toornament ID of the tournament
+    async def syncNow(self, tournamentID) -> SyncReport:
+        task = self.runningSyncs.get(str(tournamentID))
+
+        if task is None:
+            task = self.__startSync(tournamentID)
+
+        return await asyncio.shield(task)
+
+    # Runs a coroutine function while no sync or other exclusive change of a tournament is running and returns its result.
+    # Takes one of the concurrent sync slots like a sync.
+    # tournamentID: Toornament ID of the tournament
+    # function: Coroutine function, e.g. one that syncs a single team
+    # args: Arguments of the function
+    async def runExclusive(self, tournamentID, function, *args):
+        async with self.__getLock(tournamentID):
+            async with self.__getSemaphore():
+                return await function(*args)
+
+    # Checks for due syncs until the scheduler is stopped
+    async def __run(self):
+        while True:
+            try:
+                await self.__startDueSyncs()
+            except Exception:
+                print(traceback.format_exc())
+
+            await asyncio.sleep(self.tickInterval)
+
+    # Starts the syncs of all tournaments that are due and forgets tournaments that were removed from the registry.
+    # Due tournaments whose scheduled syncs are disabled are checked again after the default interval.
+    async def __startDueSyncs(self):
+        now = time.monotonic()
+        tournamentIDs = set()
+
+        for tournament in list(self.toornament.tournamentRegistry.getTournaments()):
+            key = str(tournament.tournamentID)
+            tournamentIDs.add(key)
+
+            if key not in self.nextSyncs:
+                self.nextSyncs[key] = now + random.uniform(0, self.startupDelay)
+
+            if self.nextSyncs[key] > now or key in self.runningSyncs:
+                continue
+
+            if await self.__getInterval(tournament.tournamentID) <= 0:
+                self.nextSyncs[key] = now + self.defaultInterval
+            # A manual sync may have started while the configuration was read
+            elif key not in self.runningSyncs:
+                self.__startSync(tournament.tournamentID)
+
+        for key in list(self.nextSyncs.keys()):
+            if key not in tournamentIDs:
+                del self.nextSyncs[key]
+                self.failures.pop(key, None)
+
+                if key in self.locks and not self.locks[key].locked():
+                    del self.locks[key]
+
+    # Starts the sync of a tournament as a task and returns the task
+    # tournamentID: Toornament ID of the tournament
+    def __startSync(self, tournamentID) -> asyncio.Task:
+        task = asyncio.ensure_future(self.__sync(tournamentID))
+        self.runningSyncs[str(tournamentID)] = task
+        task.add_done_callback(self.__onSyncDone)
+        return task
+
+    # Logs failed syncs, so errors of scheduled syncs that nobody awaits aren't lost
+    def __onSyncDone(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            err = task.exception()
+            print("".join(traceback.format_exception(type(err), err, err.__traceback__)))
+
+    # Runs the sync of a tournament and schedules its next sync
+    # tournamentID: Toornament ID of the tournament
+    async def __sync(self, tournamentID) -> SyncReport:
+        key = str(tournamentID)
+        delay = self.defaultInterval
+
+        try:
+            interval = await self.__getInterval(tournamentID)
+
+            async with self.__getLock(tournamentID):
+                async with self.__getSemaphore():
+                    report = await self.teamSync.syncTournament(tournamentID)
+
+            self.failures.pop(key, None)
+
+            # Checks the configuration again after the default interval if scheduled syncs are disabled
+            delay = interval if interval > 0 else self.defaultInterval
+            return report
+        except Exception:
+            self.failures[key] = self.failures.get(key, 0) + 1
+            delay = min(self.retryDelay * 2 ** (self.failures[key] - 1), self.maxRetryDelay)
+            raise
+        finally:
+            self.nextSyncs[key] = time.monotonic() + delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            self.runningSyncs.pop(key, None)
+
+    # Returns the sync interval of a tournament in seconds
+    # tournamentID: Toornament ID of the tournament
+    async def __getInterval(self, tournamentID) -> float:
+        interval = tryToInt(await self.config.getValueAsync(tournamentID, "sync_interval"))
+        return interval if interval is not None else self.defaultInterval
+
+    # Returns the lock of a tournament
+    # tournamentID: Toornament ID of the tournament
+    def __getLock(self, tournamentID) -> asyncio.Lock:
+        return self.locks.setdefault(str(tournamentID), asyncio.Lock())
+
+    # Returns the semaphore limiting the number of concurrent syncs
+    def __getSemaphore(self) -> asyncio.Semaphore:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.maxConcurrentSyncs)
+
+        return self.semaphore
@@ -0,0 +1,127 @@
+# The SyncJobStore persists sync runs as jobs, so a sync that was interrupted, e.g. by a Discord error, an expired token
+# or a restart of the bot, continues where it stopped instead of starting over.
+#
+# Every team that went through all stages of a sync is checkpointed in the SyncJobTeams table. Checkpoints are written
+# in the same transaction as the team rows, so a checkpointed team was always saved. The next sync of the tournament
+# resumes the unfinished job and skips its checkpointed teams. Teams that were processed but not checkpointed are
+# synced again, which is cheap: Their roles are adopted by name instead of being created twice.
+#
+# A job is only resumed by a sync of the same mode (incremental or full) within the resume window. Older unfinished
+# jobs are abandoned. Checkpoints of completed and abandoned jobs are deleted when the next job of the tournament completes.
+
+from mysqlwrapper import MySQLWrapper
+
+# A sync run of a tournament
+class SyncJob:
+
+    # Constructor
+    # jobID: ID of the job in the SyncJobs table
+    # tournamentID: Toornament ID of the synced tournament
+    # incremental: False if every team is patched and saved, even if nothing changed
+    # completedTeams: Participant IDs of all teams checkpointed by an earlier run of the job
+    def __init__(self, jobID, tournamentID, incremental: bool, completedTeams = ()):
+        self.jobID = jobID
+        self.tournamentID = tournamentID
+        self.incremental = incremental
+        self.completedTeams = set(str(participantID) for participantID in completedTeams)
+
+    # Returns True if the job was resumed from an earlier run
+    def isResumed(self) -> bool:
+        return len(self.completedTeams) > 0
+
+    # Returns True if a team was already checkpointed
+    # participantID: Toornament participant ID of the team
+    def isCompleted(self, participantID) -> bool:
+        return str(participantID) in self.completedTeams
+
+
+class SyncJobStore:
+
+    # Constructor
+    # mysqlWrapper: MySQLWrapper instance
+    # resumeWindow: Seconds after its start within which an unfinished job is resumed
+    def __init__(self, mysqlWrapper: MySQLWrapper, resumeWindow: int = 86400):
+        self.mysql = mysqlWrapper
+        self.resumeWindow = resumeWindow
+        self.__initTables()
+
+    # Creates the tables storing jobs and their checkpoints
+    def __initTables(self):
+        self.mysql.createTable("SyncJobs", (
+            "JobID INT AUTO_INCREMENT, "
+            "TournamentID BIGINT NOT NULL, "
+            "Incremental BOOL NOT NULL, "
+            "Status VARCHAR(15) NOT NULL, "
+            "Error VARCHAR(1023) NULL, "
+            "StartedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+            "FinishedAt TIMESTAMP NULL, "
+            "PRIMARY KEY (JobID), "
+            "INDEX SyncJobsByTournament (TournamentID, Status)"
+        ))
+
+        self.mysql.createTable("SyncJobTeams", (
+            "JobID INT NOT NULL, "
+            "ParticipantID BIGINT NOT NULL, "
+            "PRIMARY KEY (JobID, ParticipantID)"
+        ))
+
+    # Returns the unfinished job of a tournament with all its checkpoints, or a new job if there is none to resume.
+    # tournamentID: Toornament ID of the tournament
+    # incremental: False if every team is patched and saved, even if nothing changed
+    def startJob(self, tournamentID, incremental: bool = True) -> SyncJob:
+        results = self.mysql.fetch(
+            "SELECT JobID FROM SyncJobs WHERE TournamentID=%s AND Incremental=%s AND Status IN ('running', 'failed') "
+            "AND StartedAt > NOW() - INTERVAL %s SECOND ORDER BY JobID DESC LIMIT 1;",
+            (tournamentID, incremental, self.resumeWindow,)
+        )
+
+        if results is not None:
+            jobID = results[0][0]
+            self.mysql.query("UPDATE SyncJobs SET Status='running', Error=NULL, FinishedAt=NULL WHERE JobID=%s;", (jobID,))
+            completedTeams = self.mysql.fetch("SELECT ParticipantID FROM SyncJobTeams WHERE JobID=%s;", (jobID,))
+            return SyncJob(jobID, tournamentID, incremental, [row[0] for row in completedTeams] if completedTeams is not None else ())
+
+        with self.mysql.transaction() as transaction:
+            transaction.query("UPDATE SyncJobs SET Status='abandoned' WHERE TournamentID=%s AND Status IN ('running', 'failed');", (tournamentID,))
+            transaction.query("INSERT INTO SyncJobs (TournamentID, Incremental, Status) VALUES (%s, %s, 'running');", (tournamentID, incremental,))
+            jobID = transaction.fetch("SELECT LAST_INSERT_ID();")[0][0]
+
+        return SyncJob(jobID, tournamentID, incremental)
+
+    # Marks teams of a job as completed. Buffered if a unit of work is active.
+    # job: The running job
+    # participantIDs: Toornament participant IDs of the completed teams
+    def checkpoint(self, job: SyncJob, participantIDs):
+        participantIDs = list(participantIDs)
+        self.mysql.writeMany("INSERT IGNORE INTO SyncJobTeams (JobID, ParticipantID) VALUES (%s, %s);", [(job.jobID, participantID) for participantID in participantIDs])
+        job.completedTeams.update(str(participantID) for participantID in participantIDs)
+
+    # Marks a job as completed, or as failed if an error is given. Failed jobs are resumed by the next sync.
+    # job: The running job
+    # error: Optional description of the error that stopped the job
+    def finishJob(self, job: SyncJob, error: str = None):
+        if error is not None:
+            self.mysql.query("UPDATE SyncJobs SET Status='failed', Error=%s, FinishedAt=NOW() WHERE JobID=%s;", (error[:1023], job.jobID,))
+            return
+
+        # Checkpoints are only needed to resume jobs, so they are deleted together with older jobs that can't be resumed
+        with self.mysql.transaction() as transaction:
+            transaction.query("UPDATE SyncJobs SET Status='completed', FinishedAt=NOW() WHERE JobID=%s;", (job.jobID,))
+            transaction.query(
+                "DELETE SyncJobTeams FROM SyncJobTeams JOIN SyncJobs ON SyncJobTeams.JobID=SyncJobs.JobID "
+                "WHERE SyncJobs.TournamentID=%s AND SyncJobs.Status IN ('completed', 'abandoned');",
+                (job.tournamentID,)
+            )
+            transaction.query("DELETE FROM SyncJobs WHERE TournamentID=%s AND JobID<%s AND Status IN ('completed', 'abandoned');", (job.tournamentID, job.jobID,))
+
+    # Asynchronous version of startJob. Doesn't block the event loop while waiting for the database.
+    async def startJobAsync(self, tournamentID, incremental: bool = True) -> SyncJob:
+        return await self.mysql.runAsync(self.startJob, tournamentID, incremental)
+
+    # Asynchronous version of checkpoint. Doesn't block the event loop while waiting for the database.
+    async def checkpointAsync(self, job: SyncJob, participantIDs):
+        await self.mysql.runAsync(self.checkpoint, job, participantIDs)
+
+    # Asynchronous version of finishJob. Doesn't block the event loop while waiting for the database.
+    async def finishJobAsync(self, job: SyncJob, error: str = None):
+        await self.mysql.runAsync(self.finishJob, job, error)
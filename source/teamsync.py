@@ -0,0 +1,457 @@
+# The TeamSync class synchronizes the teams of a tournament on toornament with its Discord guild:
+#  - Every team gets a Discord role
+#  - Managers and players get the role of their team
+#  - The Discord IDs of all members and the team role are written back to toornament and the MySQL database
+#
+# Syncs are incremental. The resolved teams are compared to the participant data fetched from toornament
+# and to the rows stored in the Teams table. Toornament is only patched if a Discord ID changed and the
+# database is only updated if the role or name of a team changed. Team roles are reconciled by a
+# RoleReconciler, which reuses existing roles and skips members that already have their team role, so
+# re-running a sync on a settled tournament costs almost no API calls.
+#
+# A sync runs as a pipeline of stages connected by bounded queues:
+#   fetch -> resolve members -> Discord roles -> toornament PATCH -> database write
+# Every stage has its own number of workers, so teams waiting for Discord don't hold up teams waiting for
+# toornament and vice versa. Discord requests are limited by the semaphore of the RoleReconciler, toornament
+# requests by the rate limiter of the ToornamentInterface. The database stage writes teams in batches.
+#
+# Syncs of whole tournaments run as jobs of a SyncJobStore: Every team is checkpointed together with its database
+# write, and a sync that was interrupted is resumed by the next one, which skips the checkpointed teams.
+# This trades the single commit per sync for one commit per batch: A failed sync keeps the batches written before it
+# failed. Syncs without a job, e.g. of single teams, still write all teams in one unit of work at the end.
+# A dry run only plans the changes: It reports which roles, members and teams would change, without touching
+# Discord, toornament or the database.
+
+from toornament import ToornamentInterface, TeamInfo
+from discordhelper import DiscordHelper
+from config import BotConfig
+from rolereconciler import RoleReconciler, RolePlan, RoleReport
+from syncjobs import SyncJobStore, SyncJob
+import asyncio
+
+# Marks the end of the items in a pipeline queue
+STOP = object()
+
+# Summary of a sync run
+class SyncReport:
+
+    def __init__(self, tournamentID):
+        self.tournamentID = tournamentID
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.issues = []
+        self.roleReport = None
+
+        # ID of the job of the sync, or None if the sync didn't run as a job
+        self.jobID = None
+
+        # Changes a dry run would make, dry runs don't have a role report
+        self.dryRun = False
+        self.plannedChanges = []
+
+    # Returns the report as a list of Discord messages that don't exceed the maximum message length.
+    # maxLength: Maximum number of characters per message
+    def getMessages(self, maxLength: int = 2000):
+        if self.dryRun:
+            lines = [f"Dry run of tournament {self.tournamentID}: {self.created} to create, {self.updated} to update, {self.unchanged} unchanged"]
+            lines += self.plannedChanges
+        elif self.skipped > 0:
+            lines = [f"Synced tournament {self.tournamentID}: {self.created} created, {self.updated} updated, {self.unchanged} unchanged, {self.skipped} already synced by job {self.jobID}"]
+        else:
+            lines = [f"Synced tournament {self.tournamentID}: {self.created} created, {self.updated} updated, {self.unchanged} unchanged"]
+
+        if self.roleReport is not None:
+            lines += self.roleReport.getLines()
+
+        lines += self.issues
+
+        messages = []
+        message = ""
+
+        for line in lines:
+            if len(message) + len(line) + 1 > maxLength:
+                messages += [message]
+                message = ""
+
+            message += line + "\n"
+
+        return messages + [message]
+
+
+class TeamSync:
+
+    # Constructor
+    # toornament: Toornament interface instance
+    # discordHelper: DiscordHelper instance
+    # config: BotConfig instance used to look up the team role template
+    # roleReconciler: Optional RoleReconciler used to create and assign team roles
+    # queueSize: Maximum number of teams waiting in front of each stage
+    # patchConcurrency: Number of teams patched on toornament at the same time
+    # writeBatchSize: Maximum number of teams of a job written to the database and checkpointed in one transaction
+    # writeDelay: Seconds an incomplete batch of a job waits for further teams before it is written
+    # jobStore: Optional SyncJobStore used to checkpoint and resume syncs of whole tournaments
+    def __init__(self, toornament: ToornamentInterface, discordHelper: DiscordHelper, config: BotConfig, roleReconciler: RoleReconciler = None, queueSize: int = 50, patchConcurrency: int = 4, writeBatchSize: int = 50, writeDelay: float = 1.0, jobStore: SyncJobStore = None):
+        self.toornament = toornament
+        self.discordHelper = discordHelper
+        self.config = config
+        self.roleReconciler = roleReconciler if roleReconciler is not None else RoleReconciler(discordHelper)
+        self.queueSize = queueSize
+        self.patchConcurrency = patchConcurrency
+        self.writeBatchSize = writeBatchSize
+        self.writeDelay = writeDelay
+        self.jobStore = jobStore if jobStore is not None else SyncJobStore(toornament.mysql)
+
+    # Synchronizes all teams of a tournament with its Discord guild and returns a SyncReport.
+    # Teams are processed while further pages of teams are still being fetched.
+    # The sync runs as a job. If the last job of the tournament didn't finish, it is resumed.
+    # tournamentID: Toornament ID of the tournament to be synced
+    # incremental: If False, every team is patched on toornament and saved to the database, even if nothing changed
+    # dryRun: If True, the changes are only reported and nothing is changed
+    async def syncTournament(self, tournamentID, incremental: bool = True, dryRun: bool = False) -> SyncReport:
+        teams = self.toornament.iterAllTeamInfoAsync(tournamentID)
+
+        if dryRun:
+            return await self.__runPipeline(tournamentID, teams, incremental, dryRun = True)
+
+        job = await self.jobStore.startJobAsync(tournamentID, incremental)
+
+        try:
+            report = await self.__runPipeline(tournamentID, teams, incremental, job = job)
+        except Exception as err:
+            await self.jobStore.finishJobAsync(job, str(err) or type(err).__name__)
+            raise
+
+        await self.jobStore.finishJobAsync(job)
+        return report
+
+    # Synchronizes the given teams with the Discord guild of their tournament and returns a SyncReport.
+    # tournamentID: Toornament ID of the tournament the teams signed up for
+    # allTeamInfo: List of teams as fetched from toornament
+    # incremental: If False, every team is patched on toornament and saved to the database, even if nothing changed
+    async def syncTeams(self, tournamentID, allTeamInfo, incremental: bool = True) -> SyncReport:
+        async def iterTeams():
+            for teamInfo in allTeamInfo:
+                yield teamInfo
+
+        return await self.__runPipeline(tournamentID, iterTeams(), incremental)
+
+    # Runs all stages of a sync concurrently and returns the SyncReport once the last team was written.
+    # tournamentID: Toornament ID of the tournament
+    # teams: Async iterator of the teams to be synced
+    # incremental: If False, every team is patched on toornament and saved to the database, even if nothing changed
+    # job: Optional job the teams are checkpointed in. Teams it already completed are skipped.
+    # dryRun: If True, the changes are only added to the report
+    async def __runPipeline(self, tournamentID, teams, incremental: bool, job: SyncJob = None, dryRun: bool = False) -> SyncReport:
+        report = SyncReport(tournamentID)
+        report.jobID = job.jobID if job is not None else None
+        report.dryRun = dryRun
+        report.roleReport = RoleReport(tournamentID) if not dryRun else None
+
+        # State shared by all teams of the sync
+        roleTemplate = await self.config.getTeamRoleTemplateAsync(tournamentID)
+        storedTeams = await self.toornament.getStoredTeamsAsync(tournamentID)
+        roleIndex = self.roleReconciler.indexRoles(tournamentID, storedTeams, roleTemplate)
+        discordSemaphore = asyncio.Semaphore(self.roleReconciler.maxConcurrency)
+
+        resolveQueue = asyncio.Queue(self.queueSize)
+        roleQueue = asyncio.Queue(self.queueSize)
+        patchQueue = asyncio.Queue(self.queueSize)
+        writeQueue = asyncio.Queue(self.queueSize)
+
+        # Resolves the members of a team. Only uses the member index, so one worker is enough.
+        async def resolveTeam(teamInfo: TeamInfo):
+            # Resolving converts Discord IDs, which a dry run must not do to the teams kept in the roster
+            if dryRun:
+                teamInfo = teamInfo.copy()
+
+            members, hasNewDiscordIDs = self.__resolveTeamMembers(tournamentID, teamInfo, report)
+            return teamInfo, members, hasNewDiscordIDs
+
+        # Creates, renames and assigns the role of a team
+        async def reconcileRoles(item):
+            teamInfo, members, hasNewDiscordIDs = item
+            participantID = str(teamInfo.id)
+
+            rolePlan = self.roleReconciler.plan(tournamentID, [teamInfo], storedTeams, {participantID: members}, roleTemplate, roleIndex)
+
+            if dryRun:
+                self.__addPlannedRoleChanges(rolePlan, teamInfo, report)
+                return teamInfo, rolePlan.teamRoles.get(participantID), hasNewDiscordIDs, len(rolePlan.rolesToRename) > 0
+
+            await self.roleReconciler.apply(rolePlan, roleTemplate, report.roleReport, discordSemaphore)
+
+            teamRole = report.roleReport.teamRoles.get(participantID)
+
+            if teamRole is None:
+                return None
+
+            return teamInfo, teamRole, hasNewDiscordIDs, len(rolePlan.rolesToRename) > 0
+
+        # Patches a team on toornament if needed and passes it on to be written to the database and checkpointed
+        async def patchTeam(item):
+            teamInfo, teamRole, hasNewDiscordIDs, isRenamed = item
+
+            if dryRun:
+                self.__planWriteBack(teamInfo, teamRole, storedTeams.get(str(teamInfo.id)), hasNewDiscordIDs, isRenamed, incremental, report)
+                return None
+
+            return await self.__writeBack(tournamentID, teamInfo, teamRole, storedTeams.get(str(teamInfo.id)), hasNewDiscordIDs, isRenamed, incremental, report)
+
+        stages = [
+            asyncio.ensure_future(self.__fetchStage(teams, resolveQueue, job, report)),
+            asyncio.ensure_future(self.__runStage(resolveQueue, roleQueue, resolveTeam, 1)),
+            asyncio.ensure_future(self.__runStage(roleQueue, patchQueue, reconcileRoles, self.roleReconciler.maxConcurrency)),
+            asyncio.ensure_future(self.__runStage(patchQueue, writeQueue, patchTeam, self.patchConcurrency)),
+            asyncio.ensure_future(self.__writeStage(tournamentID, writeQueue, job))
+        ]
+
+        # If a stage fails, the other stages would wait for it forever, so they are cancelled
+        try:
+            done, pending = await asyncio.wait(stages, return_when = asyncio.FIRST_EXCEPTION)
+        except asyncio.CancelledError:
+            # The sync itself was cancelled, e.g. by SyncScheduler.stop, so no stage may keep running in the background
+            for stage in stages:
+                stage.cancel()
+
+            await asyncio.gather(*stages, return_exceptions = True)
+            raise
+
+        for stage in pending:
+            stage.cancel()
+
+        # Lets the cancelled stages finish, e.g. the database stage writes and checkpoints the teams it already received
+        await asyncio.gather(*pending, return_exceptions = True)
+
+        for stage in done:
+            if stage.exception() is not None:
+                raise stage.exception()
+
+        return report
+
+    # First stage: Puts all teams into the queue of the next stage, except for teams the job already completed.
+    # teams: Async iterator of the teams
+    # outputQueue: Queue of the next stage
+    # job: Optional job of the sync
+    # report: SyncReport the skipped teams are counted in
+    async def __fetchStage(self, teams, outputQueue: asyncio.Queue, job: SyncJob, report: SyncReport):
+        async for teamInfo in teams:
+            if job is not None and job.isCompleted(teamInfo.id):
+                report.skipped += 1
+            else:
+                await outputQueue.put(teamInfo)
+
+        await outputQueue.put(STOP)
+
+    # Runs a stage of the pipeline with the given number of workers until its queue is stopped.
+    # Every item is passed to the process function, whose result is put into the queue of the next stage unless it is None.
+    # inputQueue: Queue of the stage
+    # outputQueue: Queue of the next stage
+    # process: Coroutine function processing a single item
+    # concurrency: Number of workers
+    async def __runStage(self, inputQueue: asyncio.Queue, outputQueue: asyncio.Queue, process, concurrency: int):
+        async def work():
+            while True:
+                item = await inputQueue.get()
+
+                # Puts the stop marker back for the other workers. There is space, because the previous stage is done.
+                if item is STOP:
+                    inputQueue.put_nowait(STOP)
+                    return
+
+                result = await process(item)
+
+                if result is not None:
+                    await outputQueue.put(result)
+
+        workers = [asyncio.ensure_future(work()) for _ in range(concurrency)]
+
+        # If a worker fails or the stage is cancelled, the other workers are stopped as well,
+        # so nothing is changed on Discord or toornament after the sync stopped
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+            await asyncio.gather(*workers, return_exceptions = True)
+
+        await outputQueue.put(STOP)
+
+    # Last stage: Writes teams to the database and checkpoints them in batches, each in its own unit of work.
+    # A batch is written once it is full or no further team arrived within the write delay,
+    # so checkpoints don't lag far behind while the other stages are slow. If the other stages are slower than
+    # the write delay, this commits about once per team.
+    # Without a job nothing is checkpointed, so all teams are written in a single batch once the last one arrived.
+    # tournamentID: Toornament ID of the tournament
+    # inputQueue: Queue of the stage
+    # job: Optional job the teams are checkpointed in
+    async def __writeStage(self, tournamentID, inputQueue: asyncio.Queue, job: SyncJob):
+        batch = []
+        isBatched = job is not None
+
+        # The pending get is kept when the delay runs out, so no team is lost by cancelling it
+        getItem = None
+
+        try:
+            while True:
+                if getItem is None:
+                    getItem = asyncio.ensure_future(inputQueue.get())
+
+                done, _ = await asyncio.wait({getItem}, timeout = self.writeDelay if isBatched and len(batch) > 0 else None)
+
+                if len(done) == 0:
+                    await self.__writeBatch(tournamentID, batch, job)
+                    batch = []
+                    continue
+
+                item = getItem.result()
+                getItem = None
+
+                if item is not STOP:
+                    batch += [item]
+
+                if len(batch) > 0 and (item is STOP or (isBatched and len(batch) >= self.writeBatchSize)):
+                    await self.__writeBatch(tournamentID, batch, job)
+                    batch = []
+
+                if item is STOP:
+                    return
+        except asyncio.CancelledError:
+            # The teams of the batch are done, so they are saved and checkpointed even if another stage failed
+            if len(batch) > 0:
+                await self.__writeBatch(tournamentID, batch, job)
+
+            raise
+        finally:
+            if getItem is not None:
+                getItem.cancel()
+
+    # Saves the teams of a batch that changed and checkpoints all of them in a single transaction,
+    # so a resumed job never skips a team that wasn't saved.
+    # tournamentID: Toornament ID of the tournament
+    # batch: List of tuples of team and whether it has to be saved
+    # job: Optional job the teams are checkpointed in
+    async def __writeBatch(self, tournamentID, batch, job: SyncJob):
+        teamsToSave = [teamInfo for teamInfo, needsSave in batch if needsSave]
+
+        async with self.toornament.unitOfWorkAsync():
+            if len(teamsToSave) > 0:
+                await self.toornament.saveAllTeamInfoAsync(tournamentID, teamsToSave)
+
+            if job is not None:
+                await self.jobStore.checkpointAsync(job, [teamInfo.id for teamInfo, _ in batch])
+
+    # Converts the Discord IDs of the manager and players of a team to Discord Developer IDs.
+    # Returns a list of tuples of member object and role assignment reason and whether any Discord ID changed.
+    # tournamentID: Toornament ID of the tournament the team signed up for
+    # teamInfo: Team whose members are converted
+    # report: SyncReport that members who couldn't be found are added to
+    def __resolveTeamMembers(self, tournamentID, teamInfo: TeamInfo, report: SyncReport):
+        discordIDs = [teamInfo.managerDiscordID] + [playerInfo.discordID for playerInfo in teamInfo.lineup]
+        resolvedMembers = self.discordHelper.resolveMembers(tournamentID, discordIDs)
+        members = []
+        hasNewDiscordIDs = False
+
+        manager = self.__findMember(teamInfo.managerDiscordID, teamInfo, resolvedMembers, report)
+
+        if manager is not None:
+            members += [(manager, "Manager of team")]
+
+            if str(manager.id) != teamInfo.managerDiscordID:
+                teamInfo.managerDiscordID = str(manager.id)
+                hasNewDiscordIDs = True
+
+        for playerInfo in teamInfo.lineup:
+            player = self.__findMember(playerInfo.discordID, teamInfo, resolvedMembers, report)
+
+            if player is not None:
+                members += [(player, "Player on team")]
+
+                if str(player.id) != playerInfo.discordID:
+                    playerInfo.discordID = str(player.id)
+                    hasNewDiscordIDs = True
+
+        return members, hasNewDiscordIDs
+
+    # Returns the member object of a team member, or None if the member couldn't be found.
+    # discordID: Discord ID of the member as entered on toornament
+    # teamInfo: Team the member belongs to
+    # resolvedMembers: Map of Discord IDs as entered on toornament to member objects
+    # report: SyncReport that members who couldn't be found are added to
+    def __findMember(self, discordID, teamInfo: TeamInfo, resolvedMembers, report: SyncReport):
+        member = resolvedMembers.get(discordID)
+
+        if member is None:
+            report.issues += [f"Team '{teamInfo.name}': Member '{discordID}' couldn't be found"]
+
+        return member
+
+    # Patches the converted Discord IDs on toornament if they changed and counts the team in the report.
+    # Returns a tuple of the team and whether it has to be written to the database, or None if it couldn't be patched.
+    # tournamentID: Toornament ID of the tournament the team signed up for
+    # teamInfo: Team with converted Discord IDs
+    # teamRole: Role of the team
+    # storedTeam: Tuple of role ID, emote ID and name of the team as stored in the database, or None for new teams
+    # hasNewDiscordIDs: True if any Discord ID of the team was converted
+    # isRenamed: True if the role of the team was renamed
+    # incremental: If False, the team is patched and saved even if nothing changed
+    # report: SyncReport the team is counted in
+    async def __writeBack(self, tournamentID, teamInfo: TeamInfo, teamRole, storedTeam, hasNewDiscordIDs: bool, isRenamed: bool, incremental: bool, report: SyncReport):
+        teamInfo.roleID = teamRole.id
+
+        # Keeps the stored emote of the team
+        if storedTeam is not None:
+            teamInfo.emoteID = storedTeam[1]
+
+        hasNewTeamRow = storedTeam is None or storedTeam[0] != teamRole.id or storedTeam[2] != teamInfo.name
+
+        if str(teamInfo.id) in report.roleReport.createdTeams or storedTeam is None:
+            report.created += 1
+        elif hasNewDiscordIDs or isRenamed or storedTeam[0] != teamRole.id:
+            report.updated += 1
+        else:
+            report.unchanged += 1
+
+        if hasNewDiscordIDs or not incremental:
+            try:
+                await self.toornament.patchTeamInfoAsync(tournamentID, teamInfo, full = not incremental, save = False)
+            except Exception as err:
+                report.issues += [f"Team '{teamInfo.name}' couldn't be patched on toornament: {err}"]
+                return None
+
+        return teamInfo, hasNewDiscordIDs or hasNewTeamRow or not incremental
+
+    # Counts a team in the report of a dry run and adds the change a sync would make on toornament.
+    # teamInfo: Team with converted Discord IDs
+    # teamRole: Existing role of the team, or None if a new role would be created
+    # storedTeam: Tuple of role ID, emote ID and name of the team as stored in the database, or None for new teams
+    # hasNewDiscordIDs: True if any Discord ID of the team was converted
+    # isRenamed: True if the role of the team would be renamed
+    # incremental: If False, the team would be patched even if nothing changed
+    # report: SyncReport of the dry run
+    def __planWriteBack(self, teamInfo: TeamInfo, teamRole, storedTeam, hasNewDiscordIDs: bool, isRenamed: bool, incremental: bool, report: SyncReport):
+        if teamRole is None or storedTeam is None:
+            report.created += 1
+        elif hasNewDiscordIDs or isRenamed or storedTeam[0] != teamRole.id:
+            report.updated += 1
+        else:
+            report.unchanged += 1
+
+        if hasNewDiscordIDs or not incremental:
+            report.plannedChanges += [f"Patch Discord IDs of team '{teamInfo.name}' on toornament"]
+
+    # Adds the role changes of a team to the report of a dry run
+    # rolePlan: RolePlan of the team
+    # teamInfo: Team the plan was made for
+    # report: SyncReport of the dry run
+    def __addPlannedRoleChanges(self, rolePlan: RolePlan, teamInfo: TeamInfo, report: SyncReport):
+        for _ in rolePlan.rolesToCreate:
+            report.plannedChanges += [f"Create role '{teamInfo.name}'"]
+
+        for teamRole, _ in rolePlan.rolesToRename:
+            report.plannedChanges += [f"Rename role '{teamRole.name}' to '{teamInfo.name}'"]
+
+        for member, _, reason in rolePlan.assignments:
+            report.plannedChanges += [f"Give role of team '{teamInfo.name}' to {member} ({reason})"]
@@ -0,0 +1,152 @@
+# The TokenManager keeps the toornament OAuth2 authorization token valid, so requests never wait for a new token.
+# A timer renews the token in the background some time before it expires. Requests only read the current token;
+# they only wait for a renewal if the token already expired, e.g. because the background renewal failed.
+#
+# Renewals are single-flight: However many requests, threads and the timer ask for a new token at the same time,
+# only one token request is sent and all of them wait for its result. The renewal runs on a single worker thread,
+# which afterwards also writes the new token to the authorization file, so no request waits for the disk either.
+
+from authorization import AuthorizationInfo
+from concurrent.futures import ThreadPoolExecutor, Future
+import asyncio
+import datetime
+import threading
+import traceback
+
+class TokenManager:
+
+    # Constructor
+    # authorization: Authorization info holding the current token
+    # requestToken: Function that requests a new token and returns the response of the OAuth2 endpoint
+    # refreshMargin: Seconds before the expiry of the token at which it is renewed
+    # retryDelay: Seconds after which a failed background renewal is retried
+    def __init__(self, authorization: AuthorizationInfo, requestToken, refreshMargin: float = 300.0, retryDelay: float = 30.0):
+        self.auth = authorization
+        self.requestToken = requestToken
+        self.refreshMargin = refreshMargin
+        self.retryDelay = retryDelay
+
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "token")
+        self.refreshFuture = None
+        self.timer = None
+
+        self.refreshes = 0
+        self.failures = 0
+
+        self.__scheduleRefresh(self.__getSecondsUntilRefresh())
+
+    # Returns the current token. Only waits for a renewal if the token expired.
+    def getToken(self) -> str:
+        if self.auth.hasToornamentAuthExpired():
+            self.__startRefresh().result()
+
+        return self.auth.toornamentAuthKey
+
+    # Asynchronous version of getToken. Doesn't block the event loop while waiting for a renewal.
+    async def getTokenAsync(self) -> str:
+        if self.auth.hasToornamentAuthExpired():
+            await asyncio.wrap_future(self.__startRefresh())
+
+        return self.auth.toornamentAuthKey
+
+    # Renews a token that was rejected by the API and returns the new one.
+    # If another caller already renewed the rejected token, its replacement is returned without a further request.
+    # rejectedToken: The token the API rejected
+    def renew(self, rejectedToken: str) -> str:
+        future = self.__startRefresh(rejectedToken)
+
+        if future is not None:
+            future.result()
+
+        return self.auth.toornamentAuthKey
+
+    # Asynchronous version of renew. Doesn't block the event loop while waiting for the renewal.
+    async def renewAsync(self, rejectedToken: str) -> str:
+        future = self.__startRefresh(rejectedToken)
+
+        if future is not None:
+            await asyncio.wrap_future(future)
+
+        return self.auth.toornamentAuthKey
+
+    # Returns the number of renewals and failed renewals
+    def getStats(self):
+        return {"refreshes": self.refreshes, "failures": self.failures}
+
+    # Stops the timer and waits until the new token was written to the authorization file
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        self.executor.shutdown(wait = True)
+
+    # Returns the future of the running renewal, or starts a new renewal if none is running.
+    # rejectedToken: Optional token rejected by the API. If it was already replaced, no renewal is started and None is returned.
+    def __startRefresh(self, rejectedToken: str = None) -> Future:
+        with self.lock:
+            if self.refreshFuture is not None and not self.refreshFuture.done():
+                return self.refreshFuture
+
+            if rejectedToken is not None and rejectedToken != self.auth.toornamentAuthKey:
+                return None
+
+            self.refreshFuture = self.executor.submit(self.__refresh)
+            return self.refreshFuture
+
+    # Requests a new token and schedules the next renewal. Runs on the worker thread.
+    def __refresh(self):
+        try:
+            tokenJSON = self.requestToken()
+        except Exception:
+            self.failures += 1
+            self.__scheduleRefresh(self.retryDelay)
+            raise
+
+        self.auth.replaceToornamentAuthKey(tokenJSON, save = False)
+        self.refreshes += 1
+        self.__scheduleRefresh(self.__getSecondsUntilRefresh())
+
+        # Runs after this renewal on the same worker, so callers waiting for the token don't wait for the file
+        self.executor.submit(self.__save)
+
+    # Writes the authorization info to the file it was loaded from. Runs on the worker thread.
+    def __save(self):
+        if self.auth.authPath is None:
+            return
+
+        try:
+            self.auth.saveToJSON(self.auth.authPath)
+        except OSError:
+            print(traceback.format_exc())
+
+    # Starts the timer of the next background renewal
+    # delay: Seconds until the renewal
+    def __scheduleRefresh(self, delay: float):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+
+            self.timer = threading.Timer(max(delay, 0), self.__refreshInBackground)
+            self.timer.daemon = True
+            self.timer.start()
+
+    # Renews the token when the timer runs out. Errors are logged, the renewal is retried after the retry delay.
+    def __refreshInBackground(self):
+        try:
+            self.__startRefresh().add_done_callback(self.__logFailure)
+        except RuntimeError:
+            # The executor was shut down by close
+            pass
+
+    # Logs the error of a failed background renewal
+    def __logFailure(self, future: Future):
+        if future.exception() is not None:
+            err = future.exception()
+            print("".join(traceback.format_exception(type(err), err, err.__traceback__)))
+
+    # Returns the number of seconds until the token has to be renewed
+    def __getSecondsUntilRefresh(self) -> float:
+        return (self.auth.toornamentAuthExpiry - datetime.datetime.now()).total_seconds() - self.refreshMargin
@@ -16,109 +16,203 @@
 
 from authorization import AuthorizationInfo
 from mysqlwrapper import MySQLWrapper
-from utility import toStr
-import json
-import requests
-import datetime
-import pause
+from httpsession import HTTPSession
+from ratelimiter import RateLimiter, TokenBucket
+from httpcache import ResponseCache
+from tokenmanager import TokenManager
+from tournamentregistry import TournamentRegistry, TournamentInfo
+from roster import RosterIndex
+from utility import toStr, getSlots, compileDecoder, compileEncoder
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import parse
-from typing import List
+from typing import List, Iterator, AsyncIterator
 
-# This class contains all relevant player information from toornament
-class PlayerInfo:
+# Base class of the participant models. Keeps a snapshot of the tracked values from when the object was fetched,
+# so the changed fields can be found by comparing the attributes with it and only these have to be sent to toornament.
+# The snapshot is a tuple of the values only, the JSON the object was decoded from isn't kept.
+class DirtyTracking:
+
+    __slots__ = ("snapshot",)
+
+    # Names of the attributes stored in the snapshot in the order of the field tables, set by each subclass
+    TRACKED_ATTRIBUTES = ()
+
+    # Returns the names of all attributes whose value differs from the snapshot
+    def getDirtyFields(self):
+        return frozenset(attribute for attribute, value in zip(self.TRACKED_ATTRIBUTES, self.snapshot) if getattr(self, attribute) != value)
+
+    # Returns True if any attribute changed
+    def isDirty(self) -> bool:
+        return any(getattr(self, attribute) != value for attribute, value in zip(self.TRACKED_ATTRIBUTES, self.snapshot))
+
+    # Forgets all changes by taking a new snapshot, e.g. after they were sent to toornament
+    def markClean(self):
+        self.snapshot = tuple(getattr(self, attribute) for attribute in self.TRACKED_ATTRIBUTES)
+
+    # Returns a copy with the same snapshot, whose attributes can be changed without changing this object
+    def copy(self):
+        info = type(self).__new__(type(self))
+
+        for slot in getSlots(type(self)):
+            setattr(info, slot, getattr(self, slot))
+
+        return info
+
+
+# This class contains all relevant player information from toornament.
+# Objects are slotted, because thousands of them are kept in memory during a sync. The JSON decoder and
+# encoder are compiled from the field tables. Custom fields that aren't listed are kept and written back unchanged.
+class PlayerInfo(DirtyTracking):
+
+    # Tuples of attribute name and JSON key of the player fields
+    FIELDS = (
+        ("name", "name"),
+        ("userID", "user_id"),
+        ("email", "email")
+    )
+
+    # Tuples of attribute name and JSON key of the custom fields of a player
+    CUSTOM_FIELDS = (
+        ("discordID", "discord_id"),
+        ("country", "country"),
+        ("steamID", "steam_id"),
+        ("psnID", "psn_id"),
+        ("xboxID", "xbox_live_gamertag"),
+        ("nintendoID", "nintendo_network_id"),
+        ("trackerLink", "rltracker_link"),
+        ("trackerLinkAlt", "rltracker_link_alt_account_")
+    )
+
+    __slots__ = tuple(attribute for attribute, _ in FIELDS + CUSTOM_FIELDS) + ("extraCustomFields",)
+
+    TRACKED_ATTRIBUTES = tuple(attribute for attribute, _ in FIELDS + CUSTOM_FIELDS)
 
     def __init__(self):
+        for attribute in PlayerInfo.__slots__:
+            setattr(self, attribute, None)
+
         self.name = ""
+        self.markClean()
 
     @classmethod
     def fromJSON(cls, playerJSON):
-        info = cls()
-        info.name = playerJSON['name']
-        info.userID = playerJSON['user_id']
-        info.email = playerJSON['email']
-        
-        customJSON = playerJSON['custom_fields']
-        info.discordID = toStr(customJSON['discord_id'])
-        info.country = customJSON['country']
-        info.steamID = customJSON['steam_id']
-        info.psnID = customJSON['psn_id']
-        info.xboxID = customJSON['xbox_live_gamertag']
-        info.nintendoID = customJSON['nintendo_network_id']
-        info.trackerLink = customJSON['rltracker_link']
-        info.trackerLinkAlt = customJSON['rltracker_link_alt_account_']
+        info = PlayerInfo.decode(cls, playerJSON)
+
+        # IDs entered as numbers are stored as strings, which isn't a change of the player
+        if info.discordID is not None and not isinstance(info.discordID, str):
+            info.discordID = toStr(info.discordID)
+            info.markClean()
 
         return info
 
     def toJSON(self):
-        return {
-            "name": self.name,
-            "user_id": self.userID,
-            "email": self.email,
-            "custom_fields": {
-                "discord_id": f"{self.discordID}",
-                "country": self.country,
-                "steam_id": self.steamID,
-                "psn_id": self.psnID,
-                "xbox_live_gamertag": self.xboxID,
-                "nintendo_network_id": self.nintendoID,
-                "rltracker_link": self.trackerLink,
-                "rltracker_link_alt_account_": self.trackerLinkAlt
-            }
-        }
+        return PlayerInfo.encode(self)
+
+
+PlayerInfo.decode = staticmethod(compileDecoder(PlayerInfo))
+PlayerInfo.encode = staticmethod(compileEncoder(PlayerInfo))
+
+
+# This class contains all relevant team information from toornament and Discord.
+# Slotted and decoded like PlayerInfo. The Discord role and emote of the team are not part of the JSON.
+class TeamInfo(DirtyTracking):
 
+    # Tuples of attribute name and JSON key of the team fields
+    FIELDS = (
+        ("name", "name"),
+        ("id", "id"),
+        ("email", "email")
+    )
 
-# This class contains all relevant team information from toornament and Discord
-class TeamInfo:
+    # Tuples of attribute name and JSON key of the custom fields of a team
+    CUSTOM_FIELDS = (
+        ("shortName", "short_name"),
+        ("previousName", "previous_team_name"),
+        ("twitterURL", "twitter"),
+        ("twitchURL", "twitch"),
+        ("managerDiscordID", "manager_discord_id")
+    )
+
+    # Custom fields most teams don't have. They are left out of the JSON if they are None.
+    OPTIONAL_CUSTOM_FIELDS = (
+        ("logoURL", "logo"),
+    )
+
+    __slots__ = tuple(attribute for attribute, _ in FIELDS + CUSTOM_FIELDS + OPTIONAL_CUSTOM_FIELDS) + ("extraCustomFields", "lineup", "lineupSnapshot", "roleID", "emoteID")
+
+    TRACKED_ATTRIBUTES = tuple(attribute for attribute, _ in FIELDS + CUSTOM_FIELDS + OPTIONAL_CUSTOM_FIELDS)
 
     def __init__(self):
+        for attribute in TeamInfo.__slots__:
+            setattr(self, attribute, None)
+
         self.name = ""
         self.roleID = 0
         self.emoteID = 0
+        self.lineup = []
+        self.markClean()
 
     @classmethod
     def fromJSON(cls, teamJSON):
-        info = cls()
-        info.name = teamJSON['name']
-        info.id = teamJSON['id']
-        info.email = teamJSON['email']
+        info = TeamInfo.decode(cls, teamJSON)
+        info.lineup = [PlayerInfo.fromJSON(memberJSON) for memberJSON in teamJSON.get('lineup') or ()]
+        info.lineupSnapshot = tuple(info.lineup)
+
+        # The players are clean already
+        if info.managerDiscordID is not None and not isinstance(info.managerDiscordID, str):
+            info.managerDiscordID = toStr(info.managerDiscordID)
+            DirtyTracking.markClean(info)
 
-        customJSON = teamJSON['custom_fields']
-        info.shortName = customJSON['short_name']
-        info.previousName = customJSON['previous_team_name']
-        info.twitterURL = customJSON['twitter']
-        info.twitchURL = customJSON['twitch']
-        info.managerDiscordID = toStr(customJSON['manager_discord_id'])
+        return info
 
-        info.lineup = []
+    def toJSON(self):
+        teamJSON = TeamInfo.encode(self)
+        teamJSON['lineup'] = [playerInfo.toJSON() for playerInfo in self.lineup]
+        return teamJSON
 
-        for memberJSON in teamJSON['lineup']:
-            memberInfo = PlayerInfo.fromJSON(memberJSON)
-            info.lineup += [memberInfo]
+    # Returns True if any field of the team or of a player changed
+    def isDirty(self) -> bool:
+        return DirtyTracking.isDirty(self) or self.isLineupDirty()
 
+    # Returns True if players were added, removed or replaced, or if any field of a player changed
+    def isLineupDirty(self) -> bool:
+        return tuple(self.lineup) != self.lineupSnapshot or any(playerInfo.isDirty() for playerInfo in self.lineup)
+
+    # Forgets all changes of the team and its players
+    def markClean(self):
+        DirtyTracking.markClean(self)
+        self.lineupSnapshot = tuple(self.lineup or ())
+
+        for playerInfo in self.lineup or ():
+            playerInfo.markClean()
+
+    # Returns a copy of the team and its players, whose attributes can be changed without changing this team
+    def copy(self):
+        info = DirtyTracking.copy(self)
+        playerCopies = {playerInfo: playerInfo.copy() for playerInfo in self.lineup}
+        info.lineup = [playerCopies[playerInfo] for playerInfo in self.lineup]
+        info.lineupSnapshot = tuple(playerCopies.get(playerInfo, playerInfo) for playerInfo in self.lineupSnapshot)
         return info
 
-    def toJSON(self):
+    # Returns the JSON of all changed fields to be sent in a PATCH request, or None if nothing changed.
+    # The lineup can only be replaced as a whole, so it is sent completely if any player changed.
+    def toPatchJSON(self):
+        if not self.isDirty():
+            return None
 
-        # Gets JSON for every team member and combines them into a list
-        lineupJSON = []
-
-        for playerInfo in self.lineup:
-            lineupJSON += [playerInfo.toJSON()]
-
-        # Generates team JSON
-        return {
-            "name": self.name,
-            "id": self.id,
-            "email": self.email,
-            "custom_fields": {
-                "short_name": self.shortName,
-                "previous_team_name": self.previousName,
-                "twitter": self.twitterURL,
-                "twitch": self.twitchURL,
-                "manager_discord_id": f"{self.managerDiscordID}"
-            },
-            "lineup": lineupJSON
-        }
+        dirtyFields = self.getDirtyFields()
+        patchJSON = {key: getattr(self, attribute) for attribute, key in TeamInfo.FIELDS if attribute in dirtyFields}
+        customJSON = {key: getattr(self, attribute) for attribute, key in TeamInfo.CUSTOM_FIELDS if attribute in dirtyFields}
+        customJSON.update((key, getattr(self, attribute)) for attribute, key in TeamInfo.OPTIONAL_CUSTOM_FIELDS if attribute in dirtyFields and getattr(self, attribute) is not None)
+
+        if len(customJSON) > 0:
+            patchJSON['custom_fields'] = customJSON
+
+        if self.isLineupDirty():
+            patchJSON['lineup'] = [playerInfo.toJSON() for playerInfo in self.lineup]
+
+        return patchJSON if len(patchJSON) > 0 else None
 
     # Returns information about player with a certain Discord ID from the team lineup
     # discordID: Unique Discord Developer ID of the player
@@ -130,13 +224,8 @@ class TeamInfo:
         return None
 
 
-# This class associates a tournament ID with a guild and optionally a name
-class TournamentInfo:
-
-    def __init__(self, name = None, guildID = None, tournamentID = None):
-        self.name = name
-        self.guildID = guildID
-        self.tournamentID = tournamentID
+TeamInfo.decode = staticmethod(compileDecoder(TeamInfo, {"roleID": 0, "emoteID": 0}))
+TeamInfo.encode = staticmethod(compileEncoder(TeamInfo))
 
 
 # This class contains all relevant information for a toornament signup.
@@ -145,14 +234,19 @@ class TournamentInfo:
 # the TeamInfo object.
 class RegistrationInfo:
 
+    __slots__ = ("id", "team")
+
     def __init__(self):
         self.id = ""
+        self.team = None
 
     @classmethod
     def fromJSON(cls, regJSON):
-        self.team = TeamInfo.fromJSON(regJSON)
-        self.team.id = regJSON['participant_id']
-        self.id = regJSON['id']
+        info = cls()
+        info.team = TeamInfo.fromJSON(regJSON)
+        info.team.id = regJSON['participant_id']
+        info.id = regJSON['id']
+        return info
 
     def toJSON(self):
         teamJSON = self.team.toJSON()
@@ -168,13 +262,34 @@ class ToornamentInterface:
     # authorization: Authorization self object
     # mysql: MySQL wrapper object
     # overwrite: If set to True, existing tables will be dropped and overwritten
-    def __init__(self, authorization: AuthorizationInfo, mysqlWrapper: MySQLWrapper, overwrite: bool = False):
+    # httpSession: Optional HTTP session used for all API requests. Can be given to configure pool size and timeouts.
+    # rateLimiter: Optional rate limiter shared by all API requests. Can be given to configure rates and bursts per endpoint family.
+    # maxRateLimitRetries: How often a request is repeated after the API rejected it because of its rate limit
+    # responseCache: Optional cache used for conditional GET requests. Defaults to an in-memory cache, caching is disabled if it is False.
+    def __init__(self, authorization: AuthorizationInfo, mysqlWrapper: MySQLWrapper, overwrite: bool = False, httpSession: HTTPSession = None, rateLimiter: RateLimiter = None, maxRateLimitRetries: int = 3, responseCache: ResponseCache = None):
         self.auth = authorization
         self.mysql = mysqlWrapper
-        self.endpointCooldown = datetime.datetime.now()
+        self.http = httpSession if httpSession is not None else HTTPSession()
+        self.rateLimiter = rateLimiter if rateLimiter is not None else self.__getDefaultRateLimiter()
+        self.maxRateLimitRetries = maxRateLimitRetries
+
+        # Renews the OAuth2 authorization token in the background before it expires
+        self.tokenManager = TokenManager(self.auth, self.__requestAuthorizationToken)
+
+        if responseCache is False:
+            self.responseCache = None
+        else:
+            self.responseCache = responseCache if responseCache is not None else ResponseCache()
 
         self.__initAllTables()
 
+        # Tournaments are looked up often to find their guild, so all of them are kept in memory
+        self.tournamentRegistry = TournamentRegistry(mysqlWrapper)
+        self.tournamentRegistry.preload()
+
+        # Maps tournament IDs to the roster index built from the last fetch of all teams
+        self.rosters = {}
+
 
     # Creates all SQL tables that don't exist yet
     # overwrite: If set to True, existing tables will be dropped and overwritten
@@ -203,118 +318,207 @@ class ToornamentInterface:
         ), overwrite = overwrite)
 
 
-    # Checks if the authorization token has expired. If it has, tries to get a new one.
-    def __checkAuthorizationToken(self):
-        if self.auth.hasToornamentAuthExpired():
+    # Returns URL, data and headers of the request used to fetch a new OAuth2 authorization token.
+    # See: https://developer.toornament.com/v2/doc/security_oauth2#post:oauthv2token
+    def __getAuthorizationTokenRequest(self):
+        requestURL = "https://api.toornament.com/oauth/v2/token"
 
-            # Requests new authorization token from OAuth2 endpoint
-            # See: https://developer.toornament.com/v2/doc/security_oauth2#post:oauthv2token
-            requestURL = "https://api.toornament.com/oauth/v2/token"
-
-            requestHeaders = {
-                "Content-Type": "application/x-www-form-urlencoded"
-            }
+        requestHeaders = {
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
 
-            requestData = {
-                "grant_type": "client_credentials",
-                "scope": "organizer:participant",
-                "client_id": self.auth.toornamentClientID,
-                "client_secret": self.auth.toornamentClientSecret
-            }
+        requestData = {
+            "grant_type": "client_credentials",
+            "scope": "organizer:participant",
+            "client_id": self.auth.toornamentClientID,
+            "client_secret": self.auth.toornamentClientSecret
+        }
 
-            response = self.__requestPost(url = requestURL, data = requestData, headers = requestHeaders, authorization=False)
-            self.auth.replaceToornamentAuthKey(response)
+        return requestURL, requestData, requestHeaders
 
 
-    # Checks the time since the last endpoint call and cools down if necessary.
-    # Currently a rate limit of 3 calls/second is used. (This is implemented as a 0.333sec minimum cooldown)
-    def __respectRateLimits(self):
-        if datetime.datetime.now() < self.endpointCooldown:
-            pause.until(self.endpointCooldown)
-        
-        self.endpointCooldown = datetime.datetime.now() + datetime.timedelta(milliseconds=333)
+    # Requests a new authorization token from the OAuth2 endpoint and returns the response.
+    # Called by the token manager on its worker thread.
+    def __requestAuthorizationToken(self):
+        requestURL, requestData, requestHeaders = self.__getAuthorizationTokenRequest()
+        return self.__requestPost(url = requestURL, data = requestData, headers = requestHeaders, authorization=False)
 
 
-    # Sends a GET request to a toornament API endpoint. Takes care of authorization&API tokens, rate limits and response validation.
+    # Returns the name of the endpoint family an API URL belongs to. Each family has its own rate limit.
     # url: The API endpoint URL
-    # headers: The additional headers to be provided to the API. Authorization and API-Token are added automatically by this method and must not be given to it manually!
-    # authorization: If this is True, the method will refresh the OAuth2 authorization token and add it to the request header
-    def __requestGet(self, url: str, headers = {}, authorization: bool = False):
-        # Updates OAuth2 authorization and adds the token to the headers
+    @staticmethod
+    def __getEndpointFamily(url: str) -> str:
+        if "/oauth/" in url:
+            return "oauth"
+        elif "/participants" in url:
+            return "participants"
+        else:
+            return "default"
+
+
+    # Returns the default rate limiter with one token bucket per endpoint family.
+    # Up to 3 calls/second are made to participant endpoints, but short bursts are allowed.
+    @staticmethod
+    def __getDefaultRateLimiter() -> RateLimiter:
+        return RateLimiter({
+            "participants": TokenBucket(rate = 3, burst = 3),
+            "oauth": TokenBucket(rate = 1, burst = 1)
+        })
+
+
+    # Returns a copy of the given headers with the API-token and optionally the OAuth2 authorization token added.
+    # headers: The additional headers to be provided to the API
+    # authorization: If this is True, the method will add the OAuth2 authorization token to the headers
+    def __getRequestHeaders(self, headers = None, authorization: bool = False):
+        requestHeaders = dict(headers) if headers is not None else {}
+
+        # Adds the OAuth2 authorization token, which is kept valid by the token manager
         if authorization:
-            self.__checkAuthorizationToken()
-            headers['Authorization'] = self.auth.toornamentAuthKey
-        
+            requestHeaders['Authorization'] = self.tokenManager.getToken()
+
         # Adds API-token to header
-        headers['X-Api-Key'] = self.auth.toornamentToken
-        
-        # Respects rate limits
-        self.__respectRateLimits()
+        requestHeaders['X-Api-Key'] = self.auth.toornamentToken
+        return requestHeaders
 
-        # Sends GET request
-        response = requests.get(url = url, headers = headers)
 
-        # Returns response as JSON if it is OK
-        if response.ok:
-            return response.json()
-        else:
-            raise response.raise_for_status()
+    # Looks up the cached response of a GET request and adds the headers for a conditional request to a copy of the request headers.
+    # Returns the cache key, the cached response and the request headers. Key and response are None if the request can't be cached.
+    # method: HTTP method of the request, e.g. "GET"
+    # url: The API endpoint URL
+    # headers: The complete headers of the request
+    def __prepareConditionalRequest(self, method: str, url: str, headers):
+        if method != "GET" or self.responseCache is None:
+            return None, None, headers
 
+        cacheKey = ResponseCache.getKey(url, headers.get('Range'))
+        cachedResponse = self.responseCache.get(cacheKey)
 
-    # Sends a POST request to a toornament API endpoint. Takes care of authorization&API tokens, rate limits and response validation.
+        if cachedResponse is not None:
+            headers = dict(headers)
+            headers.update(cachedResponse.getConditionalHeaders())
+
+        return cacheKey, cachedResponse, headers
+
+
+    # Stores the response of a cacheable request and counts it as a cache miss.
+    # cacheKey: Key returned by __prepareConditionalRequest, None if the request can't be cached
+    # responseJSON: Parsed content of the response
+    # responseHeaders: Headers of the response
+    def __cacheResponse(self, cacheKey, responseJSON, responseHeaders):
+        if cacheKey is not None:
+            self.responseCache.recordMiss()
+            self.responseCache.store(cacheKey, responseJSON, responseHeaders)
+
+
+    # Sends a request to a toornament API endpoint over the pooled HTTP session. Takes care of rate limits and response validation.
+    # If the API rejects the authorization token, the token is renewed and the request is sent once more.
+    # Returns the response content as JSON and the response headers.
+    # method: HTTP method of the request, e.g. "GET"
+    # url: The API endpoint URL
+    # headers: The complete headers of the request, including authorization and API-token
+    # kwargs: Additional arguments passed to requests, e.g. data or json
+    def __sendRequest(self, method: str, url: str, headers, **kwargs):
+        endpointFamily = self.__getEndpointFamily(url)
+        cacheKey, cachedResponse, headers = self.__prepareConditionalRequest(method, url, headers)
+
+        rateLimitRetries = 0
+        isTokenRenewed = False
+
+        while True:
+            # Respects rate limits and adapts them to the response
+            self.rateLimiter.acquire(endpointFamily)
+            response = self.http.request(method, url, headers = headers, **kwargs)
+            self.rateLimiter.update(endpointFamily, response.status_code, response.headers)
+
+            # Retries the request if it was rejected because of the rate limit
+            if response.status_code == 429 and rateLimitRetries < self.maxRateLimitRetries:
+                rateLimitRetries += 1
+                continue
+
+            # Retries the request once with a new token if the token was rejected, e.g. because it was revoked
+            if response.status_code == 401 and 'Authorization' in headers and not isTokenRenewed:
+                headers = dict(headers, Authorization = self.tokenManager.renew(headers['Authorization']))
+                isTokenRenewed = True
+                continue
+
+            # Answers the request from the cache if the content didn't change
+            if response.status_code == 304 and cachedResponse is not None:
+                self.responseCache.recordHit()
+                return cachedResponse.content, cachedResponse.headers
+
+            # Returns response as JSON if it is OK
+            response.raise_for_status()
+            responseJSON = response.json()
+            self.__cacheResponse(cacheKey, responseJSON, response.headers)
+            return responseJSON, response.headers
+
+
+    # Sends a GET request to a toornament API endpoint. Takes care of authorization&API tokens, rate limits and response validation.
     # url: The API endpoint URL
-    # data: The data to be sent with the request
     # headers: The additional headers to be provided to the API. Authorization and API-Token are added automatically by this method and must not be given to it manually!
     # authorization: If this is True, the method will refresh the OAuth2 authorization token and add it to the request header
-    def __requestPost(self, url: str, data = None, headers = {}, authorization: bool = False):
-        
-        # Updates OAuth2 authorization and adds the token to the headers
-        if authorization:
-            self.__checkAuthorizationToken()
-            headers['Authorization'] = self.auth.toornamentAuthKey
-        
-        # Adds API-token to header
-        headers['X-Api-Key'] = self.auth.toornamentToken
-        
-        # Respects rate limits
-        self.__respectRateLimits()
+    def __requestGet(self, url: str, headers = None, authorization: bool = False):
+        requestHeaders = self.__getRequestHeaders(headers, authorization)
+        responseJSON, _ = self.__sendRequest("GET", url, requestHeaders)
+        return responseJSON
 
-        # Sends POST request
-        response = requests.post(url = url, data = data, headers = headers)
 
-        # Returns response as JSON if it is OK
-        if response.ok:
-            return response.json()
-        else:
-            raise response.raise_for_status()
+    # Sends a POST request to a toornament API endpoint. Takes care of authorization&API tokens, rate limits and response validation.
+    # url: The API endpoint URL
+    # data: The data to be sent with the request
+    # headers: The additional headers to be provided to the API. Authorization and API-Token are added automatically by this method and must not be given to it manually!
+    # authorization: If this is True, the method will refresh the OAuth2 authorization token and add it to the request header
+    def __requestPost(self, url: str, data = None, headers = None, authorization: bool = False):
+        requestHeaders = self.__getRequestHeaders(headers, authorization)
+        responseJSON, _ = self.__sendRequest("POST", url, requestHeaders, data = data)
+        return responseJSON
 
 
     # Sends a PATCH request to a toornament API endpoint. Takes care of authorization&API tokens, rate limits and response validation.
     # url: The API endpoint URL
-    # data: The data to be sent with the request
+    # data: The data to be sent with the request as JSON
     # headers: The additional headers to be provided to the API. Authorization and API-Token are added automatically by this method and must not be given to it manually!
     # authorization: If this is True, the method will refresh the OAuth2 authorization token and add it to the request header
-    def __requestPatch(self, url: str, data = None, headers = {}, authorization: bool = False):
+    def __requestPatch(self, url: str, data = None, headers = None, authorization: bool = False):
+        requestHeaders = self.__getRequestHeaders(headers, authorization)
+        responseJSON, _ = self.__sendRequest("PATCH", url, requestHeaders, json = data)
+        return responseJSON
 
-        # Updates OAuth2 authorization and adds the token to the headers
-        if authorization:
-            self.__checkAuthorizationToken()
-            headers['Authorization'] = self.auth.toornamentAuthKey
-        
-        # Adds API-token to header
-        headers['X-Api-Key'] = self.auth.toornamentToken
-        
-        # Respects rate limits
-        self.__respectRateLimits()
 
-        # Sends POST request
-        response = requests.patch(url = url, data = json.dumps(data), headers = headers)
+    # Parses the Content-Range header of a paginated response.
+    # Returns the index of the last item on the page and the total number of items.
+    # unit: The unit in which the paginated content is counted (e.g. tournaments, items, participants, etc)
+    # responseHeaders: Headers of the paginated response
+    @staticmethod
+    def __parseContentRange(unit: str, responseHeaders):
+        contentRangeFormat = f"{unit} {{:d}}-{{:d}}/{{:d}}"
+        parsedContentRange = parse.parse(contentRangeFormat, responseHeaders['Content-Range'])
+        return parsedContentRange[1], parsedContentRange[2]
 
-        # Returns response as JSON if it is OK
-        if response.ok:
-            return response.json()
-        else:
-            raise response.raise_for_status()
+
+    # Returns the Range headers of all pages that follow the first page of paginated content.
+    # unit: The unit in which the paginated content is counted
+    # lastPageIndex: Index of the last item on the first page
+    # totalPageNumber: Total number of items
+    # itemsPerPage: Number of items on each page
+    @staticmethod
+    def __getRemainingPageRanges(unit: str, lastPageIndex: int, totalPageNumber: int, itemsPerPage: int):
+        return [f"{unit}={pageStart}-{pageStart + itemsPerPage - 1}" for pageStart in range(lastPageIndex + 1, totalPageNumber, itemsPerPage)]
+
+
+    # Requests a single page of paginated content.
+    # Returns the items of the page, the index of its last item and the total number of items.
+    # url: The API endpoint URL
+    # headers: The complete headers of the request, including authorization and API-token
+    # pageRange: Value of the Range header, e.g. "participants=0-49"
+    # unit: The unit in which the paginated content is counted
+    def __requestPage(self, url: str, headers, pageRange: str, unit: str):
+        pageHeaders = dict(headers)
+        pageHeaders['Range'] = pageRange
+
+        pageJSON, responseHeaders = self.__sendRequest("GET", url, pageHeaders)
+        lastPageIndex, totalPageNumber = self.__parseContentRange(unit, responseHeaders)
+        return pageJSON, lastPageIndex, totalPageNumber
 
 
     # Retrieves multiple pages of content via GET-requests and returns them as one result.
@@ -324,92 +528,330 @@ class ToornamentInterface:
     # authorization: If this is True, the method will refresh the OAuth2 authorization token and add it to the request header
     # unit: The unit in which the paginated content is counted (e.g. tournaments, items, participants, etc)
     # itemsPerRequest: How many items can be requested per page. Consult toornament API documentation to get the right number for your API endpoint.
-    def __requestPaginatedContent(self, url: str, headers = {}, authorization: bool =  False, unit: str = "items", itemsPerRequest: int = 50):
-    
-        # Updates OAuth2 authorization and adds the token to the headers
-        if authorization:
-            self.__checkAuthorizationToken()
-            headers['Authorization'] = self.auth.toornamentAuthKey
-        
-        # Adds API-token to header
-        headers['X-Api-Key'] = self.auth.toornamentToken
+    # concurrent: If this is True, all pages after the first one are requested at the same time within the rate limits
+    def __requestPaginatedContent(self, url: str, headers = None, authorization: bool =  False, unit: str = "items", itemsPerRequest: int = 50, concurrent: bool = False):
+        if concurrent:
+            requestHeaders = self.__getRequestHeaders(headers, authorization)
+            return self.__requestPaginatedContentConcurrently(url, requestHeaders, unit, itemsPerRequest)
 
-        # Defines Content-Range return format used to determine if the last page is reached
-        contentRangeFormat = f"{unit} {{:d}}-{{:d}}/{{:d}}"
+        pageCollection = []
+
+        for pageJSON in self.__iterPaginatedContent(url, headers, authorization, unit, itemsPerRequest):
+            pageCollection += pageJSON
+
+        return pageCollection
+
+
+    # Retrieves multiple pages of content via GET-requests and yields them one page at a time.
+    # The next page is only requested once the caller asks for it, so only one page is held in memory.
+    # url: The API endpoint URL
+    # headers: The additional headers to be provided to the API. Authorization, API-token and range are added automatically and must not be given manually!
+    # authorization: If this is True, the method will refresh the OAuth2 authorization token and add it to the request header
+    # unit: The unit in which the paginated content is counted (e.g. tournaments, items, participants, etc)
+    # itemsPerRequest: How many items can be requested per page
+    def __iterPaginatedContent(self, url: str, headers = None, authorization: bool = False, unit: str = "items", itemsPerRequest: int = 50):
+        requestHeaders = self.__getRequestHeaders(headers, authorization)
         pageStart = 0
         totalPageNumber = 1
-        pageCollection = []
 
         while pageStart < totalPageNumber:
-            # Adds updated range to header
-            pageEnd = pageStart + itemsPerRequest - 1
-            headers['Range'] = f"{unit}={pageStart}-{pageEnd}"
+            # Requests next set of pages
+            pageRange = f"{unit}={pageStart}-{pageStart + itemsPerRequest - 1}"
+            pageJSON, lastPageIndex, totalPageNumber = self.__requestPage(url, requestHeaders, pageRange, unit)
+            yield pageJSON
+
+            # Calculates which is the next page to be retrieved
+            pageStart = lastPageIndex + 1
+
+
+    # Retrieves the first page of paginated content, then all remaining pages at the same time using a thread pool.
+    # The pages are returned in their original order. The rate limiter spaces the requests out.
+    # url: The API endpoint URL
+    # headers: The complete headers of the request, including authorization and API-token
+    # unit: The unit in which the paginated content is counted
+    # itemsPerRequest: How many items can be requested per page
+    def __requestPaginatedContentConcurrently(self, url: str, headers, unit: str, itemsPerRequest: int):
+        # The first page tells how many items exist, which determines the ranges of all other pages
+        pageJSON, lastPageIndex, totalPageNumber = self.__requestPage(url, headers, f"{unit}=0-{itemsPerRequest - 1}", unit)
+        pageRanges = self.__getRemainingPageRanges(unit, lastPageIndex, totalPageNumber, lastPageIndex + 1)
+        pageCollection = list(pageJSON)
+
+        if len(pageRanges) == 0:
+            return pageCollection
+
+        with ThreadPoolExecutor(max_workers = min(len(pageRanges), self.http.poolSize)) as executor:
+            for pageJSON, _, _ in executor.map(lambda pageRange: self.__requestPage(url, headers, pageRange, unit), pageRanges):
+                pageCollection += pageJSON
+
+        return pageCollection
+
+
+    # Returns how many HTTP connections were opened and how many requests reused an already open connection.
+    def getConnectionStats(self):
+        return self.http.getStats()
+
+
+    # Returns how many GET requests were answered from the response cache and how many had to be downloaded.
+    def getCacheStats(self):
+        if self.responseCache is None:
+            return None
+        else:
+            return self.responseCache.getStats()
+
+
+    # Returns a map with the number of tournament lookups answered from memory and from the database
+    def getTournamentStats(self):
+        return self.tournamentRegistry.getStats()
+
+
+    # Stops renewing the authorization token and closes all pooled connections of the synchronous and asynchronous sessions and the response cache.
+    # Should be awaited before the event loop is shut down.
+    async def closeAsync(self):
+        self.tokenManager.close()
+        self.http.close()
+        await self.http.closeAsync()
+
+        if self.responseCache is not None:
+            self.responseCache.close()
+
+
+    # Returns a copy of the given headers with the API-token and optionally the OAuth2 authorization token added.
+    # headers: The additional headers to be provided to the API
+    # authorization: If this is True, the method will add the OAuth2 authorization token to the headers
+    async def __getRequestHeadersAsync(self, headers = None, authorization: bool = False):
+        requestHeaders = dict(headers) if headers is not None else {}
+
+        # Adds the OAuth2 authorization token, which is kept valid by the token manager
+        if authorization:
+            requestHeaders['Authorization'] = await self.tokenManager.getTokenAsync()
+
+        # Adds API-token to header
+        requestHeaders['X-Api-Key'] = self.auth.toornamentToken
+        return requestHeaders
+
+
+    # Asynchronous version of __sendRequest. Doesn't block the event loop while waiting for the response.
+    async def __sendRequestAsync(self, method: str, url: str, headers, **kwargs):
+        endpointFamily = self.__getEndpointFamily(url)
+        cacheKey, cachedResponse, headers = self.__prepareConditionalRequest(method, url, headers)
+        session = self.http.getAsyncSession()
 
-            # Respect rate limit
-            self.__respectRateLimits()
+        rateLimitRetries = 0
+        isTokenRenewed = False
 
-            # Request next set of pages
-            response = requests.get(url = url, headers = headers)
+        while True:
+            # Respects rate limits and adapts them to the response
+            await self.rateLimiter.acquireAsync(endpointFamily)
 
-            if response.ok:
-                # Adds new pages to the full collection
-                pageCollection += response.json()
+            async with session.request(method, url, headers = headers, **kwargs) as response:
+                self.rateLimiter.update(endpointFamily, response.status, response.headers)
 
-                # Retrieve information on how many pages are left from response headers
-                contentRangeStr = response.headers['Content-Range']
-                parsedContentRange = parse.parse(contentRangeFormat, contentRangeStr)
-                lastPageIndex = parsedContentRange[1]
-                totalPageNumber = parsedContentRange[2]
+                # Retries the request if it was rejected because of the rate limit
+                if response.status == 429 and rateLimitRetries < self.maxRateLimitRetries:
+                    rateLimitRetries += 1
+                    continue
 
-                # Calculates which is the next page to be retrieved
-                pageStart = lastPageIndex + 1
-            else:
+                # Retries the request once with a new token if the token was rejected, e.g. because it was revoked
+                if response.status == 401 and 'Authorization' in headers and not isTokenRenewed:
+                    headers = dict(headers, Authorization = await self.tokenManager.renewAsync(headers['Authorization']))
+                    isTokenRenewed = True
+                    continue
+
+                # Answers the request from the cache if the content didn't change
+                if response.status == 304 and cachedResponse is not None:
+                    self.responseCache.recordHit()
+                    return cachedResponse.content, cachedResponse.headers
+
+                # Returns response as JSON if it is OK
                 response.raise_for_status()
+                responseJSON = await response.json(content_type = None)
+                self.__cacheResponse(cacheKey, responseJSON, response.headers)
+                return responseJSON, response.headers
+
+
+    # Asynchronous version of __requestGet.
+    async def __requestGetAsync(self, url: str, headers = None, authorization: bool = False):
+        requestHeaders = await self.__getRequestHeadersAsync(headers, authorization)
+        responseJSON, _ = await self.__sendRequestAsync("GET", url, requestHeaders)
+        return responseJSON
+
+
+    # Asynchronous version of __requestPost.
+    async def __requestPostAsync(self, url: str, data = None, headers = None, authorization: bool = False):
+        requestHeaders = await self.__getRequestHeadersAsync(headers, authorization)
+        responseJSON, _ = await self.__sendRequestAsync("POST", url, requestHeaders, data = data)
+        return responseJSON
+
+
+    # Asynchronous version of __requestPatch.
+    async def __requestPatchAsync(self, url: str, data = None, headers = None, authorization: bool = False):
+        requestHeaders = await self.__getRequestHeadersAsync(headers, authorization)
+        responseJSON, _ = await self.__sendRequestAsync("PATCH", url, requestHeaders, json = data)
+        return responseJSON
+
+
+    # Asynchronous version of __requestPage.
+    async def __requestPageAsync(self, url: str, headers, pageRange: str, unit: str):
+        pageHeaders = dict(headers)
+        pageHeaders['Range'] = pageRange
+
+        pageJSON, responseHeaders = await self.__sendRequestAsync("GET", url, pageHeaders)
+        lastPageIndex, totalPageNumber = self.__parseContentRange(unit, responseHeaders)
+        return pageJSON, lastPageIndex, totalPageNumber
+
+
+    # Asynchronous version of __requestPaginatedContent.
+    async def __requestPaginatedContentAsync(self, url: str, headers = None, authorization: bool = False, unit: str = "items", itemsPerRequest: int = 50, concurrent: bool = False):
+        if concurrent:
+            requestHeaders = await self.__getRequestHeadersAsync(headers, authorization)
+            return await self.__requestPaginatedContentConcurrentlyAsync(url, requestHeaders, unit, itemsPerRequest)
+
+        pageCollection = []
+
+        async for pageJSON in self.__iterPaginatedContentAsync(url, headers, authorization, unit, itemsPerRequest):
+            pageCollection += pageJSON
 
         return pageCollection
 
 
-    # Fetches all information on a team signed up for a certain tournament on toornament.
+    # Asynchronous version of __iterPaginatedContent.
+    # While the caller processes a page, the next page is already being fetched in the background.
+    async def __iterPaginatedContentAsync(self, url: str, headers = None, authorization: bool = False, unit: str = "items", itemsPerRequest: int = 50):
+        requestHeaders = await self.__getRequestHeadersAsync(headers, authorization)
+
+        # The first page tells how many items exist, which determines the ranges of all other pages
+        pageJSON, lastPageIndex, totalPageNumber = await self.__requestPageAsync(url, requestHeaders, f"{unit}=0-{itemsPerRequest - 1}", unit)
+        pageRanges = self.__getRemainingPageRanges(unit, lastPageIndex, totalPageNumber, lastPageIndex + 1)
+        nextPage = None
+
+        try:
+            for pageRange in pageRanges:
+                nextPage = asyncio.ensure_future(self.__requestPageAsync(url, requestHeaders, pageRange, unit))
+                yield pageJSON
+
+                pageJSON, _, _ = await nextPage
+                nextPage = None
+
+            yield pageJSON
+
+        finally:
+            # Stops prefetching if the caller stopped iterating early
+            if nextPage is not None:
+                nextPage.cancel()
+
+
+    # Asynchronous version of __requestPaginatedContentConcurrently. The remaining pages are requested as concurrent tasks.
+    async def __requestPaginatedContentConcurrentlyAsync(self, url: str, headers, unit: str, itemsPerRequest: int):
+        # The first page tells how many items exist, which determines the ranges of all other pages
+        pageJSON, lastPageIndex, totalPageNumber = await self.__requestPageAsync(url, headers, f"{unit}=0-{itemsPerRequest - 1}", unit)
+        pageRanges = self.__getRemainingPageRanges(unit, lastPageIndex, totalPageNumber, lastPageIndex + 1)
+        pageCollection = list(pageJSON)
+
+        remainingPages = await asyncio.gather(*[self.__requestPageAsync(url, headers, pageRange, unit) for pageRange in pageRanges])
+
+        for pageJSON, _, _ in remainingPages:
+            pageCollection += pageJSON
+
+        return pageCollection
+
+
+    # Returns participant ID, role ID and emote ID of a team from the MySQL database.
     # Either roleID or name must be supplied or a ValueError will be raised.
     # tournamentID: Toornament ID of the tournament the team signed up for
     # roleID: Discord ID of the role used to tag the team
     # name: Name of the team used in the Discord and on Toornament
-    def getTeamInfo(self, tournamentID, roleID = None, name: str = None) -> TeamInfo:
-        # Fetches the toornament participant ID associated with the team
+    def __getStoredTeam(self, tournamentID, roleID = None, name: str = None):
         if roleID is not None:
-            self.mysql.query("SELECT ParticipantID, RoleID, EmoteID FROM Teams WHERE RoleID=%s AND TournamentID=%s;", (roleID, tournamentID,))
+            results = self.mysql.fetch("SELECT ParticipantID, RoleID, EmoteID FROM Teams WHERE RoleID=%s AND TournamentID=%s;", (roleID, tournamentID,))
         elif name is not None:
-            self.mysql.query("SELECT ParticipantID, RoleID, EmoteID FROM Teams WHERE Name=%s AND TournamentID=%s;", (name, tournamentID,))
+            results = self.mysql.fetch("SELECT ParticipantID, RoleID, EmoteID FROM Teams WHERE Name=%s AND TournamentID=%s;", (name, tournamentID,))
         else:
             raise ValueError("Either a role id or a team name must be provided")
 
-        results = self.mysql.fetchResults()
-
         if results is None:
             raise Exception(f"Team with roleID '{roleID}' or name '{name}' doesn't exist for tournament {tournamentID}")
         else:
-            participantID = results[0][0]
-            roleID = results[0][1]
-            emoteID = results[0][2]
-
-            # Requests user information from toornament participant endpoint
-            # See: https://developer.toornament.com/v2/doc/organizer_participants#get:tournaments:tournament_id:participants:id
-            requestURL = f"https://api.toornament.com/organizer/v2/tournaments/{tournamentID}/participants/{participantID}"
-            response = self.__requestGet(url = requestURL, authorization=True)
-
-            # Converts reponse and adds Discord-related information
-            info = TeamInfo.fromJSON(response.json())
-            info.roleID = roleID
-            info.emoteID = emoteID
-            return info
+            return results[0][0], results[0][1], results[0][2]
+
+
+    # Returns the toornament participant endpoint URL of a tournament, or of a single participant if its ID is given.
+    # See: https://developer.toornament.com/v2/doc/organizer_participants
+    # tournamentID: Toornament ID of the tournament
+    # participantID: Optional toornament participant ID
+    @staticmethod
+    def __getParticipantURL(tournamentID, participantID = None) -> str:
+        requestURL = f"https://api.toornament.com/organizer/v2/tournaments/{tournamentID}/participants"
+
+        if participantID is not None:
+            requestURL += f"/{participantID}"
+
+        return requestURL
+
+
+    # Fetches all information on a team signed up for a certain tournament on toornament.
+    # Either roleID or name must be supplied or a ValueError will be raised.
+    # tournamentID: Toornament ID of the tournament the team signed up for
+    # roleID: Discord ID of the role used to tag the team
+    # name: Name of the team used in the Discord and on Toornament
+    def getTeamInfo(self, tournamentID, roleID = None, name: str = None) -> TeamInfo:
+        # Fetches the toornament participant ID associated with the team
+        participantID, roleID, emoteID = self.__getStoredTeam(tournamentID, roleID, name)
+
+        # Requests user information from toornament participant endpoint
+        # See: https://developer.toornament.com/v2/doc/organizer_participants#get:tournaments:tournament_id:participants:id
+        requestURL = self.__getParticipantURL(tournamentID, participantID)
+        response = self.__requestGet(url = requestURL, authorization=True)
+
+        # Converts reponse and adds Discord-related information
+        info = TeamInfo.fromJSON(response)
+        info.roleID = roleID
+        info.emoteID = emoteID
+        return info
+
+
+    # Asynchronous version of getTeamInfo. Doesn't block the event loop while waiting for toornament.
+    async def getTeamInfoAsync(self, tournamentID, roleID = None, name: str = None) -> TeamInfo:
+        participantID, roleID, emoteID = await self.mysql.runAsync(self.__getStoredTeam, tournamentID, roleID, name)
+
+        requestURL = self.__getParticipantURL(tournamentID, participantID)
+        response = await self.__requestGetAsync(url = requestURL, authorization=True)
+
+        info = TeamInfo.fromJSON(response)
+        info.roleID = roleID
+        info.emoteID = emoteID
+        return info
     
 
+    # Fetches a single team signed up for a certain tournament on toornament by its participant ID.
+    # The stored Discord role&emote are added and the team is re-indexed in the roster of the tournament.
+    # tournamentID: Toornament ID of the tournament the team signed up for
+    # participantID: Toornament participant ID of the team
+    def getTeamInfoByID(self, tournamentID, participantID) -> TeamInfo:
+        requestURL = self.__getParticipantURL(tournamentID, participantID)
+        response = self.__requestGet(url = requestURL, authorization=True)
+
+        teamInfo = TeamInfo.fromJSON(response)
+        self.__updateRosterTeam(tournamentID, teamInfo)
+        return teamInfo
+
+
+    # Asynchronous version of getTeamInfoByID. Doesn't block the event loop while waiting for toornament.
+    async def getTeamInfoByIDAsync(self, tournamentID, participantID) -> TeamInfo:
+        requestURL = self.__getParticipantURL(tournamentID, participantID)
+        response = await self.__requestGetAsync(url = requestURL, authorization=True)
+
+        teamInfo = TeamInfo.fromJSON(response)
+        await self.mysql.runAsync(self.__updateRosterTeam, tournamentID, teamInfo)
+        return teamInfo
+
+
     # Fetch all information on all teams signed up for a certain tournament on toornament.
     # tournamentID: Toornament ID of the tournament the team signed up for
-    def getAllTeamInfo(self, tournamentID) -> List[TeamInfo]:
+    # concurrent: If this is True, all pages after the first one are fetched at the same time
+    def getAllTeamInfo(self, tournamentID, concurrent: bool = True) -> List[TeamInfo]:
         # Fetches all participants from the tournament
-        requestURL = f"https://api.toornament.com/organizer/v2/tournaments/{tournamentID}/participants"
-        response = self.__requestPaginatedContent(url = requestURL, authorization = True, unit = "participants", itemsPerRequest=50)
+        requestURL = self.__getParticipantURL(tournamentID)
+        response = self.__requestPaginatedContent(url = requestURL, authorization = True, unit = "participants", itemsPerRequest=50, concurrent = concurrent)
 
         # Converts all participants and adds them to a list
         allTeamInfo = []
@@ -417,35 +859,257 @@ class ToornamentInterface:
         for teamJSON in response:
             allTeamInfo += [TeamInfo.fromJSON(teamJSON)]
 
+        self.__updateRoster(tournamentID, allTeamInfo)
+        return allTeamInfo
+
+
+    # Asynchronous version of getAllTeamInfo. Doesn't block the event loop while waiting for toornament.
+    async def getAllTeamInfoAsync(self, tournamentID, concurrent: bool = True) -> List[TeamInfo]:
+        requestURL = self.__getParticipantURL(tournamentID)
+        response = await self.__requestPaginatedContentAsync(url = requestURL, authorization = True, unit = "participants", itemsPerRequest=50, concurrent = concurrent)
+
+        allTeamInfo = []
+
+        for teamJSON in response:
+            allTeamInfo += [TeamInfo.fromJSON(teamJSON)]
+
+        await self.mysql.runAsync(self.__updateRoster, tournamentID, allTeamInfo)
         return allTeamInfo
 
 
+    # Yields all teams signed up for a certain tournament on toornament one by one.
+    # Teams are fetched page by page, so they can be processed before all pages are fetched. Only one page of JSON
+    # is held at a time. The decoded teams are indexed in a new roster as they are yielded, which replaces the roster
+    # of the tournament once the last team was yielded, so the teams themselves stay in memory for roster lookups.
+    # tournamentID: Toornament ID of the tournament the teams signed up for
+    def iterAllTeamInfo(self, tournamentID) -> Iterator[TeamInfo]:
+        requestURL = self.__getParticipantURL(tournamentID)
+        storedTeams = self.getStoredTeams(tournamentID)
+        roster = RosterIndex(tournamentID)
+
+        for pageJSON in self.__iterPaginatedContent(url = requestURL, authorization = True, unit = "participants", itemsPerRequest=50):
+            for teamJSON in pageJSON:
+                teamInfo = TeamInfo.fromJSON(teamJSON)
+                self.__indexTeam(roster, storedTeams, teamInfo)
+                yield teamInfo
+
+        self.rosters[str(tournamentID)] = roster
+
+
+    # Asynchronous version of iterAllTeamInfo. The next page is fetched while the teams of the current page are processed.
+    async def iterAllTeamInfoAsync(self, tournamentID) -> AsyncIterator[TeamInfo]:
+        requestURL = self.__getParticipantURL(tournamentID)
+        storedTeams = await self.getStoredTeamsAsync(tournamentID)
+        roster = RosterIndex(tournamentID)
+
+        async for pageJSON in self.__iterPaginatedContentAsync(url = requestURL, authorization = True, unit = "participants", itemsPerRequest=50):
+            for teamJSON in pageJSON:
+                teamInfo = TeamInfo.fromJSON(teamJSON)
+                self.__indexTeam(roster, storedTeams, teamInfo)
+                yield teamInfo
+
+        self.rosters[str(tournamentID)] = roster
+
+
+    # Adds the stored Discord role&emote to the teams of a tournament and replaces the roster index of the tournament.
+    # tournamentID: Toornament ID of the tournament
+    # allTeamInfo: List of all teams of the tournament
+    def __updateRoster(self, tournamentID, allTeamInfo: List[TeamInfo]):
+        storedTeams = self.getStoredTeams(tournamentID)
+        roster = RosterIndex(tournamentID)
+
+        for teamInfo in allTeamInfo:
+            self.__indexTeam(roster, storedTeams, teamInfo)
+
+        self.rosters[str(tournamentID)] = roster
+
+
+    # Adds the stored Discord role&emote to a team and indexes it in a roster that is being built.
+    # roster: New roster index of the tournament
+    # storedTeams: Stored teams of the tournament as returned by getStoredTeams
+    # teamInfo: Team fetched from toornament
+    def __indexTeam(self, roster: RosterIndex, storedTeams, teamInfo: TeamInfo):
+        storedTeam = storedTeams.get(str(teamInfo.id))
+
+        # Keeps roles and emotes that were already assigned to the team objects, e.g. by a running sync
+        if storedTeam is not None and not teamInfo.roleID:
+            teamInfo.roleID = storedTeam[0]
+            teamInfo.emoteID = storedTeam[1]
+
+        roster.update(teamInfo)
+
+
+    # Adds the stored Discord role&emote to a single team and re-indexes it in the roster of its tournament.
+    # tournamentID: Toornament ID of the tournament
+    # teamInfo: Team fetched from toornament
+    def __updateRosterTeam(self, tournamentID, teamInfo: TeamInfo):
+        results = self.mysql.fetch("SELECT RoleID, EmoteID FROM Teams WHERE ParticipantID=%s AND TournamentID=%s;", (teamInfo.id, tournamentID,))
+
+        if results is not None:
+            teamInfo.roleID = results[0][0]
+            teamInfo.emoteID = results[0][1]
+
+        roster = self.getRoster(tournamentID)
+
+        if roster is not None:
+            roster.update(teamInfo)
+
+
+    # Returns the roster index of a tournament, or None if its teams weren't fetched yet.
+    # tournamentID: Toornament ID of the tournament
+    def getRoster(self, tournamentID) -> RosterIndex:
+        return self.rosters.get(str(tournamentID))
+
+
+    # Returns the roster index of a tournament. Fetches all teams of the tournament if they weren't fetched yet.
+    # tournamentID: Toornament ID of the tournament
+    async def getRosterAsync(self, tournamentID) -> RosterIndex:
+        roster = self.getRoster(tournamentID)
+
+        if roster is None:
+            await self.getAllTeamInfoAsync(tournamentID)
+            roster = self.getRoster(tournamentID)
+
+        return roster
+
+
+    # Context manager that buffers all writes to the Teams, Tournaments and BotConfig tables until the block ends
+    # and then commits them in a single transaction. See MySQLWrapper.unitOfWork.
+    def unitOfWork(self):
+        return self.mysql.unitOfWork()
+
+
+    # Asynchronous version of unitOfWork, used with "async with".
+    def unitOfWorkAsync(self):
+        return self.mysql.unitOfWorkAsync()
+
+
+    # Returns the Discord role&emote of all teams of a tournament that are stored in the MySQL database.
+    # The result maps the participant ID of each team to a tuple of role ID, emote ID and name.
+    # tournamentID: Toornament ID of the tournament the teams signed up for
+    def getStoredTeams(self, tournamentID):
+        results = self.mysql.fetch("SELECT ParticipantID, RoleID, EmoteID, Name FROM Teams WHERE TournamentID=%s;", (tournamentID,))
+
+        storedTeams = {}
+
+        if results is not None:
+            for participantID, roleID, emoteID, name in results:
+                storedTeams[str(participantID)] = (roleID, emoteID, name)
+
+        return storedTeams
+
+
+    # Asynchronous version of getStoredTeams. Doesn't block the event loop while waiting for the database.
+    async def getStoredTeamsAsync(self, tournamentID):
+        return await self.mysql.runAsync(self.getStoredTeams, tournamentID)
+
+
+    # Saves the Discord role&emote of a team to the MySQL database without updating toornament.
+    # tournamentID: Toornament ID of the tournament the team signed up for
+    # teamInfo: TeamInfo-object of the team to be saved
+    def saveTeamInfo(self, tournamentID, teamInfo: TeamInfo):
+        self.saveAllTeamInfo(tournamentID, [teamInfo])
+
+
+    # Saves the Discord roles&emotes of multiple teams to the MySQL database with a single statement.
+    # tournamentID: Toornament ID of the tournament the teams signed up for
+    # allTeamInfo: List of TeamInfo-objects of the teams to be saved
+    def saveAllTeamInfo(self, tournamentID, allTeamInfo: List[TeamInfo]):
+        self.mysql.upsertMany(
+            "Teams",
+            ("ParticipantID", "RoleID", "EmoteID", "Name", "TournamentID"),
+            [(teamInfo.id, teamInfo.roleID, teamInfo.emoteID, teamInfo.name, tournamentID) for teamInfo in allTeamInfo],
+            ("RoleID", "EmoteID", "Name")
+        )
+
+        # Re-indexes the teams, because their role or name might have changed
+        roster = self.getRoster(tournamentID)
+
+        if roster is not None:
+            for teamInfo in allTeamInfo:
+                roster.update(teamInfo)
+
+
+    # Saves the Discord emotes of multiple teams to the MySQL database with a single statement.
+    # Other columns of teams that are already stored are left unchanged.
+    # tournamentID: Toornament ID of the tournament the teams signed up for
+    # allTeamInfo: List of TeamInfo-objects with the emote IDs to be saved
+    def saveTeamEmotes(self, tournamentID, allTeamInfo: List[TeamInfo]):
+        self.mysql.upsertMany(
+            "Teams",
+            ("ParticipantID", "RoleID", "EmoteID", "Name", "TournamentID"),
+            [(teamInfo.id, teamInfo.roleID, teamInfo.emoteID, teamInfo.name, tournamentID) for teamInfo in allTeamInfo],
+            ("EmoteID",)
+        )
+
+
+    # Asynchronous version of saveTeamEmotes. Doesn't block the event loop while waiting for the database.
+    async def saveTeamEmotesAsync(self, tournamentID, allTeamInfo: List[TeamInfo]):
+        await self.mysql.runAsync(self.saveTeamEmotes, tournamentID, allTeamInfo)
+
+
+    # Removes a team from the MySQL database and from the roster of its tournament, e.g. after it left the tournament.
+    # Returns a tuple of role ID, emote ID and name the team was stored with, or None if it wasn't stored.
+    # tournamentID: Toornament ID of the tournament the team signed up for
+    # participantID: Toornament participant ID of the team
+    def deleteTeamInfo(self, tournamentID, participantID):
+        results = self.mysql.fetch("SELECT RoleID, EmoteID, Name FROM Teams WHERE ParticipantID=%s AND TournamentID=%s;", (participantID, tournamentID,))
+        self.mysql.write("DELETE FROM Teams WHERE ParticipantID=%s AND TournamentID=%s;", (participantID, tournamentID,))
+
+        roster = self.getRoster(tournamentID)
+
+        if roster is not None:
+            roster.remove(participantID)
+
+        return tuple(results[0]) if results is not None else None
+
+
+    # Asynchronous version of deleteTeamInfo. Doesn't block the event loop while waiting for the database.
+    async def deleteTeamInfoAsync(self, tournamentID, participantID):
+        return await self.mysql.runAsync(self.deleteTeamInfo, tournamentID, participantID)
+
+
+    # Asynchronous version of saveAllTeamInfo. Doesn't block the event loop while waiting for the database.
+    async def saveAllTeamInfoAsync(self, tournamentID, allTeamInfo: List[TeamInfo]):
+        await self.mysql.runAsync(self.saveAllTeamInfo, tournamentID, allTeamInfo)
+
+
+    # Asynchronous version of saveTeamInfo. Doesn't block the event loop while waiting for the database.
+    async def saveTeamInfoAsync(self, tournamentID, teamInfo: TeamInfo):
+        await self.mysql.runAsync(self.saveTeamInfo, tournamentID, teamInfo)
+
+
     # Updates team information on toornament with the team object that is given.
+    # Only the fields that changed since the team was fetched are sent. If nothing changed, no request is sent.
     # See: https://developer.toornament.com/v2/doc/organizer_participants#patch:tournaments:tournament_id:participants:id
     # Additionally updates the MySQL database with the team role&emote.
     # tournamentID: Toornament ID of the tournament the team signed up for
     # teamInfo: TeamInfo-object containing the new team data to be patched on Toornament
-    def patchTeamInfo(self, tournamentID, teamInfo: TeamInfo):
-        requestURL = f"https://api.toornament.com/organizer/v2/tournaments/{tournamentID}/participants/{teamInfo.id}"
-        requestData = teamInfo.toJSON()
-        self.__requestPatch(url = requestURL, data = requestData, authorization=True)
-
-        self.mysql.query(
-            (
-                "INSERT INTO Teams (ParticipantID, RoleID, EmoteID, Name, TournamentID) "
-                "VALUES (%(participantID)s, %(roleID)s, %(emoteID)s, %(name)s, %(tournamentID)s) "
-                "ON DUPLICATE KEY UPDATE RoleID=%(roleID)s, EmoteID=%(emoteID)s, Name=%(name)s;"
-            ),
-            {
-                "participantID": teamInfo.id,
-                "roleID": teamInfo.roleID,
-                "emoteID": teamInfo.emoteID,
-                "name": teamInfo.name,
-                "tournamentID": tournamentID
-            }
-        )
+    # full: If True, the complete team is sent even if nothing changed
+    # save: If False, the team isn't saved to the database, e.g. because the caller saves many teams at once
+    def patchTeamInfo(self, tournamentID, teamInfo: TeamInfo, full: bool = False, save: bool = True):
+        requestData = teamInfo.toJSON() if full else teamInfo.toPatchJSON()
+
+        if requestData is not None:
+            requestURL = self.__getParticipantURL(tournamentID, teamInfo.id)
+            self.__requestPatch(url = requestURL, data = requestData, authorization=True)
+            teamInfo.markClean()
+
+        if save:
+            self.saveTeamInfo(tournamentID, teamInfo)
+
 
-        self.mysql.db.commit()
+    # Asynchronous version of patchTeamInfo. Doesn't block the event loop while waiting for toornament.
+    async def patchTeamInfoAsync(self, tournamentID, teamInfo: TeamInfo, full: bool = False, save: bool = True):
+        requestData = teamInfo.toJSON() if full else teamInfo.toPatchJSON()
+
+        if requestData is not None:
+            requestURL = self.__getParticipantURL(tournamentID, teamInfo.id)
+            await self.__requestPatchAsync(url = requestURL, data = requestData, authorization=True)
+            teamInfo.markClean()
+
+        if save:
+            await self.saveTeamInfoAsync(tournamentID, teamInfo)
 
 
     # Returns an object containing basic information on a certain tournament on Toornament.
@@ -454,32 +1118,12 @@ class ToornamentInterface:
     # guildID: ID of the Discord guild the tournament is hosted in
     # name: Name of the tournament used on Discord or Toornament
     def getTournamentInfo(self, tournamentID = None, guildID = None, name = None) -> TournamentInfo:
-        # Returns information for given tournament id
-        if tournamentID is not None:
-            self.mysql.query("SELECT GuildID, Name FROM Tournaments WHERE TournamentID=%s;", (tournamentID,))
-            results = self.mysql.fetchResults()
-
-            if results is None:
-                raise Exception(f"Tournament '{tournamentID}' couldn't be found")
-            else:
-                guildID = results[0][0]
-                name = results[0][1]
-                return TournamentInfo(name, guildID, tournamentID)
-
-        # Returns information for given guild id and tournament name
-        elif guildID is not None and name is not None:
-            self.mysql.query("SELECT TournamentID FROM Tournaments WHERE Name=%s AND GuildID=%s;", (name, guildID,))
-            results = self.mysql.fetchResults()
-
-            if results is None:
-                raise Exception(f"No tournament '{name}' could be found for guild {guildID}")
-            else:
-                tournamentID = results[0][0]
-                return TournamentInfo(name, guildID, tournamentID)
-        
-        # Invalid input
-        else:
-            raise ValueError("Either a tournament ID, or a tournament name and guild ID must be supplied")
+        return self.tournamentRegistry.get(tournamentID, guildID, name)
+
+
+    # Asynchronous version of getTournamentInfo. Only waits for the database if the tournament isn't known yet.
+    async def getTournamentInfoAsync(self, tournamentID = None, guildID = None, name = None) -> TournamentInfo:
+        return await self.tournamentRegistry.getAsync(tournamentID, guildID, name)
 
 
     # Adds a tournament from toornament to a discord guild.
@@ -488,7 +1132,15 @@ class ToornamentInterface:
     # name: Name of the tournament used on Discord or Toornament
     def addTournament(self, tournamentID, guildID, name = None):
         if name is None:
-            self.mysql.query("INSERT INTO Tournaments (TournamentID, GuildID) VALUES (%s, %s);", (tournamentID, guildID,))
+            self.mysql.write("INSERT INTO Tournaments (TournamentID, GuildID) VALUES (%s, %s);", (tournamentID, guildID,))
         else:
-            self.mysql.query("INSERT INTO Tournaments (TournamentID, GuildID, Name) VALUES (%s, %s, %s);", (tournamentID, guildID, name,))
-        self.mysql.db.commit()
+            self.mysql.write("INSERT INTO Tournaments (TournamentID, GuildID, Name) VALUES (%s, %s, %s);", (tournamentID, guildID, name,))
+
+        # Within a unit of work, the tournament is only registered once it was committed, so it's never synced otherwise
+        tournament = TournamentInfo(name if name is not None else "", guildID, tournamentID)
+        self.mysql.afterCommit(lambda: self.tournamentRegistry.add(tournament))
+
+
+    # Asynchronous version of addTournament. Doesn't block the event loop while waiting for the database.
+    async def addTournamentAsync(self, tournamentID, guildID, name = None):
+        await self.mysql.runAsync(self.addTournament, tournamentID, guildID, name)
\ No newline at end of file
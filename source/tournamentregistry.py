@@ -0,0 +1,149 @@
+# The TournamentRegistry keeps the rows of the Tournaments table in memory, so the guild of a tournament can be
+# looked up without a SQL round-trip. All tournaments are loaded once at startup, new tournaments are added when
+# they are saved and lookups that miss the cache are loaded from the database.
+#
+# Only tournaments that exist are cached. A failed lookup raises an exception and is retried with the next call,
+# so a tournament added by another bot instance is found as soon as it exists in the database.
+
+from mysqlwrapper import MySQLWrapper
+import threading
+
+# This class associates a tournament ID with a guild and optionally a name
+class TournamentInfo:
+
+    def __init__(self, name = None, guildID = None, tournamentID = None):
+        self.name = name
+        self.guildID = guildID
+        self.tournamentID = tournamentID
+
+
+class TournamentRegistry:
+
+    # Constructor
+    # mysqlWrapper: MySQLWrapper instance
+    def __init__(self, mysqlWrapper: MySQLWrapper):
+        self.mysql = mysqlWrapper
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # Maps tournament IDs to tournaments
+        self.tournaments = {}
+
+        # Maps tuples of guild ID and name to tournaments
+        self.tournamentsByName = {}
+
+    # Loads all tournaments from the database into memory
+    def preload(self):
+        results = self.mysql.fetch("SELECT TournamentID, GuildID, Name FROM Tournaments;")
+
+        for tournamentID, guildID, name in results or ():
+            self.add(TournamentInfo(name, guildID, tournamentID))
+
+    # Adds a tournament to the registry or replaces the stored tournament with the same ID
+    # tournament: TournamentInfo object of the tournament
+    def add(self, tournament: TournamentInfo):
+        with self.lock:
+            previous = self.tournaments.get(str(tournament.tournamentID))
+
+            if previous is not None:
+                self.tournamentsByName.pop((str(previous.guildID), previous.name), None)
+
+            self.tournaments[str(tournament.tournamentID)] = tournament
+            self.tournamentsByName[(str(tournament.guildID), tournament.name)] = tournament
+
+    # Removes all tournaments of a guild from the registry, e.g. because the bot was removed from the guild.
+    # The tournaments stay in the database.
+    # guildID: ID of the Discord guild
+    def removeGuild(self, guildID):
+        with self.lock:
+            for tournament in [tournament for tournament in self.tournaments.values() if str(tournament.guildID) == str(guildID)]:
+                del self.tournaments[str(tournament.tournamentID)]
+                self.tournamentsByName.pop((str(tournament.guildID), tournament.name), None)
+
+    # Returns a list of all tournaments stored in memory
+    def getTournaments(self):
+        with self.lock:
+            return list(self.tournaments.values())
+
+    # Returns a list of all tournaments of a guild that are stored in memory
+    # guildID: ID of the Discord guild
+    def getGuildTournaments(self, guildID):
+        with self.lock:
+            return [tournament for tournament in self.tournaments.values() if str(tournament.guildID) == str(guildID)]
+
+    # Returns a tournament stored in memory and counts the lookup, or None if it isn't stored.
+    # tournamentID: Toornament ID of the tournament
+    # guildID: ID of the Discord guild the tournament is hosted in
+    # name: Name of the tournament used on Discord or Toornament
+    def getCached(self, tournamentID = None, guildID = None, name = None) -> TournamentInfo:
+        with self.lock:
+            if tournamentID is not None:
+                tournament = self.tournaments.get(str(tournamentID))
+            else:
+                tournament = self.tournamentsByName.get((str(guildID), name))
+
+            if tournament is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return tournament
+
+    # Returns a tournament. If it isn't stored in memory, it is loaded from the database.
+    # Either a toornament ID, or both a guildID and name must be given.
+    # tournamentID: Toornament ID of the tournament
+    # guildID: ID of the Discord guild the tournament is hosted in
+    # name: Name of the tournament used on Discord or Toornament
+    def get(self, tournamentID = None, guildID = None, name = None) -> TournamentInfo:
+        if tournamentID is None and (guildID is None or name is None):
+            raise ValueError("Either a tournament ID, or a tournament name and guild ID must be supplied")
+
+        tournament = self.getCached(tournamentID, guildID, name)
+
+        if tournament is None:
+            tournament = self.__load(tournamentID, guildID, name)
+
+        return tournament
+
+    # Asynchronous version of get. Only waits for the database if the tournament isn't stored in memory.
+    async def getAsync(self, tournamentID = None, guildID = None, name = None) -> TournamentInfo:
+        if tournamentID is None and (guildID is None or name is None):
+            raise ValueError("Either a tournament ID, or a tournament name and guild ID must be supplied")
+
+        tournament = self.getCached(tournamentID, guildID, name)
+
+        if tournament is None:
+            tournament = await self.mysql.runAsync(self.__load, tournamentID, guildID, name)
+
+        return tournament
+
+    # Loads a tournament from the database and adds it to the registry.
+    # Raises an exception if the tournament doesn't exist.
+    def __load(self, tournamentID = None, guildID = None, name = None) -> TournamentInfo:
+        if tournamentID is not None:
+            results = self.mysql.fetch("SELECT GuildID, Name FROM Tournaments WHERE TournamentID=%s;", (tournamentID,))
+
+            if results is None:
+                raise Exception(f"Tournament '{tournamentID}' couldn't be found")
+
+            tournament = TournamentInfo(results[0][1], results[0][0], tournamentID)
+        else:
+            results = self.mysql.fetch("SELECT TournamentID FROM Tournaments WHERE Name=%s AND GuildID=%s;", (name, guildID,))
+
+            if results is None:
+                raise Exception(f"No tournament '{name}' could be found for guild {guildID}")
+
+            tournament = TournamentInfo(name, guildID, results[0][0])
+
+        self.add(tournament)
+        return tournament
+
+    # Returns a map with the number of lookups answered from memory, lookups that needed the database and stored tournaments
+    def getStats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.tournaments)
+            }
@@ -39,20 +39,105 @@ def tryToInt(input):
         return None
 
 # Downloads an image from the given URL, scales it and returns it as byte array.
+# Blocks until the download is finished. Asynchronous code should use the ImagePipeline instead.
 # url: URL from which to download the image
 # size: The size the image should be scaled to as an int-tuple
 def downloadImage(url, size = None):
     # Opens image from URL
     with urllib.request.urlopen(url) as imgFile:
-        img = Image.open(imgFile)
+        return resizeImage(imgFile.read(), size)
 
-        # Scales the image
-        if size is not None:
-            img.thumbnail(size)
+# Decodes an image, scales it and returns it as PNG byte array.
+# Doesn't access any shared state, so it can be run in a process pool.
+# imageData: Encoded image as byte array
+# size: The size the image should be scaled to as an int-tuple
+def resizeImage(imageData, size = None):
+    img = Image.open(io.BytesIO(imageData))
+
+    # Scales the image
+    if size is not None:
+        img.thumbnail(size)
+
+    # Converts the scaled image to a byte array
+    imgByteArr = io.BytesIO()
+    img.save(imgByteArr, format='PNG')
+    return imgByteArr.getvalue()
+
+# Returns all slots of a class and its base classes
+# cls: Slotted class
+def getSlots(cls):
+    return [slot for base in reversed(cls.__mro__) for slot in base.__dict__.get("__slots__", ())]
+
+# Returns a function that creates an object of a slotted class from a JSON object.
+# The fields are read from the tables FIELDS and CUSTOM_FIELDS of the class, which contain tuples of attribute name
+# and JSON key of all top level fields and all fields in the "custom_fields" object. Custom fields that are usually
+# missing are listed in the optional table OPTIONAL_CUSTOM_FIELDS instead, so they don't force the slow path.
+# The function is generated and compiled once from the tables, so decoding needs no loops or lookups of the tables.
+# Missing keys are decoded as None. Custom fields that aren't listed are stored in the attribute extraCustomFields,
+# which is None if there are none. If the class has a slot named snapshot, it is set to a tuple of all decoded values
+# in the order of the tables, so the class can find changed attributes without keeping the JSON.
+# cls: Slotted class with the field tables
+# defaults: Map of attributes that aren't part of the JSON to their initial values. Other attributes start as None.
+def compileDecoder(cls, defaults = None):
+    fields = cls.FIELDS
+    customFields = cls.CUSTOM_FIELDS
+    optionalFields = getattr(cls, "OPTIONAL_CUSTOM_FIELDS", ())
+    knownKeys = frozenset(key for _, key in customFields + optionalFields)
+    namespace = {"knownKeys": knownKeys}
+
+    # Every decoded value is also kept in a local variable v<index> for the snapshot
+    fieldValues = list(enumerate(fields))
+    customValues = list(enumerate(customFields, len(fields)))
+    optionalValues = list(enumerate(optionalFields, len(fields) + len(customFields)))
+
+    # Fast path for complete JSON objects: Plain subscripts, and there are no extra custom fields if the number of keys matches
+    lines = ["def decode(cls, data):", "    info = cls.__new__(cls)", "    try:"]
+    lines += [f"        info.{attribute} = v{index} = data[{key!r}]" for index, (attribute, key) in fieldValues]
+    lines += ["        customData = data['custom_fields']"]
+    lines += [f"        info.{attribute} = v{index} = customData[{key!r}]" for index, (attribute, key) in customValues]
+    knownKeyCount = " + ".join([str(len(customFields))] + [f"({key!r} in customData)" for _, key in optionalFields])
+    lines += [f"        info.extraCustomFields = None if len(customData) == {knownKeyCount} else {{key: value for key, value in customData.items() if key not in knownKeys}}"]
+
+    # Slow path if any key is missing
+    lines += ["    except (KeyError, TypeError):"]
+    lines += [f"        info.{attribute} = v{index} = data.get({key!r})" for index, (attribute, key) in fieldValues]
+    lines += ["        customData = data.get('custom_fields') or {}"]
+    lines += [f"        info.{attribute} = v{index} = customData.get({key!r})" for index, (attribute, key) in customValues]
+    lines += ["        info.extraCustomFields = None if knownKeys.issuperset(customData) else {key: value for key, value in customData.items() if key not in knownKeys}"]
+
+    # Optional fields are read the same way on both paths
+    lines += [f"    info.{attribute} = v{index} = customData.get({key!r})" for index, (attribute, key) in optionalValues]
+
+    slots = getSlots(cls)
+
+    if "snapshot" in slots:
+        lines += ["    info.snapshot = (" + "".join(f"v{index}, " for index, _ in fieldValues + customValues + optionalValues) + ")"]
+
+    # Initializes all remaining slots
+    decodedAttributes = set(attribute for attribute, _ in fields + customFields + optionalFields) | {"extraCustomFields", "snapshot"}
+
+    for slot in slots:
+        if slot not in decodedAttributes:
+            namespace[f"default_{slot}"] = (defaults or {}).get(slot)
+            lines += [f"    info.{slot} = default_{slot}"]
+
+    lines += ["    return info"]
+
+    exec(compile("\n".join(lines), "<decoder>", "exec"), namespace)
+    return namespace["decode"]
+
+# Returns a function that converts the attributes of an object to a JSON object. The counterpart of compileDecoder.
+# Custom fields whose value is None are left out, custom fields stored in extraCustomFields are written back unchanged.
+# cls: Slotted class with the field tables
+def compileEncoder(cls):
+    lines = ["def encode(info):", "    customData = dict(info.extraCustomFields) if info.extraCustomFields else {}"]
+
+    for attribute, key in cls.CUSTOM_FIELDS + getattr(cls, "OPTIONAL_CUSTOM_FIELDS", ()):
+        lines += [f"    if info.{attribute} is not None:", f"        customData[{key!r}] = info.{attribute}"]
 
-        # Converts the scaled image to a byte array
-        imgByteArr = io.BytesIO()
-        img.save(imgByteArr, format='PNG')
-        imgByteArr = imgByteArr.getvalue()
+    values = ", ".join(f"{key!r}: info.{attribute}" for attribute, key in cls.FIELDS)
+    lines += [f"    return {{{values}, 'custom_fields': customData}}"]
 
-        return imgByteArr
\ No newline at end of file
+    namespace = {}
+    exec(compile("\n".join(lines), "<encoder>", "exec"), namespace)
+    return namespace["encode"]
@@ -0,0 +1,236 @@
+# The WebhookReceiver accepts participant notifications from toornament on a local HTTP endpoint and applies every change
+# to the Discord guild of its tournament right away, so teams don't have to wait for the next full sync.
+#
+# Notifications are POST requests to /webhook with a JSON body like:
+# {
+#     "id": "...",                       Unique ID of the notification, used to drop deliveries that are sent twice
+#     "name": "participant.updated",     One of participant.created, participant.updated and participant.deleted
+#     "tournament_id": "...",
+#     "object_id": "..."                 Participant ID of the team
+# }
+# The header X-Webhook-Signature must contain the hex HMAC-SHA256 of the raw body, keyed with the webhook secret.
+#
+# Requests are only checked and queued, the changes are applied by a worker in the order they arrived:
+#  - created/updated: The team is fetched from toornament with a single request and synced like in a full sync.
+#                     If a team is queued already, further notifications for it are dropped, because the queued
+#                     change fetches the latest data anyway.
+#  - deleted: The team is removed from the database and its team role is deleted.
+# Changes of a tournament wait until a running sync of it finished, see SyncScheduler.runExclusive.
+# If the queue is full, the notification is answered with 503, so toornament delivers it again later.
+#
+# sendTestNotification sends a signed notification like toornament does, e.g. to test the receiver locally:
+#     python webhook.py participant.updated <tournamentID> <participantID>
+
+from toornament import ToornamentInterface
+from discordhelper import DiscordHelper
+from teamsync import TeamSync
+from scheduler import SyncScheduler
+from aiohttp import web
+from collections import OrderedDict
+import aiohttp
+import asyncio
+import hashlib
+import hmac
+import json
+import traceback
+import uuid
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+
+class WebhookReceiver:
+
+    # Constructor
+    # toornament: Toornament interface instance
+    # discordHelper: DiscordHelper instance
+    # teamSync: TeamSync instance used to sync created and updated teams
+    # scheduler: SyncScheduler instance whose syncs the changes wait for
+    # secret: Secret shared with toornament, used to verify the signature of notifications
+    # host: Address the HTTP server listens on
+    # port: Port the HTTP server listens on
+    # queueSize: Maximum number of changes waiting to be applied
+    # maxNotificationIDs: Number of recent notification IDs remembered to drop duplicates
+    def __init__(self, toornament: ToornamentInterface, discordHelper: DiscordHelper, teamSync: TeamSync, scheduler: SyncScheduler, secret: str, host: str = "0.0.0.0", port: int = 8080, queueSize: int = 1000, maxNotificationIDs: int = 10000):
+        self.toornament = toornament
+        self.discordHelper = discordHelper
+        self.teamSync = teamSync
+        self.scheduler = scheduler
+        self.secret = secret.encode()
+        self.host = host
+        self.port = port
+        self.queueSize = queueSize
+        self.maxNotificationIDs = maxNotificationIDs
+
+        # IDs of recently accepted notifications, oldest first
+        self.notificationIDs = OrderedDict()
+
+        # Tuples of tournament ID and participant ID of all teams with a queued create/update
+        self.pendingTeams = set()
+
+        self.stats = {"accepted": 0, "duplicates": 0, "rejected": 0, "applied": 0, "failed": 0}
+
+        self.queue = None
+        self.runner = None
+        self.worker = None
+
+    # Starts the HTTP server and the worker. Does nothing if the receiver is already running.
+    async def start(self):
+        if self.runner is not None:
+            return
+
+        self.queue = asyncio.Queue(self.queueSize)
+        self.worker = asyncio.ensure_future(self.__work())
+
+        app = web.Application()
+        app.router.add_post("/webhook", self.__handleRequest)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    # Stops the HTTP server and the worker. Changes that weren't applied yet are dropped.
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+        if self.worker is not None:
+            self.worker.cancel()
+            await asyncio.gather(self.worker, return_exceptions = True)
+            self.worker = None
+
+    # Waits until all queued changes are applied
+    async def join(self):
+        await self.queue.join()
+
+    # Returns the number of accepted, duplicate, rejected, applied and failed notifications
+    def getStats(self):
+        return dict(self.stats, queued = self.queue.qsize() if self.queue is not None else 0)
+
+    # Returns True if a signature matches the body of a request
+    # body: Raw body of the request
+    # signature: Hex HMAC-SHA256 of the body as sent in the signature header
+    def verifySignature(self, body: bytes, signature: str) -> bool:
+        if not self.secret or signature is None:
+            return False
+
+        expected = hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature.strip().lower())
+
+    # Checks a notification and queues its change
+    async def __handleRequest(self, request: web.Request) -> web.Response:
+        body = await request.read()
+
+        if not self.verifySignature(body, request.headers.get(SIGNATURE_HEADER)):
+            self.stats["rejected"] += 1
+            return web.Response(status = 401, text = "Invalid signature")
+
+        try:
+            notificationJSON = json.loads(body)
+            notificationID = str(notificationJSON["id"])
+            name = notificationJSON["name"]
+            tournamentID = str(notificationJSON["tournament_id"])
+            participantID = str(notificationJSON["object_id"])
+        except (ValueError, KeyError, TypeError):
+            self.stats["rejected"] += 1
+            return web.Response(status = 400, text = "Invalid notification")
+
+        if notificationID in self.notificationIDs:
+            self.stats["duplicates"] += 1
+            return web.Response(text = "Duplicate")
+
+        # Other events and tournaments of other bots are acknowledged, so they aren't delivered again
+        if name not in ("participant.created", "participant.updated", "participant.deleted") or self.toornament.tournamentRegistry.getCached(tournamentID) is None:
+            return web.Response(text = "Ignored")
+
+        isDeleted = name == "participant.deleted"
+
+        if isDeleted or (tournamentID, participantID) not in self.pendingTeams:
+            try:
+                self.queue.put_nowait((tournamentID, participantID, isDeleted))
+            except asyncio.QueueFull:
+                return web.Response(status = 503, text = "Busy")
+
+            if not isDeleted:
+                self.pendingTeams.add((tournamentID, participantID))
+
+        self.__rememberNotification(notificationID)
+        self.stats["accepted"] += 1
+        return web.Response(text = "OK")
+
+    # Remembers the ID of an accepted notification and forgets the oldest IDs
+    def __rememberNotification(self, notificationID: str):
+        self.notificationIDs[notificationID] = True
+
+        while len(self.notificationIDs) > self.maxNotificationIDs:
+            self.notificationIDs.popitem(last = False)
+
+    # Applies queued changes one by one until the receiver is stopped
+    async def __work(self):
+        while True:
+            tournamentID, participantID, isDeleted = await self.queue.get()
+
+            try:
+                if isDeleted:
+                    await self.scheduler.runExclusive(tournamentID, self.__deleteTeam, tournamentID, participantID)
+                else:
+                    await self.scheduler.runExclusive(tournamentID, self.__syncTeam, tournamentID, participantID)
+
+                self.stats["applied"] += 1
+            except Exception:
+                self.stats["failed"] += 1
+                print(traceback.format_exc())
+            finally:
+                self.queue.task_done()
+
+    # Fetches a created or updated team and syncs it with the Discord guild of its tournament
+    async def __syncTeam(self, tournamentID, participantID):
+        # Notifications that arrive from now on need another fetch
+        self.pendingTeams.discard((tournamentID, participantID))
+
+        teamInfo = await self.toornament.getTeamInfoByIDAsync(tournamentID, participantID)
+        report = await self.teamSync.syncTeams(tournamentID, [teamInfo])
+
+        for issue in report.issues + report.roleReport.failures:
+            print(issue)
+
+    # Removes a deleted team from the database and deletes its team role
+    async def __deleteTeam(self, tournamentID, participantID):
+        storedTeam = await self.toornament.deleteTeamInfoAsync(tournamentID, participantID)
+
+        if storedTeam is not None and storedTeam[0]:
+            await self.discordHelper.deleteRole(tournamentID, storedTeam[0], reason = f"Team '{storedTeam[2]}' left the tournament")
+
+
+# Sends a signed participant notification like toornament does and returns the HTTP status of the response.
+# url: URL of the webhook endpoint, e.g. "http://localhost:8080/webhook"
+# secret: Webhook secret
+# name: Name of the event, e.g. "participant.updated"
+# tournamentID: Toornament ID of the tournament
+# participantID: Toornament participant ID of the team
+# notificationID: Optional ID of the notification. A new one is generated if None.
+async def sendTestNotification(url: str, secret: str, name: str, tournamentID, participantID, notificationID = None) -> int:
+    body = json.dumps({
+        "id": notificationID if notificationID is not None else str(uuid.uuid4()),
+        "name": name,
+        "tournament_id": str(tournamentID),
+        "object_id": str(participantID)
+    }).encode()
+
+    signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, data = body, headers = {"Content-Type": "application/json", SIGNATURE_HEADER: signature}) as response:
+            return response.status
+
+
+if __name__ == "__main__":
+    import sys
+    from authorization import AuthorizationInfo
+
+    if len(sys.argv) != 4:
+        print("Usage: python webhook.py <event name> <tournament ID> <participant ID>")
+        sys.exit(1)
+
+    auth = AuthorizationInfo("auth.json")
+    status = asyncio.run(sendTestNotification(f"http://localhost:{auth.webhookPort}/webhook", auth.webhookSecret, sys.argv[1], sys.argv[2], sys.argv[3]))
+    print(status)